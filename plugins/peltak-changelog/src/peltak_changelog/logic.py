@@ -19,7 +19,7 @@ import textwrap
 from collections import OrderedDict
 from typing import Dict, List, Optional, Pattern
 
-from peltak.core import conf, git, shell, versioning
+from peltak.core import conf, git, versioning
 
 from .types import ChangelogItems, ChangelogTag
 
@@ -72,14 +72,8 @@ def _get_commits_in_range(
     if not end_rev:
         end_rev = 'HEAD'
 
-    cmd = 'git log --format=%H'
-    if start_rev and end_rev:
-        cmd += f" {start_rev}..{end_rev}"
-    elif end_rev:
-        cmd += f" {end_rev}"
-
-    hashes = shell.run(cmd, capture=True).stdout.strip().splitlines()
-    return [git.CommitDetails.get(h) for h in hashes]
+    rev_range = f"{start_rev}..{end_rev}" if start_rev else end_rev
+    return list(git.iter_commits(rev_range))
 
 
 def _render_changelog(title: Optional[str], changelog_items: ChangelogItems) -> str:
@@ -32,7 +32,7 @@ def assert_branch_type(branch_type: str) -> None:
             The branch type. This assumes the branch is in the '<type>/<title>`
             format.
     """
-    branch = git.current_branch(refresh=True)
+    branch = git.current_branch()
 
     if branch.type != branch_type:
         if context.get('pretend', False):
@@ -53,7 +53,7 @@ def assert_on_branch(branch_name: str) -> None:
         branch_name (str):
             The supposed name of the current branch.
     """
-    branch = git.current_branch(refresh=True)
+    branch = git.current_branch()
 
     if branch.name != branch_name:
         if context.get('pretend', False):
@@ -83,7 +83,7 @@ def git_branch_rename(new_name: str) -> None:
         new_name (str):
             New name for the current branch.
     """
-    curr_name = git.current_branch(refresh=True).name
+    curr_name = git.current_branch().name
 
     if curr_name not in git.protected_branches():
         log.info("Renaming branch from <33>{}<32> to <33>{}".format(
@@ -130,7 +130,7 @@ def git_merge(base: str, head: str, no_ff: bool = False) -> None:
             to **False** (default) it will do a fast-forward merge if possible.
     """
     pretend = context.get('pretend', False)
-    branch = git.current_branch(refresh=True)
+    branch = git.current_branch()
 
     if branch.name != base and not pretend:
         git_checkout(base)
@@ -44,7 +44,7 @@ def update() -> None:
 
     This will merge current develop into the current branch.
     """
-    branch = git.current_branch(refresh=True)
+    branch = git.current_branch()
     develop = conf.get('git.devel_branch', 'develop')
 
     common.assert_branch_type('feature')
@@ -78,7 +78,7 @@ def finish(fast_forward: bool) -> None:
         sys.exit(1)
 
     develop = conf.get('git.devel_branch', 'develop')
-    branch = git.current_branch(refresh=True)
+    branch = git.current_branch()
 
     common.assert_branch_type('feature')
 
@@ -101,7 +101,7 @@ def finish(fast_forward: bool) -> None:
 def merged() -> None:
     """ Cleanup a remotely merged branch. """
     develop = conf.get('git.devel_branch', 'develop')
-    branch = git.current_branch(refresh=True)
+    branch = git.current_branch()
 
     common.assert_branch_type('feature')
 
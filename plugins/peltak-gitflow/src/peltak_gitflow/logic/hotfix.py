@@ -56,7 +56,7 @@ def update() -> None:
 
     This will merge current develop into the current branch.
     """
-    branch = git.current_branch(refresh=True)
+    branch = git.current_branch()
     master = conf.get('git.master_branch', 'master')
 
     common.assert_branch_type('hotfix')
@@ -79,7 +79,7 @@ def finish(fast_forward: bool) -> None:
 
     develop = conf.get('git.devel_branch', 'develop')
     master = conf.get('git.master_branch', 'master')
-    branch = git.current_branch(refresh=True)
+    branch = git.current_branch()
 
     common.assert_branch_type('hotfix')
 
@@ -108,7 +108,7 @@ def merged() -> None:
     """ Cleanup a remotely merged branch. """
     develop = conf.get('git.devel_branch', 'develop')
     master = conf.get('git.master_branch', 'master')
-    branch = git.current_branch(refresh=True)
+    branch = git.current_branch()
 
     common.assert_branch_type('hotfix')
 
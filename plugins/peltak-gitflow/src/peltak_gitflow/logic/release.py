@@ -13,7 +13,6 @@
 # limitations under the License.
 #
 """ git flow hotfix commands implementation. """
-import os
 import sys
 
 from peltak.core import conf, context, git, hooks, log, shell, versioning
@@ -38,14 +37,7 @@ def start(component: str, exact: str) -> None:
     develop = conf.get('git.devel_branch', 'develop')
     common.assert_on_branch(develop)
 
-    with conf.within_proj_dir():
-        out = shell.run('git status --porcelain', capture=True).stdout
-        lines = out.split(os.linesep)
-        has_changes = any(
-            not line.startswith('??') for line in lines if line.strip()
-        )
-
-    if has_changes:
+    if git.status_snapshot(refresh=True).has_changes:
         log.info("Cannot release: there are uncommitted changes")
         exit(1)
 
@@ -84,7 +76,7 @@ def finish(fast_forward: bool) -> None:
 
     develop = conf.get('git.devel_branch', 'develop')
     master = conf.get('git.master_branch', 'master')
-    branch = git.current_branch(refresh=True)
+    branch = git.current_branch()
 
     common.assert_branch_type('release')
 
@@ -122,7 +114,7 @@ def merged() -> None:
     """ Cleanup the release branch after it was remotely merged to master. """
     develop = conf.get('git.devel_branch', 'develop')
     master = conf.get('git.master_branch', 'master')
-    branch = git.current_branch(refresh=True)
+    branch = git.current_branch()
 
     common.assert_branch_type('release')
 
@@ -30,7 +30,7 @@ def start(name: str) -> None:
         name (str):
             The name of the new feature.
     """
-    branch = git.current_branch(refresh=True)
+    branch = git.current_branch()
     task_branch = 'task/' + common.to_branch_name(name)
 
     if branch.type not in ('feature', 'hotfix'):
@@ -48,7 +48,7 @@ def update() -> None:
 
     This will merge current develop into the current branch.
     """
-    branch = git.current_branch(refresh=True)
+    branch = git.current_branch()
     base_branch = common.get_base_branch()
 
     common.assert_branch_type('task')
@@ -81,7 +81,7 @@ def finish(fast_forward: bool) -> None:
         )
         sys.exit(1)
 
-    branch = git.current_branch(refresh=True)
+    branch = git.current_branch()
     base = common.get_base_branch()
 
     prompt = "<32>Merge <33>{}<32> into <33>{}<0>?".format(branch.name, base)
@@ -110,7 +110,7 @@ def finish(fast_forward: bool) -> None:
 def merged() -> None:
     """ Cleanup a remotely merged branch. """
     base_branch = common.get_base_branch()
-    branch = git.current_branch(refresh=True)
+    branch = git.current_branch()
 
     common.assert_branch_type('task')
 
@@ -29,8 +29,11 @@ def check_todos(
     authors: List[str],
     verify_complete: bool,
 ) -> None:
-    input_files = _collect_input_files(input_paths)
-    todos = parser.extract_from_files(list(input_files))
+    # Every TODO found runs its own `git blame`, reuse one shell for all of them.
+    with shell.persistent_session():
+        input_files = _collect_input_files(input_paths)
+        todos = parser.extract_from_files(list(input_files))
+
     filtered_todos = [
         t for t in todos
         if not authors or any(
@@ -0,0 +1,118 @@
+# Copyright 2017-2020 Mateusz Klos
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+################
+``peltak bench``
+################
+
+Benchmark project scripts.
+"""
+from typing import List, Optional
+
+from peltak.cli import click, peltak_cli, pretend_option, verbose_option
+
+
+@peltak_cli.command('bench')
+@click.argument('benchmarks', metavar='SCRIPT', nargs=-1, required=True)
+@click.option(
+    '-w', '--warmup',
+    type=int,
+    default=0,
+    help="How many times to run every script before measuring it.",
+)
+@click.option(
+    '-r', '--runs',
+    type=click.IntRange(min=1),
+    default=10,
+    help="How many times every script is measured.",
+)
+@click.option(
+    '-p', '--prepare',
+    metavar='SCRIPT',
+    multiple=True,
+    help="Script to run before every run, e.g. to clear caches. Not measured.",
+)
+@click.option(
+    '-c', '--cleanup',
+    metavar='SCRIPT',
+    multiple=True,
+    help="Script to run after all runs of a benchmark finished.",
+)
+@click.option(
+    '-i', '--ignore-failure',
+    is_flag=True,
+    help="Don't stop if the benchmarked script fails.",
+)
+@click.option(
+    '--show-output',
+    is_flag=True,
+    help="Show the output of the scripts. Hidden by default.",
+)
+@click.option(
+    '--export-json',
+    type=click.Path(dir_okay=False),
+    help="Write the results, including all measurements, to a JSON file.",
+)
+@click.option(
+    '--export-markdown',
+    type=click.Path(dir_okay=False),
+    help="Write the results table to a markdown file.",
+)
+@pretend_option
+@verbose_option
+def bench_cli(
+    benchmarks: List[str],
+    warmup: int,
+    runs: int,
+    prepare: List[str],
+    cleanup: List[str],
+    ignore_failure: bool,
+    show_output: bool,
+    export_json: Optional[str],
+    export_markdown: Optional[str],
+):
+    """ Benchmark scripts by running them many times.
+
+    Every SCRIPT is a script name, optionally followed by the script options
+    (quote them together), so the same script can be compared with different
+    options. Every script is run ``--warmup`` times without measuring and then
+    measured ``--runs`` times. Shows the mean, standard deviation, median, min
+    and max wall time, the user and system CPU time and the peak memory usage.
+    Given more than one script, shows how they compare to the fastest one.
+    See `peltak.core.scripts.bench` for details.
+
+    Examples::
+
+        \b
+        $ peltak bench test                         # Measure test 10 times
+        $ peltak bench -w 2 -r 20 build             # 2 warmup runs, 20 runs
+        $ peltak bench 'test' 'test --no-cov'       # Compare options
+        $ peltak bench -p clear-cache build         # clear-cache before every run
+        $ peltak bench lint --export-markdown bench.md
+
+    """
+    from . import bench_impl
+
+    bench_impl.run_benchmarks(
+        benchmarks,
+        warmup=warmup,
+        runs=runs,
+        prepare=list(prepare),
+        cleanup=list(cleanup),
+        ignore_failure=ignore_failure,
+        show_output=show_output,
+        export_json=export_json,
+        export_markdown=export_markdown,
+    )
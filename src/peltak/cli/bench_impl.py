@@ -0,0 +1,137 @@
+# Copyright 2017-2020 Mateusz Klos
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+""" Bench command implementation. """
+from typing import List, Optional
+
+from peltak.core import log, shell
+from peltak.core.context import RunContext
+from peltak.core.scripts import bench
+
+
+def run_benchmarks(
+    specs: List[str],
+    warmup: int,
+    runs: int,
+    prepare: List[str],
+    cleanup: List[str],
+    ignore_failure: bool,
+    show_output: bool,
+    export_json: Optional[str],
+    export_markdown: Optional[str],
+):
+    """ Run and print all benchmarks, then export the results. """
+    benchmarks = _parse(specs)
+    prepare_benchmarks = _parse(prepare)
+    cleanup_benchmarks = _parse(cleanup)
+
+    if RunContext().get('pretend'):
+        for benchmark in prepare_benchmarks + benchmarks + cleanup_benchmarks:
+            log.info(
+                "<35>{}<0>\n{}",
+                benchmark.name,
+                shell.highlight(benchmark.cmd, 'bash') if benchmark.cmd
+                else benchmark.script.python_file,
+            )
+        return
+
+    results = []
+    for i, benchmark in enumerate(benchmarks, 1):
+        log.info("<1>Benchmark {}: <35>{}", i, benchmark.name)
+        result = bench.measure(
+            benchmark,
+            runs=runs,
+            warmup=warmup,
+            prepare=prepare_benchmarks,
+            cleanup=cleanup_benchmarks,
+            ignore_failure=ignore_failure,
+            show_output=show_output,
+        )
+        _print_result(result)
+        results.append(result)
+
+    if len(results) > 1:
+        _print_comparison(results)
+
+    if export_json:
+        with open(export_json, 'w') as fp:
+            fp.write(bench.to_json(results))
+
+    if export_markdown:
+        with open(export_markdown, 'w') as fp:
+            fp.write(bench.to_markdown(results))
+
+
+def _parse(specs: List[str]) -> List[bench.Benchmark]:
+    return [x for spec in specs for x in bench.Benchmark.parse(spec)]
+
+
+def _print_result(result: bench.BenchResult) -> None:
+    log.info(
+        "  Time (<32>mean<0> ± <32>σ<0>):  <32>{}<0> ± <32>{}<0>"
+        "    <90>[User: {}, System: {}]",
+        _duration(result.mean),
+        _duration(result.stddev),
+        _duration(result.user),
+        _duration(result.system),
+    )
+    log.info(
+        "  Range (<36>min<0> … <35>max<0>): <36>{}<0> … <35>{}<0>"
+        "    <90>median {}, {} runs",
+        _duration(result.min),
+        _duration(result.max),
+        _duration(result.median),
+        len(result.runs),
+    )
+    log.info("  Max RSS:          {:.1f}MiB", result.max_rss / (1024 * 1024))
+    log.info("")
+
+
+def _print_comparison(results: List[bench.BenchResult]) -> None:
+    fastest = min(results, key=lambda x: x.mean)
+
+    log.info("<1>Summary")
+    log.info("  <35>{}<0> ran", fastest.name)
+    for result in results:
+        if result is fastest:
+            continue
+
+        ratio = result.mean / fastest.mean if fastest.mean else 1.0
+        log.info(
+            "    <32>{:.2f}<0> ± {:.2f} times faster than <35>{}",
+            ratio,
+            _ratio_stddev(fastest, result, ratio),
+            result.name,
+        )
+
+
+def _ratio_stddev(
+    fastest: bench.BenchResult,
+    result: bench.BenchResult,
+    ratio: float,
+) -> float:
+    # Propagation of uncertainty for a ratio of two means.
+    if not fastest.mean or not result.mean:
+        return 0.0
+
+    return ratio * (
+        (fastest.stddev / fastest.mean) ** 2 + (result.stddev / result.mean) ** 2
+    ) ** 0.5
+
+
+def _duration(seconds: float) -> str:
+    if seconds >= 1:
+        return '{:.3f} s'.format(seconds)
+
+    return '{:.1f} ms'.format(seconds * 1000)
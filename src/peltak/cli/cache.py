@@ -0,0 +1,96 @@
+# Copyright 2017-2020 Mateusz Klos
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+################
+``peltak cache``
+################
+
+Manage the caches peltak keeps for the project.
+"""
+from peltak.cli import click, peltak_cli
+
+
+@peltak_cli.group('cache')
+def cache_cli():
+    """ Manage peltak caches. """
+    pass
+
+
+@cache_cli.command('git')
+@click.option(
+    '--stats',
+    is_flag=True,
+    help="Show commit cache statistics.",
+)
+@click.option(
+    '--clear',
+    is_flag=True,
+    help="Remove all commits from the cache.",
+)
+def git_cache(stats: bool, clear: bool):
+    """ Manage the git commit cache.
+
+    The commit metadata is cached in ``.git/peltak/commits.sqlite``. Without
+    any options this is the same as ``--stats``.
+
+    Examples::
+
+        \b
+        $ peltak cache git              # Show cache statistics
+        $ peltak cache git --stats      # Same as above
+        $ peltak cache git --clear      # Remove all cached commits
+
+    """
+    from . import cache_impl
+
+    if clear:
+        cache_impl.clear_git_cache()
+
+    if stats or not clear:
+        cache_impl.show_git_cache_stats()
+
+
+@cache_cli.command('scripts')
+@click.option(
+    '--stats',
+    is_flag=True,
+    help="Show script result cache statistics.",
+)
+@click.option(
+    '--clear',
+    is_flag=True,
+    help="Remove all recorded script results.",
+)
+def scripts_cache(stats: bool, clear: bool):
+    """ Manage the script result cache.
+
+    Results of scripts that declare their ``inputs:`` are stored in
+    ``<build_dir>/script-results.sqlite``. Without any options this is the
+    same as ``--stats``.
+
+    Examples::
+
+        \b
+        $ peltak cache scripts              # Show cache statistics
+        $ peltak cache scripts --clear      # Remove all recorded results
+
+    """
+    from . import cache_impl
+
+    if clear:
+        cache_impl.clear_scripts_cache()
+
+    if stats or not clear:
+        cache_impl.show_scripts_cache_stats()
@@ -0,0 +1,77 @@
+# Copyright 2017-2020 Mateusz Klos
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+""" Cache commands implementation. """
+import sys
+
+from peltak.core import log
+from peltak.core.git import cache
+from peltak.core.scripts import result_cache
+
+
+def show_git_cache_stats():
+    """ Print git commit cache statistics. """
+    commit_cache = _get_git_cache()
+    stats = commit_cache.stats()
+
+    log.info("Path:        <33>{}", stats.path)
+    log.info("Entries:     <35>{}<0> / <35>{}", stats.entries, stats.max_entries)
+    log.info("Size:        <35>{:.1f}<0> KiB", stats.size / 1024)
+
+
+def clear_git_cache():
+    """ Remove all commits from the git commit cache. """
+    commit_cache = _get_git_cache()
+
+    log.info("Clearing <33>{}", commit_cache.path)
+    commit_cache.clear()
+
+
+def _get_git_cache() -> cache.CommitCache:
+    commit_cache = cache.open_cache()
+    if commit_cache is None:
+        log.err("Commit cache is disabled or the project is not a git repository")
+        sys.exit(1)
+
+    return commit_cache
+
+
+def show_scripts_cache_stats():
+    """ Print script result cache statistics. """
+    stats = _get_scripts_cache().stats()
+
+    log.info("Path:        <33>{}", stats.path)
+    log.info("Entries:     <35>{}", stats.entries)
+    log.info(
+        "Size:        <35>{:.1f}<0> / <35>{:.1f}<0> KiB",
+        stats.size / 1024,
+        stats.max_size / 1024,
+    )
+
+
+def clear_scripts_cache():
+    """ Remove all recorded script results. """
+    results = _get_scripts_cache()
+
+    log.info("Clearing <33>{}", results.path)
+    results.clear()
+
+
+def _get_scripts_cache() -> result_cache.ResultCache:
+    results = result_cache.open_result_cache()
+    if results is None:
+        log.err("Script result cache is disabled or build_dir is not configured")
+        sys.exit(1)
+
+    return results
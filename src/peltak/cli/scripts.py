@@ -87,16 +87,148 @@ Example
           pylint --rc-file ops/tools/pylint.ini {{files}};
 """
 from pathlib import Path
+from typing import List, Optional, Tuple
 
-from peltak.cli import peltak_cli
+from peltak.cli import click, peltak_cli, pretend_option, verbose_option
 from peltak.core import conf, hooks
 from peltak.core.scripts import loader
 
 
-@peltak_cli.group('run')
-def run_cli():
-    """ Run custom scripts """
-    pass  # nocov
+def _parse_shard(
+    ctx: click.Context,
+    param: click.Parameter,
+    value: Optional[str],
+) -> Optional[Tuple[int, int]]:
+    if value is None:
+        return None
+
+    try:
+        index, count = (int(x) for x in value.split('/'))
+    except ValueError:
+        raise click.BadParameter("must be in the form i/N, e.g. 2/4")
+
+    if not 1 <= index <= count:
+        raise click.BadParameter("shard index must be between 1 and N")
+
+    from peltak.core import context
+    context.set('shard', (index, count))
+    return index, count
+
+
+@peltak_cli.command('run')
+@click.argument('names', metavar='SCRIPT', nargs=-1)
+@click.option(
+    '-j', '--jobs',
+    type=int,
+    default=1,
+    help=("How many scripts can run at the same time. make and other tools that "
+          "support the make jobserver share the same limit."),
+)
+@click.option(
+    '--no-cache',
+    is_flag=True,
+    help="Run scripts even if their inputs didn't change since the last run.",
+)
+@click.option(
+    '--shard',
+    metavar='i/N',
+    callback=_parse_shard,
+    expose_value=False,
+    help=("Only process the i-th of N shards of the script files. Shards are "
+          "balanced using the durations recorded in previous runs."),
+)
+@click.option(
+    '--exec', 'use_exec',
+    is_flag=True,
+    help=("Replace the peltak process with the script once its dependencies "
+          "finished. Only works for a single script."),
+)
+@click.option(
+    '--at', 'revs',
+    metavar='REV[,REV...]',
+    multiple=True,
+    help=("Run the scripts at the given git revisions instead of the working "
+          "copy, all at the same time, and compare the results."),
+)
+@click.option('--report', type=click.Path(dir_okay=False), hidden=True)
+@pretend_option
+@verbose_option
+def run_cli(
+    names: List[str],
+    jobs: int,
+    no_cache: bool,
+    use_exec: bool,
+    revs: Tuple[str, ...],
+    report: Optional[str],
+):
+    """ Run custom scripts and their dependencies.
+
+    Scripts are named by their path relative to ``scripts_dir``, without the
+    extension. Scripts can declare other scripts that have to finish
+    successfully before they run with ``depends_on`` in their header. The
+    scripts are run with default values for all their options.
+
+    Scripts that declare their ``inputs:`` are skipped (and their previous
+    output replayed) if the command and inputs didn't change since the last
+    successful run. Use ``--no-cache`` to always run them.
+
+    With ``--shard i/N`` the ``{{ files }}`` of every script are split into N
+    shards of roughly equal duration (based on previous runs) and only the
+    i-th shard is processed. This lets CI spread the work across N machines.
+    All the machines should share the timings file, see
+    `peltak.core.scripts.timings`.
+
+    With ``--exec`` (or ``exec: true`` in the script header) the script
+    replaces the peltak process instead of running as its child. Good for
+    long running scripts, like dev servers. Only a single script can be
+    given and it can't be a matrix, batch or python script.
+
+    With ``--at`` the scripts are run at the given revisions, in reusable
+    git worktrees under ``build_dir``, without touching the working copy. The
+    revisions run at the same time and their results are shown side by side.
+    See `peltak.core.scripts.revisions`.
+
+    Without any scripts given, it will list all available scripts.
+
+    Examples::
+
+        \b
+        $ peltak run                            # List available scripts
+        $ peltak run check                      # Run check and its dependencies
+        $ peltak run -j 4 mypy pylint isort     # Run 3 scripts in parallel
+        $ peltak run ci/check-commit            # Run <scripts_dir>/ci/check-commit.sh
+        $ peltak run --no-cache docs            # Build docs even if up to date
+        $ peltak run --shard 2/4 test           # Test the second of 4 shards
+        $ peltak run --exec serve               # serve replaces peltak
+        $ peltak run --at main,HEAD bench       # Compare main and HEAD
+
+    """
+    if not names:
+        for name in loader.script_names():
+            click.echo(name)
+        return
+
+    if revs:
+        if use_exec:
+            raise click.UsageError("--exec can't be used together with --at")
+
+        from peltak.core.scripts import revisions
+        revisions.run_at_revisions(
+            list(names),
+            [rev for value in revs for rev in value.split(',') if rev],
+            jobs,
+            use_cache=not no_cache,
+        )
+        return
+
+    from peltak.core.scripts import logic
+    logic.run_scripts(
+        list(names),
+        jobs,
+        use_cache=not no_cache,
+        use_exec=use_exec,
+        report_file=report,
+    )
 
 
 @hooks.register('post-conf-load')
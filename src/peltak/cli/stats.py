@@ -0,0 +1,83 @@
+# Copyright 2017-2020 Mateusz Klos
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+################
+``peltak stats``
+################
+
+Show how long the project scripts take and how that changes over time.
+"""
+from typing import Optional
+
+from peltak.cli import click, peltak_cli
+
+
+@peltak_cli.command('stats')
+@click.argument('script', required=False)
+@click.option(
+    '-n', '--last',
+    type=int,
+    default=20,
+    help="How many of the latest runs to show for a single script.",
+)
+@click.option(
+    '--window',
+    type=int,
+    default=5,
+    help="How many of the latest runs are compared against the ones before.",
+)
+@click.option(
+    '--threshold',
+    type=float,
+    default=1.5,
+    help="Report scripts that got at least that many times slower.",
+)
+@click.option(
+    '--clear',
+    is_flag=True,
+    help="Remove all recorded runs.",
+)
+def stats_cli(
+    script: Optional[str],
+    last: int,
+    window: int,
+    threshold: float,
+    clear: bool,
+):
+    """ Show script run statistics.
+
+    Every script run is recorded in ``<build_dir>/script-history.sqlite``.
+    Without arguments this shows timings of all scripts, slowest first, and
+    the scripts that got slower: the median of their latest ``--window`` runs
+    is at least ``--threshold`` times the median of the runs before. Given a
+    script name, it shows the latest runs of that script.
+
+    Examples::
+
+        \b
+        $ peltak stats                      # All scripts, slowest first
+        $ peltak stats checks               # Latest runs of checks
+        $ peltak stats --threshold 1.2      # Report 20% slowdowns
+        $ peltak stats --clear              # Remove the history
+
+    """
+    from . import stats_impl
+
+    if clear:
+        stats_impl.clear_history()
+    elif script:
+        stats_impl.show_script_runs(script, last, window)
+    else:
+        stats_impl.show_stats(window, threshold)
@@ -0,0 +1,140 @@
+# Copyright 2017-2020 Mateusz Klos
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+""" Stats command implementation. """
+import sys
+import time
+from typing import Optional
+
+from peltak.core import log
+from peltak.core.scripts import history
+
+
+def show_stats(window: int, threshold: float):
+    """ Print timings of all scripts and the ones that got slower. """
+    stats = sorted(
+        _get_history().stats(window),
+        key=lambda x: x.p50,
+        reverse=True,
+    )
+
+    if not stats:
+        log.info("No script runs recorded yet")
+        return
+
+    width = max(len(x.script) for x in stats)
+    log.info(
+        "<90>{}  {:>5} {:>6} {:>8} {:>8} {:>8} {:>8} {:>7}",
+        'script'.ljust(width), 'runs', 'failed', 'p50', 'p95', 'max', 'last',
+        'change',
+    )
+    for stat in stats:
+        log.info(
+            "<35>{}<0>  {:5} {:6} {:>8} {:>8} {:>8} {:>8} {}",
+            stat.script.ljust(width),
+            stat.runs,
+            stat.failed,
+            _duration(stat.p50),
+            _duration(stat.p95),
+            _duration(stat.max),
+            _duration(stat.last),
+            _change(stat.change, threshold),
+        )
+
+    slower = [
+        x for x in stats if x.change is not None and x.change >= threshold
+    ]
+    if slower:
+        log.info("")
+        log.info("<31>Scripts that got slower:")
+        for stat in sorted(slower, key=lambda x: x.change or 0, reverse=True):
+            log.info(
+                "  <35>{}<0>  {} -> {} (<31>{:.1f}x<0>)",
+                stat.script,
+                _duration(stat.baseline or 0),
+                _duration(stat.recent),
+                stat.change,
+            )
+
+
+def show_script_runs(script: str, last: int, window: int):
+    """ Print the latest runs of the given script. """
+    runs = _get_history().runs(script)
+    if not runs:
+        log.err("No runs of <35>{}<31> recorded", script)
+        sys.exit(1)
+
+    stat = history.ScriptStats.from_runs(script, runs, window)
+    if stat is not None:
+        log.info(
+            "<35>{}<0>: {} runs, {} failed, p50 {}, p95 {}, max {}",
+            script,
+            stat.runs,
+            stat.failed,
+            _duration(stat.p50),
+            _duration(stat.p95),
+            _duration(stat.max),
+        )
+
+    log.info(
+        "<90>{:19}  {:>8} {:>8} {:>9} {:>6} {:>5}  {}",
+        'started', 'wall', 'cpu', 'max rss', 'files', 'exit', 'command',
+    )
+    prev_hash = None
+    for run in runs[-last:]:
+        log.info(
+            "{}  {:>8} {:>8} {:>6.1f}MiB {:>6} <{}>{:>5}<0>  <90>{}{}",
+            time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(run.started)),
+            _duration(run.wall_time),
+            _duration(run.cpu_time),
+            run.max_rss / (1024 * 1024),
+            '-' if run.files is None else run.files,
+            32 if run.success else 31,
+            run.retcode,
+            run.cmd_hash,
+            ' <33>(changed)' if prev_hash not in (None, run.cmd_hash) else '',
+        )
+        prev_hash = run.cmd_hash
+
+
+def clear_history():
+    """ Remove all recorded script runs. """
+    run_history = _get_history()
+
+    log.info("Clearing <33>{}", run_history.path)
+    run_history.clear()
+
+
+def _get_history() -> history.RunHistory:
+    run_history = history.open_history()
+    if run_history is None:
+        log.err("Script history is disabled or build_dir is not configured")
+        sys.exit(1)
+
+    return run_history
+
+
+def _duration(seconds: float) -> str:
+    if seconds >= 60:
+        return '{}m{:02.0f}s'.format(int(seconds // 60), seconds % 60)
+
+    return '{:.2f}s'.format(seconds)
+
+
+def _change(change: Optional[float], threshold: float) -> str:
+    if change is None:
+        return '{:>7}'.format('-')
+
+    color = 31 if change >= threshold else 32 if change <= 1 / threshold else 0
+    return '<{}>{:>6.2f}x<0>'.format(color, change)
@@ -170,6 +170,15 @@ def write_file(path: str, content: Union[str, bytes], mode: str = 'w') -> None:
 
 def collect_files(files: types.FilesCollection) -> List[str]:
     """ Collect files using the given configuration. """
+    return list(iter_files(files))
+
+
+def iter_files(files: types.FilesCollection) -> Iterator[str]:
+    """ Lazily collect files using the given configuration.
+
+    Same as `collect_files()` but yields the files as they are found, without
+    building the whole list first.
+    """
     paths = [conf.proj_path(p) for p in files.paths]
 
     if context.RunContext().get('verbose', 0) >= 3:
@@ -184,9 +193,10 @@ def collect_files(files: types.FilesCollection) -> List[str]:
         # and thus the final fs walk will pick up everything. We want
         # to preserve the include patterns defined in `pelconf.yaml`
         # so nothing is picked if none of the staged files match.
-        return []
+        return
 
-    return list(itertools.chain.from_iterable(
-        filtered_walk(path, files.whitelist(), files.blacklist())
-        for path in paths
-    ))
+    whitelist = files.whitelist()
+    blacklist = files.blacklist()
+    yield from itertools.chain.from_iterable(
+        filtered_walk(path, whitelist, blacklist) for path in paths
+    )
@@ -16,16 +16,43 @@
 .. module:: peltak.core.git
     :synopsis: Git helpers.
 """
+from .backend import (  # noqa:  F401
+    CliBackend,
+    GitBackend,
+    NativeBackend,
+    get_backend,
+)
 from .branch import (  # noqa:  F401
     branches,
     commit_branches,
     commit_details,
     current_branch,
     guess_base_branch,
+    iter_commits,
     latest_commit,
     protected_branches,
     verify_branch,
 )
-from .status import staged, unstaged, untracked  # noqa:  F401
-from .types import Author, BranchDetails, CommitDetails  # noqa:  F401
+from .catfile import CatFilePool, object_info, read_object  # noqa:  F401
+from .graph import CommitGraph, commit_graph  # noqa:  F401
+from .repo import RepoReader  # noqa:  F401
+from .status import (  # noqa:  F401
+    repo_state,
+    staged,
+    status_snapshot,
+    unstaged,
+    untracked,
+)
+from .types import (  # noqa:  F401
+    Author,
+    BranchDetails,
+    CommitDetails,
+    GitObject,
+    ObjectInfo,
+    ObjectNotFound,
+    StatusEntry,
+    StatusSnapshot,
+    SubmoduleState,
+)
 from .util import commit_author, config, ignore, tag, tags  # noqa:  F401
+from .worktree import UnknownRevision, WorktreePool  # noqa:  F401
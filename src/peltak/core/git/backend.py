@@ -0,0 +1,550 @@
+# Copyright 2017-2020 Mateusz Klos
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+""" Pluggable backends for reading git objects.
+
+There are two backends:
+
+``cli``
+    The default. Uses the git CLI.
+``native``
+    Reads loose objects and packfiles directly, without spawning any
+    processes. Useful for read heavy workloads like generating changelogs.
+
+The backend is selected with the ``git.backend`` config value::
+
+    git:
+      backend: native
+"""
+import collections
+import mmap
+import os
+import struct
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+from .. import conf, exc, log, shell, util
+from . import catfile
+from .repo import RepoReader, Unsupported
+from .types import (
+    COMMIT_FORMAT,
+    CommitDetails,
+    GitObject,
+    ObjectInfo,
+    ObjectNotFound,
+)
+
+
+OBJ_TYPES = {1: 'commit', 2: 'tree', 3: 'blob', 4: 'tag'}
+OBJ_OFS_DELTA = 6
+OBJ_REF_DELTA = 7
+IDX_MAGIC = b'\377tOc'
+# How many unpacked objects are kept in memory to be reused as delta bases.
+DELTA_CACHE_SIZE = 256
+
+
+class UnknownBackend(exc.PeltakError):
+    msg = "Unknown git backend"
+
+
+class GitBackend(object):
+    """ Interface for reading objects from a git repository.
+
+    Backends only have to implement `read_object()`, everything else is
+    built on top of it. They can override other methods if they can do it
+    faster.
+    """
+    name = ''
+
+    def __init__(self, repo_path: str):
+        self.repo_path = repo_path
+
+    def read_object(self, sha1: str) -> GitObject:
+        """ Read a git object.
+
+        Raises:
+            ObjectNotFound: If there is no object with the given SHA1.
+        """
+        raise NotImplementedError()
+
+    def object_info(self, sha1: str) -> ObjectInfo:
+        """ Return object type and size.
+
+        Raises:
+            ObjectNotFound: If there is no object with the given SHA1.
+        """
+        obj = self.read_object(sha1)
+        return ObjectInfo(sha1, obj.type, len(obj.data))
+
+    def commits(self, sha1s: List[str]) -> List[CommitDetails]:
+        """ Load details for all the given commits. """
+        return [
+            parse_commit(sha1, self._read_typed(sha1, 'commit'))
+            for sha1 in sha1s
+        ]
+
+    def blob(self, sha1: str) -> bytes:
+        """ Return the content of the given blob. """
+        return self._read_typed(sha1, 'blob')
+
+    def close(self) -> None:
+        """ Release all resources held by the backend. """
+        pass
+
+    def _read_typed(self, sha1: str, obj_type: str) -> bytes:
+        obj = self.read_object(sha1)
+
+        if obj.type != obj_type:
+            raise ObjectNotFound("{} is a {}, not a {}".format(
+                sha1, obj.type, obj_type
+            ))
+
+        return obj.data
+
+
+class CliBackend(GitBackend):
+    """ Reads objects using the git CLI.
+
+    Objects are read through long lived ``git cat-file`` processes, see
+    `peltak.core.git.catfile`.
+    """
+    name = 'cli'
+
+    def read_object(self, sha1: str) -> GitObject:
+        return catfile.get_pool('batch', self.repo_path).read(sha1)
+
+    def object_info(self, sha1: str) -> ObjectInfo:
+        return catfile.get_pool('batch-check', self.repo_path).info(sha1)
+
+    def close(self) -> None:
+        catfile.close_pools(self.repo_path)
+
+    def commits(self, sha1s: List[str]) -> List[CommitDetails]:
+        if not sha1s:
+            return []
+
+        cmd = 'git show -s -z --format="{}" {}'.format(
+            COMMIT_FORMAT,
+            ' '.join(sha1s),
+        )
+        # git fails if any of the commits is missing, the ones that exist are
+        # still printed. Report the missing ones below.
+        records = shell.iter_records(cmd, cwd=self.repo_path, check=False)
+        commits = list(CommitDetails._from_records(records))
+
+        if len(commits) != len(sha1s):
+            found = {commit.sha1 for commit in commits}
+            raise ObjectNotFound(', '.join(x for x in sha1s if x not in found))
+
+        return commits
+
+
+class NativeBackend(GitBackend):
+    """ Reads loose objects and packfiles directly.
+
+    Packs are memory mapped and looked up through their ``.idx`` files. Only
+    the v2 index format is supported (the default since git 1.5.2).
+    """
+    name = 'native'
+
+    def __init__(self, repo_path: str):
+        super(NativeBackend, self).__init__(repo_path)
+
+        reader = RepoReader.discover(repo_path)
+        if reader is None:
+            raise Unsupported("Not a git repository: {}".format(repo_path))
+
+        self.objects_dirs = [os.path.join(reader.common_dir, 'objects')]
+        self.objects_dirs += _read_alternates(self.objects_dirs[0])
+        self._packs: Optional[Dict[str, 'Pack']] = None
+        self._cache: 'collections.OrderedDict[Tuple[str, int], GitObject]' = (
+            collections.OrderedDict()
+        )
+
+    def read_object(self, sha1: str) -> GitObject:
+        obj = self._read_loose(sha1)
+        if obj is not None:
+            return obj
+
+        obj = self._read_packed(bytes.fromhex(sha1), rescan=True)
+        if obj is None:
+            raise ObjectNotFound(sha1)
+
+        return obj
+
+    def close(self) -> None:
+        for pack in (self._packs or {}).values():
+            pack.close()
+
+        self._packs = None
+        self._cache.clear()
+
+    def _read_loose(self, sha1: str) -> Optional[GitObject]:
+        for objects_dir in self.objects_dirs:
+            path = os.path.join(objects_dir, sha1[:2], sha1[2:])
+            try:
+                with open(path, 'rb') as fp:
+                    raw = zlib.decompress(fp.read())
+            except FileNotFoundError:
+                continue
+
+            header, _, data = raw.partition(b'\0')
+            obj_type, size = header.split()
+            return GitObject(obj_type.decode('ascii'), data[:int(size)])
+
+        return None
+
+    def _read_packed(self, sha1: bytes, rescan: bool) -> Optional[GitObject]:
+        for pack in self._get_packs().values():
+            offset = pack.find(sha1)
+            if offset is not None:
+                return self._read_pack_entry(pack, offset)
+
+        if rescan:
+            # The object might be in a pack created after we've scanned.
+            self._get_packs(refresh=True)
+            return self._read_packed(sha1, rescan=False)
+
+        return None
+
+    def _read_pack_entry(self, pack: 'Pack', offset: int) -> GitObject:
+        key = (pack.path, offset)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            return cached
+
+        obj_type, data_offset, base = pack.read_header(offset)
+
+        if obj_type == OBJ_OFS_DELTA:
+            base_obj = self._read_pack_entry(pack, base)   # type: ignore
+            obj = GitObject(
+                base_obj.type,
+                apply_delta(base_obj.data, pack.inflate(data_offset)),
+            )
+        elif obj_type == OBJ_REF_DELTA:
+            base_obj = self.read_object(base.hex())   # type: ignore
+            obj = GitObject(
+                base_obj.type,
+                apply_delta(base_obj.data, pack.inflate(data_offset)),
+            )
+        else:
+            obj = GitObject(OBJ_TYPES[obj_type], pack.inflate(data_offset))
+
+        # Objects in the same delta chain share bases, keep the recent ones.
+        self._cache[key] = obj
+        if len(self._cache) > DELTA_CACHE_SIZE:
+            self._cache.popitem(last=False)
+
+        return obj
+
+    def _get_packs(self, refresh: bool = False) -> Dict[str, 'Pack']:
+        if self._packs is None or refresh:
+            packs = self._packs or {}
+            self._packs = {}
+
+            for objects_dir in self.objects_dirs:
+                pack_dir = os.path.join(objects_dir, 'pack')
+                if not os.path.isdir(pack_dir):
+                    continue
+
+                for name in sorted(os.listdir(pack_dir)):
+                    if not name.endswith('.idx'):
+                        continue
+
+                    path = os.path.join(pack_dir, name[:-len('.idx')])
+                    self._packs[path] = packs.pop(path) if path in packs else Pack(path)
+
+            for stale in packs.values():
+                stale.close()
+
+        return self._packs
+
+
+class Pack(object):
+    """ A memory mapped packfile with its v2 index.
+
+    Args:
+        path (str):
+            Path to the pack without the ``.idx``/``.pack`` extension.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.idx = _mmap(path + '.idx')
+        self.pack = _mmap(path + '.pack')
+
+        if self.idx[:4] != IDX_MAGIC or struct.unpack('>I', self.idx[4:8])[0] != 2:
+            self.close()
+            raise Unsupported("Unsupported pack index: {}.idx".format(path))
+
+        if self.pack[:4] != b'PACK':
+            self.close()
+            raise ValueError("Invalid pack file: {}.pack".format(path))
+
+        self.fanout = struct.unpack('>256I', self.idx[8:8 + 256 * 4])
+        self.count = self.fanout[255]
+        self._sha1s_start = 8 + 256 * 4
+        self._offsets_start = self._sha1s_start + self.count * (20 + 4)
+        self._large_offsets_start = self._offsets_start + self.count * 4
+
+    def close(self) -> None:
+        """ Unmap the pack and index files. """
+        self.idx.close()
+        self.pack.close()
+
+    def find(self, sha1: bytes) -> Optional[int]:
+        """ Return the offset of the given object in the pack or **None**. """
+        lo = self.fanout[sha1[0] - 1] if sha1[0] else 0
+        hi = self.fanout[sha1[0]]
+        start = self._sha1s_start
+
+        while lo < hi:
+            mid = (lo + hi) // 2
+            pos = start + mid * 20
+            curr = self.idx[pos:pos + 20]
+
+            if curr < sha1:
+                lo = mid + 1
+            elif curr > sha1:
+                hi = mid
+            else:
+                return self._offset(mid)
+
+        return None
+
+    def read_header(self, offset: int) -> Tuple[int, int, Optional[object]]:
+        """ Read the object header at the given offset.
+
+        Returns:
+            tuple[int, int, object]: ``(type, data_offset, base)``. *base* is
+            the base object offset for OFS_DELTA, base SHA1 bytes for
+            REF_DELTA and **None** for everything else.
+        """
+        pack = self.pack
+        byte = pack[offset]
+        obj_type = (byte >> 4) & 0x7
+        pos = offset + 1
+
+        # Skip the size, we get it from zlib anyway.
+        while byte & 0x80:
+            byte = pack[pos]
+            pos += 1
+
+        if obj_type == OBJ_OFS_DELTA:
+            byte = pack[pos]
+            pos += 1
+            rel = byte & 0x7f
+            while byte & 0x80:
+                byte = pack[pos]
+                pos += 1
+                rel = ((rel + 1) << 7) | (byte & 0x7f)
+
+            return obj_type, pos, offset - rel
+
+        elif obj_type == OBJ_REF_DELTA:
+            return obj_type, pos + 20, pack[pos:pos + 20]
+
+        return obj_type, pos, None
+
+    def inflate(self, offset: int) -> bytes:
+        """ Decompress zlib stream starting at *offset*. """
+        decompressor = zlib.decompressobj()
+        chunks = []
+        pos = offset
+
+        while not decompressor.eof:
+            chunk = self.pack[pos:pos + 65536]
+            if not chunk:
+                raise ValueError("Truncated pack file: {}.pack".format(self.path))
+
+            chunks.append(decompressor.decompress(chunk))
+            pos += len(chunk)
+
+        return b''.join(chunks)
+
+    def _offset(self, index: int) -> int:
+        pos = self._offsets_start + index * 4
+        offset = struct.unpack('>I', self.idx[pos:pos + 4])[0]
+
+        if offset & 0x80000000:
+            pos = self._large_offsets_start + (offset & 0x7fffffff) * 8
+            offset = struct.unpack('>Q', self.idx[pos:pos + 8])[0]
+
+        return offset
+
+
+def apply_delta(base: bytes, delta: bytes) -> bytes:
+    """ Reconstruct an object from its base and a git delta.
+
+    Args:
+        base (bytes):
+            The base object data.
+        delta (bytes):
+            The delta as stored in the pack (after decompression).
+
+    Returns:
+        bytes: The reconstructed object data.
+    """
+    base_size, pos = _read_varint(delta, 0)
+    result_size, pos = _read_varint(delta, pos)
+
+    if base_size != len(base):
+        raise ValueError("Delta base size mismatch")
+
+    out = bytearray()
+    while pos < len(delta):
+        cmd = delta[pos]
+        pos += 1
+
+        if cmd & 0x80:
+            copy_offset = copy_size = 0
+            for i in range(4):
+                if cmd & (1 << i):
+                    copy_offset |= delta[pos] << (i * 8)
+                    pos += 1
+            for i in range(3):
+                if cmd & (1 << (4 + i)):
+                    copy_size |= delta[pos] << (i * 8)
+                    pos += 1
+
+            out += base[copy_offset:copy_offset + (copy_size or 0x10000)]
+        elif cmd:
+            out += delta[pos:pos + cmd]
+            pos += cmd
+        else:
+            raise ValueError("Invalid delta opcode")
+
+    if len(out) != result_size:
+        raise ValueError("Delta result size mismatch")
+
+    return bytes(out)
+
+
+def parse_commit(sha1: str, data: bytes) -> CommitDetails:
+    """ Parse raw commit object.
+
+    The title and description are extracted the same way git does for the
+    ``%s`` and ``%b`` pretty formats.
+    """
+    raw_headers, _, raw_message = data.partition(b'\n\n')
+    headers: Dict[str, List[bytes]] = collections.defaultdict(list)
+
+    for line in raw_headers.split(b'\n'):
+        # Lines starting with space continue multi-line headers (gpgsig).
+        if line and not line.startswith(b' '):
+            name, _, value = line.partition(b' ')
+            headers[name.decode('ascii')].append(value)
+
+    encoding = b''.join(headers.get('encoding', [b'utf-8'])).decode('ascii')
+    author = headers['author'][0].decode(encoding, 'replace')
+    author_name, _, email = author.partition('<')
+    lines = raw_message.decode(encoding, 'replace').split('\n')
+    pos = _skip_blank_lines(lines, 0)
+
+    title_lines = []
+    while pos < len(lines) and lines[pos].strip():
+        title_lines.append(lines[pos].rstrip())
+        pos += 1
+
+    pos = _skip_blank_lines(lines, pos)
+
+    return CommitDetails.create(
+        sha1,
+        author_name.strip(),
+        email.split('>', 1)[0],
+        ' '.join(title_lines),
+        '\n'.join(lines[pos:]),
+        b' '.join(headers['parent']).decode('ascii'),
+    )
+
+
+@util.cached_result()
+def get_backend() -> GitBackend:
+    """ Return the git backend configured for the project.
+
+    If the native backend can't read the repository, this will fall back to
+    the CLI backend.
+
+    Returns:
+        GitBackend: The backend selected with ``git.backend`` config value.
+    """
+    name = conf.get('git.backend', 'cli')
+
+    if name == 'cli':
+        return CliBackend(conf.proj_path())
+    elif name == 'native':
+        try:
+            return NativeBackend(conf.proj_path())
+        except Unsupported as ex:
+            log.dbg("Native git backend not available: {}", ex)
+            return CliBackend(conf.proj_path())
+
+    raise UnknownBackend(name)
+
+
+def load_commits(sha1s: List[str]) -> List[CommitDetails]:
+    """ Load commit details through the configured backend.
+
+    If the native backend can't find some of the commits (for example in
+    a partial clone), they are loaded with the git CLI instead.
+    """
+    backend = get_backend()
+
+    try:
+        return backend.commits(sha1s)
+    except ObjectNotFound as ex:
+        if isinstance(backend, CliBackend):
+            raise
+
+        log.dbg("Loading commits with git CLI: {}", ex)
+        return CliBackend(backend.repo_path).commits(sha1s)
+
+
+def _mmap(path: str) -> mmap.mmap:
+    with open(path, 'rb') as fp:
+        return mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _read_alternates(objects_dir: str) -> List[str]:
+    path = os.path.join(objects_dir, 'info', 'alternates')
+    if not os.path.isfile(path):
+        return []
+
+    with open(path) as fp:
+        lines = [x.strip() for x in fp]
+
+    return [
+        os.path.normpath(os.path.join(objects_dir, x))
+        for x in lines
+        if x and not x.startswith('#')
+    ]
+
+
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        shift += 7
+
+        if not byte & 0x80:
+            return value, pos
+
+
+def _skip_blank_lines(lines: List[str], pos: int) -> int:
+    while pos < len(lines) and not lines[pos].strip():
+        pos += 1
+
+    return pos
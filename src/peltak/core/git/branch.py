@@ -1,27 +1,36 @@
-from typing import List, Optional
+from typing import Iterator, List, Optional
 
 from .. import conf, shell, util
+from . import repo
+from .graph import commit_graph
+from .repo import RepoReader
+from .status import repo_state
 from .types import BranchDetails, CommitDetails
 
 
-@util.cached_result()
+@util.memoize(tokens=[repo_state])
 def current_branch() -> BranchDetails:
     """ Return the BranchDetails for the current branch.
 
+    HEAD is read directly from ``.git`` if possible, otherwise this falls back
+    to ``git symbolic-ref``.
+
     Return:
         BranchDetails: The details of the current branch.
     """
-    cmd = 'git symbolic-ref --short HEAD'
-    branch_name = shell.run(
-        cmd,
-        capture=True,
-        never_pretend=True
-    ).stdout.strip()
+    branch_name = repo.read(RepoReader.current_branch)
+
+    if branch_name is None:
+        branch_name = shell.run(
+            'git symbolic-ref --short HEAD',
+            capture=True,
+            never_pretend=True
+        ).stdout.strip()
 
     return BranchDetails.parse(branch_name)
 
 
-@util.cached_result()
+@util.memoize(tokens=[repo_state])
 def latest_commit() -> CommitDetails:
     """ Return details for the latest commit.
 
@@ -47,17 +56,34 @@ def commit_details(sha1: str = '') -> CommitDetails:
     return CommitDetails.get(sha1)
 
 
+def iter_commits(
+    rev_range: str = 'HEAD',
+    max_count: Optional[int] = None,
+) -> Iterator[CommitDetails]:
+    """ Lazily iterate over all commits in the given revision range.
+
+    This is a shortcut for `CommitDetails.get_many()`, see it for details.
+
+    Args:
+        rev_range (str):
+            Anything ``git log`` accepts as the revision range, for example
+            ``v1.0.0..HEAD``.
+        max_count (int):
+            If given, load at most that many commits.
+
+    Returns:
+        Iterator[CommitDetails]: Commits in the range, newest first.
+    """
+    return CommitDetails.get_many(rev_range, max_count)
+
+
 def commit_branches(sha1: str) -> List[str]:
     """ Get the name of the branches that this commit belongs to. """
-    cmd = 'git branch --contains {}'.format(sha1)
-    return shell.run(
-        cmd,
-        capture=True,
-        never_pretend=True
-    ).stdout.strip().split()
+    graph = commit_graph()
+    return graph.branches_containing(graph.resolve(sha1))
 
 
-@util.cached_result()
+@util.memoize(tokens=[repo_state])
 def guess_base_branch() -> Optional[str]:
     """ Try to guess the base branch for the current branch.
 
@@ -70,56 +96,31 @@ def guess_base_branch() -> Optional[str]:
         Optional[str]: The name of the base branch for the current branch if
         guessable or **None** if can't guess.
     """
-    my_branch = current_branch(refresh=True).name
-
-    curr = latest_commit()
-    if len(curr.branches) > 1:
-        # We're possibly at the beginning of the new branch (currently both
-        # on base and new branch).
-        other = [x for x in curr.branches if x != my_branch]
-        if len(other) == 1:
-            return other[0]
-        return None
-    else:
-        # We're on one branch
-        parent = curr
-
-        while parent and my_branch in parent.branches:
-            curr = parent
-
-            if len(curr.branches) > 1:
-                other = [x for x in curr.branches if x != my_branch]
-                if len(other) == 1:
-                    return other[0]
-                return None
-
-            parents = [p for p in curr.parents if my_branch in p.branches]
-            num_parents = len(parents)
-
-            if num_parents > 2:
-                # More than two parent, give up
-                return None
-            if num_parents == 2:
-                # This is a merge commit.
-                for p in parents:
-                    if p.branches == [my_branch]:
-                        parent = p
-                        break
-            elif num_parents == 1:
-                parent = parents[0]
-            elif num_parents == 0:
-                parent = None
+    my_branch = current_branch().name
+    graph = commit_graph()
+    fork_point = graph.fork_point(my_branch)
 
+    if fork_point is None:
         return None
 
+    other = [x for x in graph.branches_containing(fork_point) if x != my_branch]
+    if len(other) == 1:
+        return other[0]
 
-@util.cached_result()
+    return None
+
+
+@util.memoize(tokens=[repo_state])
 def branches() -> List[str]:
     """ Return a list of branches in the current repo.
 
     Returns:
         list[str]: A list of branches in the current repo.
     """
+    result = repo.read(RepoReader.branches)
+    if result is not None:
+        return result
+
     out = shell.run(
         'git branch',
         capture=True,
@@ -0,0 +1,267 @@
+# Copyright 2017-2021 Mateusz Klos
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+""" Persistent cache of commit metadata.
+
+Commits are immutable so once read, their details can be stored forever (or
+until evicted). The cache lives in ``.git/peltak/commits.sqlite`` so it's
+private to the repository and goes away with it.
+
+Configuration (all optional)::
+
+    git:
+      commit_cache:
+        enabled: true
+        max_entries: 50000
+"""
+import atexit
+import dataclasses
+import os
+import re
+import sqlite3
+import time
+from typing import Dict, Iterable, List, Optional, Set
+
+from .. import conf, log
+from .types import CommitDetails
+
+
+DEFAULT_MAX_ENTRIES = 50000
+RE_SHA1 = re.compile(r'^[0-9a-f]{40}$')
+# SQLite has a limit on the number of query parameters.
+MAX_QUERY_PARAMS = 500
+
+_cache: Optional['CommitCache'] = None
+
+
+@dataclasses.dataclass
+class CacheStats:
+    """ Commit cache statistics.
+
+    Attributes:
+        path (str):
+            Path to the cache database.
+        entries (int):
+            Number of commits stored in the cache.
+        max_entries (int):
+            The maximum number of commits stored before the least recently
+            used ones are evicted.
+        size (int):
+            Size of the cache database in bytes.
+    """
+    path: str
+    entries: int
+    max_entries: int
+    size: int
+
+
+class CommitCache(object):
+    """ SQLite backed store of commit details keyed by SHA1.
+
+    All errors are logged and swallowed, a broken cache should never break
+    the command using it. In that case it just behaves as if it was empty.
+
+    Reads don't write to the database. The commits that were read are marked
+    as recently used all at once, with the next write or when the cache is
+    closed.
+    """
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS commits (
+            sha1 TEXT PRIMARY KEY,
+            author_name TEXT NOT NULL,
+            author_email TEXT NOT NULL,
+            title TEXT NOT NULL,
+            desc TEXT NOT NULL,
+            parents TEXT NOT NULL,
+            last_used REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS commits_last_used ON commits(last_used);
+    '''
+
+    def __init__(self, path: str, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._db: Optional[sqlite3.Connection] = None
+        self._used: Set[str] = set()
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        """ Lazily opened database connection. """
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._db = sqlite3.connect(self.path, timeout=5)
+            self._db.executescript(self.SCHEMA)
+
+        return self._db
+
+    def close(self) -> None:
+        """ Store the pending last use times and close the database. """
+        if self._used:
+            try:
+                self._flush_used()
+                self.db.commit()
+            except sqlite3.Error as ex:
+                log.dbg("Commit cache write failed: {}", ex)
+
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def get(self, sha1: str) -> Optional[CommitDetails]:
+        """ Return cached details for the given commit or **None** on miss. """
+        return self.get_many([sha1]).get(sha1)
+
+    def get_many(self, sha1s: List[str]) -> Dict[str, CommitDetails]:
+        """ Return cached details for all the given commits that are cached.
+
+        Returns:
+            dict[str, CommitDetails]: Cached commits mapped by their SHA1. The
+            commits that are not cached are not included.
+        """
+        result: Dict[str, CommitDetails] = {}
+
+        try:
+            for i in range(0, len(sha1s), MAX_QUERY_PARAMS):
+                batch = sha1s[i:i + MAX_QUERY_PARAMS]
+                placeholders = ','.join('?' * len(batch))
+                rows = self.db.execute(
+                    'SELECT sha1, author_name, author_email, title, desc, parents '
+                    'FROM commits WHERE sha1 IN ({})'.format(placeholders),
+                    batch,
+                ).fetchall()
+
+                for sha1, name, email, title, desc, parents in rows:
+                    result[sha1] = CommitDetails.create(
+                        sha1, name, email, title, desc, parents
+                    )
+        except sqlite3.Error as ex:
+            log.dbg("Commit cache read failed: {}", ex)
+
+        self._used.update(result)
+        return result
+
+    def put_many(self, commits: Iterable[CommitDetails]) -> None:
+        """ Store the given commits in the cache.
+
+        If this makes the cache exceed its capacity, the least recently used
+        commits will be evicted.
+        """
+        now = time.time()
+        rows = [
+            (
+                c.sha1,
+                c.author.name,
+                c.author.email,
+                c.title,
+                c.desc,
+                ' '.join(c.parents_sha1),
+                now,
+            )
+            for c in commits
+        ]
+
+        if not rows:
+            return
+
+        try:
+            self.db.executemany(
+                'INSERT OR REPLACE INTO commits VALUES (?, ?, ?, ?, ?, ?, ?)',
+                rows,
+            )
+            self._flush_used()
+            self._evict()
+            self.db.commit()
+        except sqlite3.Error as ex:
+            log.dbg("Commit cache write failed: {}", ex)
+
+    def stats(self) -> CacheStats:
+        """ Return cache statistics. """
+        entries = 0
+        if os.path.exists(self.path):
+            try:
+                entries = self.db.execute('SELECT COUNT(*) FROM commits').fetchone()[0]
+            except sqlite3.Error as ex:
+                log.dbg("Commit cache read failed: {}", ex)
+
+        return CacheStats(
+            path=self.path,
+            entries=entries,
+            max_entries=self.max_entries,
+            size=os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+        )
+
+    def clear(self) -> None:
+        """ Remove all commits from the cache. """
+        self._used.clear()
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def _flush_used(self) -> None:
+        used = sorted(self._used)
+        self._used.clear()
+        now = time.time()
+
+        for i in range(0, len(used), MAX_QUERY_PARAMS):
+            batch = used[i:i + MAX_QUERY_PARAMS]
+            self.db.execute(
+                'UPDATE commits SET last_used = ? '
+                'WHERE sha1 IN ({})'.format(','.join('?' * len(batch))),
+                [now, *batch],
+            )
+
+    def _evict(self) -> None:
+        count = self.db.execute('SELECT COUNT(*) FROM commits').fetchone()[0]
+        excess = count - self.max_entries
+
+        if excess > 0:
+            self.db.execute(
+                'DELETE FROM commits WHERE sha1 IN ('
+                '   SELECT sha1 FROM commits ORDER BY last_used ASC LIMIT ?'
+                ')',
+                (excess,),
+            )
+
+
+def open_cache() -> Optional[CommitCache]:
+    """ Return the commit cache for the project repository.
+
+    Returns:
+        Optional[CommitCache]: The commit cache or **None** if it's disabled
+        or the project is not a git repository.
+    """
+    global _cache
+
+    if _cache is not None:
+        return _cache
+
+    if not conf.get('git.commit_cache.enabled', True):
+        return None
+
+    git_dir = conf.proj_path('.git')
+    if not os.path.isdir(git_dir):
+        return None
+
+    _cache = CommitCache(
+        os.path.join(git_dir, 'peltak', 'commits.sqlite'),
+        max_entries=conf.get('git.commit_cache.max_entries', DEFAULT_MAX_ENTRIES),
+    )
+    # Stores the last use times of the commits read by this process.
+    atexit.register(_cache.close)
+    return _cache
+
+
+def is_sha1(rev: str) -> bool:
+    """ Return **True** if *rev* is a full, lowercase SHA1. """
+    return bool(RE_SHA1.match(rev))
@@ -0,0 +1,305 @@
+# Copyright 2017-2020 Mateusz Klos
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+""" Pool of long lived ``git cat-file`` processes.
+
+Reading objects one at a time with ``git cat-file -p`` costs a process per
+object. ``git cat-file --batch`` reads requests from stdin and keeps running,
+so the cost of starting git is paid only once, no matter how many objects are
+read.
+
+Each process is used by a single thread at a time. When more threads need an
+object at the same time, new processes are started, up to the pool size. Dead
+processes are restarted automatically and all pools are closed at exit.
+"""
+import atexit
+import subprocess
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .. import conf
+from .types import GitObject, ObjectInfo, ObjectNotFound
+
+
+DEFAULT_POOL_SIZE = 4
+
+_pools: Dict[Tuple[str, str], 'CatFilePool'] = {}
+_pools_lock = threading.Lock()
+
+
+class CatFileProcess(object):
+    """ A single ``git cat-file --batch`` or ``--batch-check`` process.
+
+    Every request is the object name followed by a newline. Every response
+    starts with a ``<sha1> <type> <size>`` header line (``<name> missing`` if
+    the object doesn't exist). In ``batch`` mode the header is followed by
+    *size* bytes of content and a newline.
+
+    Args:
+        repo_path (str):
+            Path to the repository.
+        mode (str):
+            Either ``batch`` or ``batch-check``.
+    """
+    def __init__(self, repo_path: str, mode: str = 'batch'):
+        if mode not in ('batch', 'batch-check'):
+            raise ValueError("Invalid cat-file mode: {}".format(mode))
+
+        self.repo_path = repo_path
+        self.mode = mode
+        self.proc: Optional[subprocess.Popen] = None
+
+    @property
+    def alive(self) -> bool:
+        """ **True** if the git process is running. """
+        return self.proc is not None and self.proc.poll() is None
+
+    def start(self) -> None:
+        """ Start the git process. Will restart it if it's already running. """
+        self.close()
+        self.proc = subprocess.Popen(
+            ['git', 'cat-file', '--' + self.mode],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            cwd=self.repo_path,
+        )
+
+    def close(self) -> None:
+        """ Stop the git process if it's running. """
+        proc, self.proc = self.proc, None
+
+        if proc is None:
+            return
+
+        try:
+            proc.stdin.close()      # type: ignore
+            proc.wait(timeout=1)
+        except (OSError, subprocess.TimeoutExpired):
+            proc.kill()
+            proc.wait()
+
+        proc.stdout.close()     # type: ignore
+
+    def request(self, rev: str) -> Tuple[ObjectInfo, Optional[bytes]]:
+        """ Read a single object.
+
+        Args:
+            rev (str):
+                Anything git accepts as an object name, for example a SHA1,
+                ``HEAD`` or ``v1.0:README.rst``.
+
+        Returns:
+            tuple[ObjectInfo, Optional[bytes]]: The object info and its content.
+            The content is **None** in ``batch-check`` mode.
+
+        Raises:
+            ObjectNotFound: If the object doesn't exist.
+            IOError: If the git process died. It will be restarted on the
+                next request.
+        """
+        if '\n' in rev:
+            raise ValueError("Object name can't contain new lines: {!r}".format(rev))
+
+        if not self.alive:
+            self.start()
+
+        try:
+            self.proc.stdin.write(rev.encode('utf-8') + b'\n')    # type: ignore
+            self.proc.stdin.flush()     # type: ignore
+
+            header = self.proc.stdout.readline()    # type: ignore
+            # The name is echoed back for missing objects and it can contain
+            # spaces, so check those before splitting the header.
+            missing = header.endswith((b' missing\n', b' ambiguous\n'))
+            parts = [] if missing else header.split()
+
+            if len(parts) == 3:
+                info = ObjectInfo(
+                    sha1=parts[0].decode('ascii'),
+                    type=parts[1].decode('ascii'),
+                    size=int(parts[2]),
+                )
+                data = None
+                if self.mode == 'batch':
+                    data = self.proc.stdout.read(info.size + 1)[:-1]    # type: ignore
+                    if len(data) != info.size:
+                        raise IOError("Truncated git cat-file output")
+
+                return info, data
+        except (OSError, ValueError):
+            self.close()
+            raise IOError("git cat-file process died")
+
+        if missing:
+            raise ObjectNotFound(rev)
+
+        # Empty or malformed header means the process is gone.
+        self.close()
+        raise IOError("git cat-file process died")
+
+
+class CatFilePool(object):
+    """ Thread safe pool of `CatFileProcess` instances for a single repo.
+
+    Args:
+        repo_path (str):
+            Path to the repository.
+        mode (str):
+            Either ``batch`` or ``batch-check``.
+        size (int):
+            The maximum number of git processes running at the same time.
+    """
+    def __init__(
+        self,
+        repo_path: str,
+        mode: str = 'batch',
+        size: int = DEFAULT_POOL_SIZE,
+    ):
+        self.repo_path = repo_path
+        self.mode = mode
+        self.size = size
+        self._idle: List[CatFileProcess] = []
+        self._count = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def read(self, rev: str) -> GitObject:
+        """ Read an object with its content.
+
+        Only valid for ``batch`` pools.
+        """
+        info, data = self._request(rev)
+        return GitObject(info.type, data)    # type: ignore
+
+    def info(self, rev: str) -> ObjectInfo:
+        """ Read object type and size without its content. """
+        info, _ = self._request(rev)
+        return info
+
+    def close(self) -> None:
+        """ Stop all idle processes.
+
+        Processes currently in use are stopped as soon as they are released.
+        The pool can still be used after it's closed, it will just start new
+        processes.
+        """
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._count -= len(idle)
+
+        for proc in idle:
+            proc.close()
+
+    @contextmanager
+    def acquire(self) -> Iterator[CatFileProcess]:
+        """ Borrow a process from the pool for exclusive use.
+
+        Blocks if all processes are in use and the pool is full.
+        """
+        with self._cond:
+            while not self._idle and self._count >= self.size:
+                self._cond.wait()
+
+            if self._idle:
+                proc = self._idle.pop()
+            else:
+                proc = CatFileProcess(self.repo_path, self.mode)
+                self._count += 1
+                self._closed = False
+
+        try:
+            yield proc
+        finally:
+            with self._cond:
+                discard = self._closed
+                if discard:
+                    self._count -= 1
+                else:
+                    self._idle.append(proc)
+
+                self._cond.notify()
+
+            if discard:
+                proc.close()
+
+    def _request(self, rev: str) -> Tuple[ObjectInfo, Optional[bytes]]:
+        with self.acquire() as proc:
+            try:
+                return proc.request(rev)
+            except IOError:
+                # The process died, retry once with a fresh one.
+                return proc.request(rev)
+
+
+def get_pool(mode: str = 'batch', repo_path: Optional[str] = None) -> CatFilePool:
+    """ Return the shared cat-file pool for the given repository.
+
+    Args:
+        mode (str):
+            Either ``batch`` or ``batch-check``.
+        repo_path (str):
+            Path to the repository. Defaults to the project root.
+
+    Returns:
+        CatFilePool: The pool. Pools are created on first use and closed at
+        exit.
+    """
+    key = (repo_path or conf.proj_path(), mode)
+
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = CatFilePool(key[0], mode)
+
+    return pool
+
+
+def read_object(rev: str) -> GitObject:
+    """ Read a git object from the project repository.
+
+    Args:
+        rev (str):
+            Anything git accepts as an object name, for example a SHA1 or
+            ``HEAD:path/to/file``.
+
+    Returns:
+        GitObject: The object type and content.
+    """
+    return get_pool('batch').read(rev)
+
+
+def object_info(rev: str) -> ObjectInfo:
+    """ Read object type and size from the project repository. """
+    return get_pool('batch-check').info(rev)
+
+
+def close_pools(repo_path: Optional[str] = None) -> None:
+    """ Close cat-file pools.
+
+    Args:
+        repo_path (str):
+            Close only the pools for this repository. By default all pools are
+            closed.
+    """
+    with _pools_lock:
+        keys = [k for k in _pools if repo_path is None or k[0] == repo_path]
+        pools = [_pools.pop(k) for k in keys]
+
+    for pool in pools:
+        pool.close()
+
+
+atexit.register(close_pools)
@@ -0,0 +1,180 @@
+# Copyright 2017-2021 Mateusz Klos
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+""" In-memory commit graph for branch containment queries. """
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .. import conf, shell, util
+from .status import repo_state
+
+
+Row = Tuple[str, Tuple[str, ...]]
+
+
+class CommitGraph(object):
+    """ The commit graph of all local branches.
+
+    The graph is built once from ``git rev-list --parents`` and
+    ``git for-each-ref`` and all queries are answered in memory. For every
+    commit the graph stores a bitmask of the branches that contain it, so
+    checking which branches contain a given commit doesn't require running
+    ``git branch --contains``.
+
+    Attributes:
+        head (str):
+            SHA1 of the current HEAD commit.
+        tips (dict[str, str]):
+            Branch names mapped to the SHA1 of the branch tip.
+    """
+    def __init__(self, rows: Iterable[Row], tips: Dict[str, str], head: str):
+        """
+        Args:
+            rows (Iterable[tuple[str, tuple[str, ...]]]):
+                ``(sha1, parents)`` pairs in topological order (children before
+                their parents), the same as ``git rev-list --topo-order``.
+            tips (dict[str, str]):
+                Branch names mapped to the SHA1 of the branch tip.
+            head (str):
+                SHA1 of the current HEAD commit.
+        """
+        self.head = head
+        self.tips = tips
+        self._names = sorted(tips)
+        self._parents: Dict[str, Tuple[str, ...]] = {}
+        self._masks: Dict[str, int] = {}
+
+        tip_masks: Dict[str, int] = {}
+        for i, name in enumerate(self._names):
+            tip_masks[tips[name]] = tip_masks.get(tips[name], 0) | (1 << i)
+
+        # Children come before parents, so by the time we get to a commit all
+        # the branches containing it were already propagated from its children.
+        masks = self._masks
+        for sha1, parents in rows:
+            mask = masks.get(sha1, 0) | tip_masks.get(sha1, 0)
+            masks[sha1] = mask
+            self._parents[sha1] = parents
+
+            for parent in parents:
+                masks[parent] = masks.get(parent, 0) | mask
+
+    @classmethod
+    def load(cls) -> 'CommitGraph':
+        """ Build the graph for the project repository. """
+        with conf.within_proj_dir():
+            head = shell.run(
+                'git rev-parse HEAD',
+                capture=True,
+                never_pretend=True
+            ).stdout.strip()
+            refs = shell.run(
+                "git for-each-ref --format='%(objectname) %(refname:short)' refs/heads",
+                capture=True,
+                never_pretend=True
+            ).stdout.strip()
+
+        tips = {}
+        for line in refs.splitlines():
+            sha1, name = line.split(' ', 1)
+            tips[name] = sha1
+
+        lines = shell.iter_records(
+            'git rev-list --topo-order --parents HEAD --branches',
+            sep='\n',
+            cwd=conf.proj_path(),
+        )
+        rows = ((x[0], tuple(x[1:])) for x in (line.split() for line in lines))
+
+        return cls(rows, tips, head)
+
+    def __contains__(self, sha1: str) -> bool:
+        return sha1 in self._parents
+
+    def __len__(self) -> int:
+        return len(self._parents)
+
+    def resolve(self, rev: str) -> str:
+        """ Return the full SHA1 for the given revision.
+
+        Full SHA1s of commits in the graph and branch names are resolved in
+        memory, anything else is resolved with ``git rev-parse``.
+        """
+        if rev in self._parents:
+            return rev
+
+        if rev in self.tips:
+            return self.tips[rev]
+
+        with conf.within_proj_dir():
+            return shell.run(
+                'git rev-parse --verify "{}^{{commit}}"'.format(rev),
+                capture=True,
+                never_pretend=True
+            ).stdout.strip()
+
+    def parents(self, sha1: str) -> Tuple[str, ...]:
+        """ Return SHA1s of the parents of the given commit. """
+        return self._parents.get(sha1, ())
+
+    def branches_containing(self, sha1: str) -> List[str]:
+        """ Return names of all local branches that contain the given commit.
+
+        This is the in-memory equivalent of ``git branch --contains``.
+        """
+        mask = self._masks.get(sha1, 0)
+        return [name for i, name in enumerate(self._names) if mask & (1 << i)]
+
+    def fork_point(self, branch: str) -> Optional[str]:
+        """ Return the first commit on *branch* that is shared with another branch.
+
+        This walks the history starting at the branch tip (or HEAD if the
+        branch doesn't exist) until it finds a commit that is also contained in
+        any other branch. For merge commits it prefers the parent that only
+        belongs to *branch*.
+
+        Returns:
+            Optional[str]: The SHA1 of the fork point or **None** if the branch
+            doesn't share history with any other branch.
+        """
+        curr: Optional[str] = self.tips.get(branch, self.head)
+
+        while curr:
+            branches = self.branches_containing(curr)
+            if branch not in branches:
+                return None
+
+            if len(branches) > 1:
+                return curr
+
+            parents = self.parents(curr)
+            if len(parents) > 2:
+                # Octopus merge, give up.
+                return None
+
+            curr = next(
+                (p for p in parents if self.branches_containing(p) == [branch]),
+                parents[0] if parents else None,
+            )
+
+        return None
+
+
+@util.memoize(tokens=[repo_state])
+def commit_graph() -> CommitGraph:
+    """ Return the commit graph for the project repository.
+
+    Returns:
+        CommitGraph: The commit graph of all local branches.
+    """
+    return CommitGraph.load()
@@ -0,0 +1,425 @@
+# Copyright 2017-2020 Mateusz Klos
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+""" In-process reader for the git repository metadata.
+
+Things like the current branch, the list of branches or tags and the git
+config are stored in small text files inside ``.git``. Reading them directly is
+a lot cheaper than spawning git for each of them.
+
+The reader only handles the common repository layouts. Anything it doesn't
+understand (reftable ref storage, conditional includes, ``GIT_DIR`` overrides
+etc.) raises `Unsupported` and the callers fall back to the git CLI. Use
+`read()` to get that behaviour for free.
+"""
+import os
+import re
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+from .. import conf, log
+
+
+T = TypeVar('T')
+MAX_INCLUDE_DEPTH = 10
+# Any of those changes how git finds the repo or its config.
+EXOTIC_ENV = (
+    'GIT_DIR',
+    'GIT_COMMON_DIR',
+    'GIT_WORK_TREE',
+    'GIT_CEILING_DIRECTORIES',
+    'GIT_CONFIG',
+    'GIT_CONFIG_GLOBAL',
+    'GIT_CONFIG_SYSTEM',
+    'GIT_CONFIG_COUNT',
+    'GIT_CONFIG_PARAMETERS',
+)
+RE_SECTION = re.compile(r'\[\s*([-.\w]+)(?:\s+"((?:[^"\\\n]|\\.)*)")?\s*\]')
+RE_KEY = re.compile(r'([a-zA-Z][-a-zA-Z0-9]*)[ \t]*(=)?')
+RE_VERSION_PART = re.compile(r'(\D*)(\d*)')
+CONFIG_ESCAPES = {'n': '\n', 't': '\t', 'b': '\b', '\\': '\\', '"': '"'}
+
+
+class Unsupported(Exception):
+    """ The repository can't be read in process, use git CLI instead. """
+    pass
+
+
+class RepoReader(object):
+    """ Reads git metadata directly from the files inside ``.git``.
+
+    Attributes:
+        git_dir (str):
+            The git directory for the current work tree. This is ``.git`` for
+            the main work tree and ``.git/worktrees/<name>`` for linked ones.
+        common_dir (str):
+            The directory shared by all work trees. This is where the refs and
+            config live.
+    """
+    def __init__(self, git_dir: str, common_dir: str):
+        self.git_dir = git_dir
+        self.common_dir = common_dir
+
+    @classmethod
+    def discover(cls, path: str) -> Optional['RepoReader']:
+        """ Find the repository containing *path*.
+
+        Same as git, this will walk up the directory tree looking for ``.git``.
+        If ``.git`` is a file (linked work trees and submodules), the git
+        directory it points to is used.
+
+        Returns:
+            Optional[RepoReader]: The reader or **None** if *path* is not
+            inside a git repository.
+        """
+        path = os.path.abspath(path)
+
+        while True:
+            dot_git = os.path.join(path, '.git')
+
+            if os.path.isdir(dot_git):
+                git_dir = dot_git
+                break
+            elif os.path.isfile(dot_git):
+                git_dir = _read_gitdir_file(dot_git)
+                break
+
+            parent = os.path.dirname(path)
+            if parent == path:
+                return None
+
+            path = parent
+
+        if not os.path.isfile(os.path.join(git_dir, 'HEAD')):
+            raise Unsupported("Invalid git dir: {}".format(git_dir))
+
+        common_dir = git_dir
+        commondir_file = os.path.join(git_dir, 'commondir')
+        if os.path.isfile(commondir_file):
+            common_dir = os.path.normpath(
+                os.path.join(git_dir, _read_text(commondir_file).strip())
+            )
+
+        return cls(git_dir, common_dir)
+
+    def head(self) -> Tuple[Optional[str], Optional[str]]:
+        """ Read HEAD.
+
+        Returns:
+            tuple[Optional[str], Optional[str]]: ``(ref, sha1)`` pair. If HEAD
+            points to a branch, *ref* is the full ref name and *sha1* is
+            **None**. If HEAD is detached, it's the other way around.
+        """
+        head = _read_text(os.path.join(self.git_dir, 'HEAD')).strip()
+
+        if head.startswith('ref:'):
+            return head[4:].strip(), None
+
+        return None, head
+
+    def current_branch(self) -> str:
+        """ Return the name of the current branch.
+
+        Same as ``git symbolic-ref --short HEAD``.
+        """
+        ref, _ = self.head()
+
+        if ref is None or not ref.startswith('refs/heads/'):
+            # Let git report the error.
+            raise Unsupported("HEAD is not on a branch")
+
+        return ref[len('refs/heads/'):]
+
+    def refs(self, prefix: str = 'refs/') -> Dict[str, str]:
+        """ Return all refs starting with *prefix*.
+
+        Loose refs take precedence over the ones in ``packed-refs``, same as
+        in git.
+
+        Returns:
+            dict[str, str]: Full ref names mapped to their SHA1.
+        """
+        if os.path.isdir(os.path.join(self.common_dir, 'reftable')):
+            raise Unsupported("reftable ref storage")
+
+        result = {}
+
+        packed_refs = os.path.join(self.common_dir, 'packed-refs')
+        if os.path.isfile(packed_refs):
+            for line in _read_text(packed_refs).splitlines():
+                # '#' is the header and '^' the peeled value of the tag above.
+                if not line or line[0] in '#^':
+                    continue
+
+                sha1, name = line.split(' ', 1)
+                if name.startswith(prefix):
+                    result[name] = sha1
+
+        loose_root = os.path.join(self.common_dir, *prefix.rstrip('/').split('/'))
+        for root, _, files in os.walk(loose_root):
+            for filename in files:
+                if filename.endswith('.lock'):
+                    continue
+
+                path = os.path.join(root, filename)
+                name = os.path.relpath(path, self.common_dir).replace(os.sep, '/')
+                value = _read_text(path).strip()
+
+                if value.startswith('ref:'):
+                    raise Unsupported("Symbolic ref: {}".format(name))
+
+                result[name] = value
+
+        return result
+
+    def branches(self) -> List[str]:
+        """ Return names of all local branches, sorted by name. """
+        prefix = 'refs/heads/'
+        return sorted(name[len(prefix):] for name in self.refs(prefix))
+
+    def tags(self) -> List[str]:
+        """ Return names of all tags sorted as versions.
+
+        This is an equivalent of ``git tag --sort=v:refname``. Digit sequences
+        are compared numerically and everything else as text.
+        ``versionsort.suffix`` is not supported.
+        """
+        if 'versionsort.suffix' in self.config():
+            raise Unsupported("versionsort.suffix is set")
+
+        prefix = 'refs/tags/'
+        names = (name[len(prefix):] for name in self.refs(prefix))
+        return sorted(names, key=lambda name: (version_key(name), name))
+
+    def config(self) -> Dict[str, str]:
+        """ Return git configuration.
+
+        This reads the system, global and repository config files in the same
+        order as git and follows ``include.path``.
+
+        Returns:
+            dict[str, str]: Config values by their full name. Same as parsing
+            ``git config --list``, the last value wins.
+        """
+        xdg_config = os.environ.get('XDG_CONFIG_HOME') or os.path.expanduser(
+            '~/.config'
+        )
+        files = [
+            os.path.join(xdg_config, 'git', 'config'),
+            os.path.expanduser('~/.gitconfig'),
+            os.path.join(self.common_dir, 'config'),
+        ]
+
+        if not os.environ.get('GIT_CONFIG_NOSYSTEM'):
+            files.insert(0, '/etc/gitconfig')
+
+        result: Dict[str, str] = {}
+        for path in files:
+            if os.path.isfile(path):
+                _read_config_file(path, result, depth=0)
+
+        if result.get('extensions.worktreeconfig', 'false') != 'false':
+            raise Unsupported("Per work tree config")
+
+        return result
+
+
+def open_reader() -> Optional[RepoReader]:
+    """ Return the reader for the repository containing the current directory.
+
+    Returns:
+        Optional[RepoReader]: The reader or **None** if it's disabled with
+        ``git.native_reader: false``, the environment changes where git looks
+        for the repository or the current directory is not in a git repo.
+    """
+    try:
+        if not conf.get('git.native_reader', True):
+            return None
+    except conf.ConfigNotInitialized:
+        pass
+
+    if any(name in os.environ for name in EXOTIC_ENV):
+        return None
+
+    return RepoReader.discover(os.getcwd())
+
+
+def read(fn: Callable[[RepoReader], T]) -> Optional[T]:
+    """ Read repository metadata in process.
+
+    Args:
+        fn (Callable[[RepoReader], T]):
+            Called with the reader for the current repository.
+
+    Returns:
+        Optional[T]: The value returned by *fn* or **None** if the repo can't
+        be read in process and the caller should fall back to git CLI.
+
+    Examples:
+
+        >>> from peltak.core.git import repo
+        >>>
+        >>> branches = repo.read(repo.RepoReader.branches)
+    """
+    try:
+        reader = open_reader()
+        return fn(reader) if reader is not None else None
+    except (Unsupported, OSError, ValueError) as ex:
+        log.dbg("Falling back to git CLI: {}", ex)
+        return None
+
+
+def version_key(name: str) -> List[Tuple[str, int]]:
+    """ Sorting key comparing all digit sequences in *name* as numbers. """
+    return [
+        (text, int(digits) if digits else -1)
+        for text, digits in RE_VERSION_PART.findall(name)
+    ]
+
+
+def parse_config(text: str) -> Iterator[Tuple[str, str]]:
+    """ Parse git config file.
+
+    Args:
+        text (str):
+            The config file contents.
+
+    Returns:
+        Iterator[tuple[str, str]]: ``(name, value)`` pairs in the order they
+        appear in the file. Names are normalized the same way as in
+        ``git config --list``. Keys without a value are returned as ``true``.
+
+    Raises:
+        ValueError: If the config file is malformed.
+    """
+    section: Optional[str] = None
+    pos = 0
+
+    while pos < len(text):
+        char = text[pos]
+
+        if char.isspace():
+            pos += 1
+        elif char in '#;':
+            pos = _skip_line(text, pos)
+        elif char == '[':
+            m = RE_SECTION.match(text, pos)
+            if not m:
+                raise ValueError("Invalid config section at {}".format(pos))
+
+            name, subsection = m.groups()
+            section = name.lower()
+            if subsection is not None:
+                section += '.' + re.sub(r'\\(.)', r'\1', subsection)
+
+            pos = m.end()
+        else:
+            m = RE_KEY.match(text, pos)
+            if not m or section is None:
+                raise ValueError("Invalid config entry at {}".format(pos))
+
+            key = '{}.{}'.format(section, m.group(1).lower())
+            pos = m.end()
+
+            if m.group(2):
+                value, pos = _parse_config_value(text, pos)
+            else:
+                value = 'true'
+                pos = _skip_line(text, pos)
+
+            yield key, value
+
+
+def _parse_config_value(text: str, pos: int) -> Tuple[str, int]:
+    out: List[str] = []
+    pending_ws = ''
+    quoted = False
+
+    while pos < len(text):
+        char = text[pos]
+
+        if char == '\n':
+            if quoted:
+                raise ValueError("Unterminated quote at {}".format(pos))
+            break
+        elif char == '\\':
+            escaped = text[pos + 1:pos + 2]
+            if escaped == '\n':
+                pos += 2
+                continue
+            elif text[pos + 1:pos + 3] == '\r\n':
+                pos += 3
+                continue
+            elif escaped not in CONFIG_ESCAPES:
+                raise ValueError("Invalid escape at {}".format(pos))
+
+            out.append(pending_ws + CONFIG_ESCAPES[escaped])
+            pending_ws = ''
+            pos += 2
+        elif char == '"':
+            out.append(pending_ws)
+            pending_ws = ''
+            quoted = not quoted
+            pos += 1
+        elif not quoted and char in '#;':
+            pos = _skip_line(text, pos)
+            break
+        elif not quoted and char.isspace():
+            # Leading and trailing whitespace is dropped.
+            if out:
+                pending_ws += char
+            pos += 1
+        else:
+            out.append(pending_ws + char)
+            pending_ws = ''
+            pos += 1
+
+    return ''.join(out), pos
+
+
+def _read_config_file(path: str, result: Dict[str, str], depth: int) -> None:
+    if depth > MAX_INCLUDE_DEPTH:
+        raise Unsupported("Too many nested config includes")
+
+    for key, value in parse_config(_read_text(path)):
+        if key.startswith('includeif.'):
+            raise Unsupported("Conditional config include in {}".format(path))
+
+        result[key] = value
+
+        if key == 'include.path':
+            include = os.path.expanduser(value)
+            include = os.path.join(os.path.dirname(path), include)
+
+            if os.path.isfile(include):
+                _read_config_file(include, result, depth + 1)
+
+
+def _read_gitdir_file(path: str) -> str:
+    content = _read_text(path).strip()
+
+    if not content.startswith('gitdir:'):
+        raise Unsupported("Invalid .git file: {}".format(path))
+
+    git_dir = content[len('gitdir:'):].strip()
+    return os.path.normpath(os.path.join(os.path.dirname(path), git_dir))
+
+
+def _read_text(path: str) -> str:
+    with open(path, encoding='utf-8') as fp:
+        return fp.read()
+
+
+def _skip_line(text: str, pos: int) -> int:
+    end = text.find('\n', pos)
+    return len(text) if end == -1 else end + 1
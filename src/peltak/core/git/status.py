@@ -13,72 +13,182 @@
 # limitations under the License.
 #
 import os
-from typing import List
+from typing import Iterator, List, Optional, Tuple
 
-from .. import conf, shell, util
+from .. import conf, shell
+from .types import StatusEntry, StatusSnapshot, SubmoduleState
 
 
-@util.cached_result()
-def untracked() -> List[str]:
-    """ Return a list of untracked files in the project repository.
+FileStat = Optional[Tuple[int, int, int]]
+Fingerprint = Tuple[Tuple[FileStat, ...], bytes]
+_snapshot: Optional[Tuple[Tuple[int, Optional[Fingerprint]], StatusSnapshot]] = None
+
+
+def status_snapshot(refresh: bool = False) -> StatusSnapshot:
+    """ Return the current state of the project repository.
+
+    This runs ``git status --porcelain=v2 -z`` once and the result is reused
+    until `repo_state()` changes (after anything is staged, committed or
+    checked out, or any command that is not read-only runs through
+    `shell.run`). Pass ``refresh=True`` to force re-reading the status, for
+    example after modifying files in the work tree directly.
 
     Returns:
-        list[str]: The list of files not tracked by project git repo.
+        StatusSnapshot: Parsed ``git status`` output.
     """
+    global _snapshot
+
+    state = repo_state()
+    if not refresh and state[1] is not None and _snapshot is not None:
+        cached_state, snapshot = _snapshot
+        if cached_state == state:
+            return snapshot
+
     with conf.within_proj_dir():
-        status = shell.run(
-            'git status --porcelain',
+        out = shell.run(
+            'git status --porcelain=v2 -z',
             capture=True,
             never_pretend=True
         ).stdout
-        results = []
 
-        for file_status in status.split(os.linesep):
-            if file_status.startswith('?? '):
-                results.append(file_status[3:].strip())
+    snapshot = parse_status(out)
+    # git status can refresh the index itself, so only fingerprint it after.
+    state = repo_state()
+    _snapshot = (state, snapshot) if state[1] is not None else None
+    return snapshot
 
-        return results
 
+def repo_state() -> Tuple[int, Optional[Fingerprint]]:
+    """ Return a token that changes whenever the project repo might change.
 
-@util.cached_result()
-def unstaged() -> List[str]:
-    """ Return a list of unstaged files in the project repository.
+    This combines `shell.generation()` (changes after every command that
+    is not read-only) with the fingerprint of the index, HEAD and current
+    branch ref (changes when the repo is modified outside of peltak). Use it as
+    a `util.memoize` token for anything derived from the repository state.
+
+    Returns:
+        tuple[int, Optional[Fingerprint]]: The state token. The fingerprint
+        part is **None** if the git directory can't be found.
+    """
+    return shell.generation(), _status_fingerprint()
+
+
+def untracked(refresh: bool = False) -> List[str]:
+    """ Return a list of untracked files in the project repository.
 
     Returns:
         list[str]: The list of files not tracked by project git repo.
     """
-    with conf.within_proj_dir():
-        status = shell.run(
-            'git status --porcelain',
-            capture=True,
-            never_pretend=True
-        ).stdout
-        results = []
+    return status_snapshot(refresh).untracked()
 
-        for file_status in status.split(os.linesep):
-            if file_status.strip() and file_status[0] == ' ':
-                results.append(file_status[3:].strip())
 
-        return results
+def unstaged(refresh: bool = False) -> List[str]:
+    """ Return a list of unstaged files in the project repository.
+
+    Returns:
+        list[str]: The list of tracked files with changes that are not staged
+        for commit.
+    """
+    return status_snapshot(refresh).unstaged()
 
 
-@util.cached_result()
-def staged() -> List[str]:
+def staged(refresh: bool = False) -> List[str]:
     """ Return a list of project files staged for commit.
 
     Returns:
         list[str]: The list of project files staged for commit.
     """
-    with conf.within_proj_dir():
-        status = shell.run(
-            'git status --porcelain',
-            capture=True,
-            never_pretend=True
-        ).stdout
-        results = []
+    return status_snapshot(refresh).staged()
+
+
+def parse_status(output: str) -> StatusSnapshot:
+    """ Parse the output of ``git status --porcelain=v2 -z``.
 
-        for file_status in status.split(os.linesep):
-            if file_status and file_status[0] in ('A', 'M', 'D'):
-                results.append(file_status[3:].strip())
+    Args:
+        output (str):
+            The raw output of the git command.
 
-        return results
+    Returns:
+        StatusSnapshot: The parsed repository status.
+    """
+    entries = []
+    records = _iter_records(output)
+
+    for record in records:
+        kind = record[0]
+
+        if kind == '1':
+            _, xy, sub, _, _, _, _, _, path = record.split(' ', 8)
+            entries.append(StatusEntry(
+                path=path,
+                index=xy[0],
+                worktree=xy[1],
+                submodule=_parse_submodule(sub),
+            ))
+        elif kind == '2':
+            _, xy, sub, _, _, _, _, _, _, path = record.split(' ', 9)
+            entries.append(StatusEntry(
+                path=path,
+                index=xy[0],
+                worktree=xy[1],
+                orig_path=next(records),
+                submodule=_parse_submodule(sub),
+            ))
+        elif kind == 'u':
+            _, xy, sub, _, _, _, _, _, _, _, path = record.split(' ', 10)
+            entries.append(StatusEntry(
+                path=path,
+                index=xy[0],
+                worktree=xy[1],
+                submodule=_parse_submodule(sub),
+                unmerged=True,
+            ))
+        elif kind in ('?', '!'):
+            entries.append(StatusEntry(path=record[2:], index=kind, worktree=kind))
+
+    return StatusSnapshot(entries)
+
+
+def _iter_records(output: str) -> Iterator[str]:
+    return (r for r in output.split('\0') if r)
+
+
+def _parse_submodule(sub: str) -> Optional[SubmoduleState]:
+    if not sub.startswith('S'):
+        return None
+
+    return SubmoduleState(
+        commit_changed=sub[1] == 'C',
+        modified=sub[2] == 'M',
+        untracked=sub[3] == 'U',
+    )
+
+
+def _status_fingerprint() -> Optional[Fingerprint]:
+    """ Return a value that changes whenever the index or HEAD changes.
+
+    This includes the ref HEAD points to, so it also changes after a commit
+    on the current branch. Returns **None** if the git directory can't be
+    found, in which case the status should not be cached.
+    """
+    try:
+        git_dir = conf.proj_path('.git')
+        with open(os.path.join(git_dir, 'HEAD'), 'rb') as fp:
+            head = fp.read()
+    except (OSError, conf.ConfigNotInitialized):
+        return None
+
+    stats = [os.path.join(git_dir, 'index'), os.path.join(git_dir, 'packed-refs')]
+    if head.startswith(b'ref:'):
+        stats.append(os.path.join(git_dir, head[4:].strip().decode('utf-8')))
+
+    return tuple(_stat(path) for path in stats), head
+
+
+def _stat(path: str) -> FileStat:
+    try:
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size, st.st_ino
+    except OSError:
+        # Fresh repo, nothing was ever staged or packed.
+        return None
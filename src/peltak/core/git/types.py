@@ -13,20 +13,56 @@
 # limitations under the License.
 #
 import dataclasses
+import itertools
+import sys
 from collections import namedtuple
-from typing import List, Optional
+from typing import (
+    TYPE_CHECKING,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
 
-from .. import conf, shell
+from .. import conf, exc, shell, util
+
+
+if TYPE_CHECKING:
+    from .cache import CommitCache
 
 
 Author = namedtuple('Author', 'name email')
+# Fields are separated by NUL and so are the commits (``-z``). git does not
+# allow NUL in commit messages so this is safe no matter the message content.
+COMMIT_FORMAT = '%H%x00%an%x00%ae%x00%s%x00%b%x00%P'
+COMMIT_FIELDS = 6
+# How many commits are looked up in the commit cache at once.
+CACHE_BATCH_SIZE = 500
+# How many shared `Author` instances are kept by `intern_author()`.
+AUTHORS_CACHE_SIZE = 4096
+# How many commits loaded through `CommitDetails.parents` are kept in memory.
+PARENTS_CACHE_SIZE = 1024
+
+
+@util.memoize(maxsize=AUTHORS_CACHE_SIZE)
+def intern_author(name: str, email: str) -> Author:
+    """ Return a shared `Author` instance for the given name and email.
+
+    Most repos have way fewer authors than commits, so sharing the instances
+    saves a lot of memory when loading long histories. Only the most recently
+    used authors are kept, so histories with lots of authors don't keep all of
+    them alive.
+    """
+    return Author(name, email)
 
 
-@dataclasses.dataclass
-class BranchDetails:
+class BranchDetails(NamedTuple):
     """ Branch name parsed into type and title.
 
-    Helpful for things like implementing git flow etc.
+    Helpful for things like implementing git flow etc. Instances are
+    immutable.
 
     Attributes:
         name (str):
@@ -60,10 +96,13 @@ class BranchDetails:
             return BranchDetails(branch_name, None, branch_name)
 
 
-@dataclasses.dataclass
-class CommitDetails:
+class CommitDetails(NamedTuple):
     """ Allows querying git commits for details.
 
+    Instances are immutable tuples without a per-instance ``__dict__``. SHA1s
+    are interned and authors shared (see `intern_author()`), so parent SHA1s
+    reuse the strings of the parent commits and each author is stored once.
+
     Attributes:
         id (str):
             The commit ID (first 7 characters taken from `sha1`).
@@ -77,16 +116,14 @@ class CommitDetails:
         desc (str):
             The commit description. This is the portion following the title.
             Will be an empty string if the commit contains only the title.
-        parents_sha1 (List[str]):
-            List of SHA1s of parents of this commit.
+        parents_sha1 (tuple[str, ...]):
+            SHA1s of parents of this commit.
     """
     sha1: str
     author: Author
     title: str
     desc: str
-    parents_sha1: Optional[str]
-    _branches: List[str] = dataclasses.field(default_factory=list)
-    _parents: List['CommitDetails'] = dataclasses.field(default_factory=list)
+    parents_sha1: Tuple[str, ...]
 
     @property
     def id(self) -> str:
@@ -95,24 +132,18 @@ class CommitDetails:
     @property
     def branches(self) -> List[str]:
         """ List of all branches this commit is a part of. """
-        if self._branches is None:
-            cmd = 'git branch --contains {}'.format(self.sha1)
-            out = shell.run(
-                cmd,
-                capture=True,
-                never_pretend=True
-            ).stdout.strip()
-            self._branches = [x.strip('* \t\n') for x in out.splitlines()]
-
-        return self._branches
+        from .branch import commit_branches  # avoid circular dependency.
+        return commit_branches(self.sha1)
 
     @property
     def parents(self) -> List['CommitDetails']:
-        """ Parents of the this commit. """
-        if self._parents is None:
-            self._parents = [CommitDetails.get(x) for x in self.parents_sha1]
+        """ Parents of the this commit.
 
-        return self._parents
+        The parents are not stored on the instance. Commits never change, so
+        the recently loaded ones are shared by all the commits (see
+        `PARENTS_CACHE_SIZE`).
+        """
+        return [_load_commit(x) for x in self.parents_sha1]
 
     # TODO: remove this property, only used by GAE plugin, which is dead anyway.
     @property
@@ -146,22 +177,265 @@ class CommitDetails:
             CommitDetails: Commit details. You can use the instance of the
             class to query git tree further.
         """
+        # avoid circular dependency.
+        from .backend import get_backend
+        from .cache import is_sha1, open_cache
+
+        cache = open_cache()
+        if is_sha1(sha1) and (cache is not None or get_backend().name != 'cli'):
+            return next(cls._from_sha1s(iter([sha1]), cache))
+
         with conf.within_proj_dir():
-            cmd = 'git show -s --format="%H||%an||%ae||%s||%b||%P" {}'.format(
-                sha1
-            )
+            cmd = 'git show -s -z --format="{}" {}'.format(COMMIT_FORMAT, sha1)
             result = shell.run(cmd, capture=True, never_pretend=True).stdout
 
-        parts = result.split('||')
-        if len(parts) != 6:
+        commits = list(cls._from_records(result.split('\0')))
+        if len(commits) != 1:
             raise ValueError('Invalid git show result:\n  {}'.format(result))
 
-        sha1, name, email, title, desc, parents = result.split('||')
+        return commits[0]
+
+    @classmethod
+    def get_many(
+        cls,
+        rev_range: str = 'HEAD',
+        max_count: Optional[int] = None,
+    ) -> Iterator['CommitDetails']:
+        """ Lazily load all commits in the given revision range.
+
+        All commits are read from a single ``git log`` call and the output is
+        streamed, so this is a lot faster than calling `CommitDetails.get()` for
+        every commit and the commits can be processed as soon as they are read.
+
+        If the commit cache or a non-CLI backend is enabled, only the SHA1s
+        are listed with ``git rev-list`` and the details are read from the
+        cache in batches. Commits missing from the cache are loaded through
+        the git backend (a single ``git show`` call per batch for the CLI
+        backend) and stored in the cache.
+
+        Args:
+            rev_range (str):
+                Anything ``git log`` accepts as the revision range, for example
+                ``v1.0.0..HEAD`` or a branch name.
+            max_count (int):
+                If given, load at most that many commits.
+
+        Returns:
+            Iterator[CommitDetails]: Commits in the same order as returned by
+            ``git log`` (newest first).
+        """
+        # avoid circular dependency.
+        from .backend import get_backend
+        from .cache import open_cache
+
+        limit = ' -n {}'.format(max_count) if max_count is not None else ''
+        cache = open_cache()
 
-        return CommitDetails(
-            sha1=sha1,
-            author=Author(name, email),
+        if cache is not None or get_backend().name != 'cli':
+            cmd = 'git rev-list{limit} {rev_range} --'.format(
+                limit=limit,
+                rev_range=rev_range,
+            )
+            sha1s = shell.iter_records(cmd, sep='\n', cwd=conf.proj_path())
+            return cls._from_sha1s(sha1s, cache)
+
+        cmd = 'git log -z --format="{fmt}"{limit} {rev_range} --'.format(
+            fmt=COMMIT_FORMAT,
+            limit=limit,
+            rev_range=rev_range,
+        )
+        records = shell.iter_records(cmd, cwd=conf.proj_path())
+        return cls._from_records(records)
+
+    @classmethod
+    def _from_sha1s(
+        cls,
+        sha1s: Iterator[str],
+        cache: Optional['CommitCache'],
+    ) -> Iterator['CommitDetails']:
+        from .backend import load_commits  # avoid circular dependency.
+
+        while True:
+            batch = list(itertools.islice(sha1s, CACHE_BATCH_SIZE))
+            if not batch:
+                break
+
+            found = cache.get_many(batch) if cache is not None else {}
+            missing = [sha1 for sha1 in batch if sha1 not in found]
+
+            if missing:
+                loaded = load_commits(missing)
+                if cache is not None:
+                    cache.put_many(loaded)
+
+                found.update((commit.sha1, commit) for commit in loaded)
+
+            for sha1 in batch:
+                yield found[sha1]
+
+    @classmethod
+    def _from_records(cls, records: Iterable[str]) -> Iterator['CommitDetails']:
+        fields = iter(records)
+
+        # Consume the records COMMIT_FIELDS at a time. An incomplete group can
+        # only be the empty record after the trailing separator.
+        for sha1, name, email, title, desc, parents in zip(*[fields] * COMMIT_FIELDS):
+            yield cls.create(sha1, name, email, title, desc, parents)
+
+    @classmethod
+    def create(
+        cls,
+        sha1: str,
+        name: str,
+        email: str,
+        title: str,
+        desc: str,
+        parents: str,
+    ) -> 'CommitDetails':
+        """ Create commit details from raw field values.
+
+        SHA1s are interned and the author is shared with other commits by the
+        same person.
+
+        Args:
+            parents (str):
+                Space separated parent SHA1s, same as git ``%P`` format.
+        """
+        return cls(
+            sha1=sys.intern(sha1),
+            author=intern_author(name, email),
             title=title,
             desc=desc,
-            parents_sha1=parents.split(),
+            parents_sha1=tuple(sys.intern(x) for x in parents.split()),
         )
+
+
+@util.memoize(maxsize=PARENTS_CACHE_SIZE)
+def _load_commit(sha1: str) -> CommitDetails:
+    return CommitDetails.get(sha1)
+
+
+@dataclasses.dataclass(frozen=True)
+class SubmoduleState:
+    """ Submodule flags as reported by ``git status --porcelain=v2``.
+
+    Attributes:
+        commit_changed (bool):
+            The submodule HEAD points to a different commit than the one
+            recorded in the superproject.
+        modified (bool):
+            The submodule has tracked changes.
+        untracked (bool):
+            The submodule has untracked files.
+    """
+    commit_changed: bool
+    modified: bool
+    untracked: bool
+
+
+@dataclasses.dataclass(frozen=True)
+class StatusEntry:
+    """ A single file entry from ``git status``.
+
+    Attributes:
+        path (str):
+            Repository relative path to the file.
+        index (str):
+            State of the file in the index (staging area). Uses the same letters
+            as git: ``.`` (unchanged), ``M``, ``T``, ``A``, ``D``, ``R``, ``C``
+            and ``U``. Untracked files use ``?`` and ignored files ``!``.
+        worktree (str):
+            State of the file in the work tree. Same letters as *index*.
+        orig_path (str):
+            The path the file was renamed or copied from. **None** if the file
+            was not renamed/copied.
+        submodule (SubmoduleState):
+            Submodule details if this entry is a submodule, **None** otherwise.
+        unmerged (bool):
+            **True** if the file has unresolved merge conflicts.
+    """
+    path: str
+    index: str
+    worktree: str
+    orig_path: Optional[str] = None
+    submodule: Optional[SubmoduleState] = None
+    unmerged: bool = False
+
+    @property
+    def tracked(self) -> bool:
+        """ **True** if the file is tracked by git. """
+        return self.index not in ('?', '!')
+
+    @property
+    def staged(self) -> bool:
+        """ **True** if the file has changes staged for commit. """
+        return self.tracked and not self.unmerged and self.index != '.'
+
+    @property
+    def unstaged(self) -> bool:
+        """ **True** if the file has changes that are not staged for commit. """
+        return self.tracked and not self.unmerged and self.worktree != '.'
+
+
+@dataclasses.dataclass(frozen=True)
+class StatusSnapshot:
+    """ The state of the repository as reported by a single ``git status``.
+
+    Attributes:
+        entries (list[StatusEntry]):
+            All the entries reported by ``git status``. Unchanged files are not
+            included.
+    """
+    entries: List[StatusEntry] = dataclasses.field(default_factory=list)
+
+    @property
+    def has_changes(self) -> bool:
+        """ **True** if any of the tracked files has changed. """
+        return any(e.tracked for e in self.entries)
+
+    def staged(self) -> List[str]:
+        """ Return paths of all files with changes staged for commit. """
+        return [e.path for e in self.entries if e.staged]
+
+    def unstaged(self) -> List[str]:
+        """ Return paths of all tracked files with unstaged changes. """
+        return [e.path for e in self.entries if e.unstaged]
+
+    def untracked(self) -> List[str]:
+        """ Return paths of all untracked files. """
+        return [e.path for e in self.entries if e.index == '?']
+
+
+class ObjectNotFound(exc.PeltakError):
+    msg = "Git object not found"
+
+
+@dataclasses.dataclass(frozen=True)
+class ObjectInfo:
+    """ Git object metadata, as returned by ``git cat-file --batch-check``.
+
+    Attributes:
+        sha1 (str):
+            Full SHA1 of the object.
+        type (str):
+            Object type: ``commit``, ``tree``, ``blob`` or ``tag``.
+        size (int):
+            Size of the object content in bytes.
+    """
+    sha1: str
+    type: str
+    size: int
+
+
+@dataclasses.dataclass(frozen=True)
+class GitObject:
+    """ Raw git object.
+
+    Attributes:
+        type (str):
+            Object type: ``commit``, ``tree``, ``blob`` or ``tag``.
+        data (bytes):
+            The object content, without the ``<type> <size>`` header.
+    """
+    type: str
+    data: bytes
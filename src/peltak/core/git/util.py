@@ -16,7 +16,10 @@ import os
 from typing import Any, Dict, List, Optional
 
 from .. import conf, shell, util
+from . import repo
 from .branch import latest_commit
+from .repo import RepoReader
+from .status import repo_state
 from .types import Author
 
 
@@ -100,13 +103,19 @@ def tag(name: str, message: str, author: Optional[Author] = None):
     shell.run(cmd)
 
 
-@util.cached_result()
+@util.memoize(tokens=[repo_state])
 def config() -> Dict[str, Any]:
     """ Return the current git configuration.
 
+    The config files are read directly if possible, see `RepoReader.config()`.
+
     Returns:
         The current git config taken from ``git config --list``.
     """
+    values = repo.read(RepoReader.config)
+    if values is not None:
+        return values
+
     out = shell.run(
         'git config --list',
         capture=True,
@@ -121,7 +130,7 @@ def config() -> Dict[str, Any]:
     return result
 
 
-@util.cached_result()
+@util.memoize(tokens=[repo_state])
 def tags() -> List[str]:
     """ Returns all tags in the repo.
 
@@ -131,6 +140,10 @@ def tags() -> List[str]:
     All tags returned by this function will be parsed as if the contained
     versions (using ``v:refname`` sorting).
     """
+    tag_names = repo.read(RepoReader.tags)
+    if tag_names is not None:
+        return tag_names
+
     return shell.run(
         'git tag --sort=v:refname',
         capture=True,
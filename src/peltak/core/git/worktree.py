@@ -0,0 +1,165 @@
+# Copyright 2017-2020 Mateusz Klos
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+""" A pool of git worktrees used to check out other revisions of the project.
+
+Creating a worktree checks out every file in the repository. The worktrees in
+the pool are created once, under ``<build_dir>/worktrees``, and later only
+switched to another revision with ``git checkout --detach``. That only touches
+the files that differ between the revisions and keeps everything ignored by
+git (build artifacts, virtualenvs, ``node_modules``) so the next run in that
+worktree doesn't have to start from scratch.
+
+A worktree is used by one caller at a time. If the requested revision is
+already checked out in one of the free worktrees, that one is used.
+"""
+import os
+import subprocess
+import threading
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Set
+
+from .. import conf, exc
+
+
+class UnknownRevision(exc.PeltakError):
+    msg = "Unknown revision"
+
+
+class WorktreeError(exc.PeltakError):
+    msg = "git worktree command failed"
+
+
+class WorktreePool(object):
+    """ Reusable worktrees of the repository at *repo_path*, kept in *root*. """
+
+    def __init__(self, repo_path: str, root: str) -> None:
+        self.repo_path = repo_path
+        self.root = root
+        self._lock = threading.Lock()
+        self._in_use: Set[str] = set()
+
+    def resolve(self, rev: str) -> str:
+        """ Return the full sha1 of the commit *rev* points to.
+
+        Raises:
+            UnknownRevision: If there is no such commit.
+        """
+        try:
+            return _git(self.repo_path, 'rev-parse', '--verify', '-q', rev + '^{commit}')
+        except WorktreeError:
+            raise UnknownRevision(rev)
+
+    @contextmanager
+    def checkout(self, rev: str) -> Iterator[str]:
+        """ Check out *rev* in one of the worktrees and return its path.
+
+        The worktree is reset to a clean state: local changes made by the
+        previous user and untracked files are removed, ignored files are kept.
+        It is returned to the pool once the ``with`` block ends.
+        """
+        sha = self.resolve(rev)
+
+        with self._lock:
+            path = self._pick(sha)
+            self._in_use.add(path)
+
+            try:
+                # Serialized, git doesn't like concurrent worktree changes.
+                self._update(path, sha)
+            except Exception:
+                self._in_use.discard(path)
+                raise
+
+        try:
+            yield path
+        finally:
+            with self._lock:
+                self._in_use.discard(path)
+
+    def worktrees(self) -> List[str]:
+        """ Paths of all the worktrees that were created so far. """
+        if not os.path.isdir(self.root):
+            return []
+
+        names = sorted(
+            (x for x in os.listdir(self.root) if x.isdigit()),
+            key=int,
+        )
+        return [
+            os.path.join(self.root, name) for name in names
+            if os.path.exists(os.path.join(self.root, name, '.git'))
+        ]
+
+    def _pick(self, sha: str) -> str:
+        free = [x for x in self.worktrees() if x not in self._in_use]
+
+        for path in free:
+            if _head(path) == sha:
+                return path
+
+        if free:
+            return free[0]
+
+        index = 0
+        while os.path.exists(os.path.join(self.root, str(index))):
+            index += 1
+
+        return os.path.join(self.root, str(index))
+
+    def _update(self, path: str, sha: str) -> None:
+        if not os.path.exists(path):
+            # Forget worktrees whose directories were removed (peltak clean).
+            _git(self.repo_path, 'worktree', 'prune')
+            _git(self.repo_path, 'worktree', 'add', '-q', '--detach', path, sha)
+        else:
+            _git(path, 'checkout', '-q', '--detach', '--force', sha)
+            _git(path, 'clean', '-q', '-fd')
+
+
+def get_pool(repo_path: Optional[str] = None) -> WorktreePool:
+    """ Return a worktree pool for the project.
+
+    The worktrees are kept in ``<build_dir>/worktrees``. Every call returns
+    a new pool, threads checking out revisions at the same time must share
+    one.
+    """
+    build_dir = conf.get_path('build_dir', '.build')
+    return WorktreePool(
+        repo_path or conf.proj_path(),
+        os.path.join(build_dir, 'worktrees'),
+    )
+
+
+def _head(path: str) -> Optional[str]:
+    try:
+        return _git(path, 'rev-parse', 'HEAD')
+    except WorktreeError:
+        return None
+
+
+def _git(cwd: str, *args: str) -> str:
+    # subprocess with cwd, rather than `conf.within_proj_dir()`, as the pool is
+    # used from many threads at once.
+    result = subprocess.run(
+        ['git'] + list(args),
+        cwd=cwd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    if result.returncode != 0:
+        raise WorktreeError(f"git {' '.join(args)}: {result.stderr.strip()}")
+
+    return result.stdout.strip()
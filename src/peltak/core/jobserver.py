@@ -0,0 +1,298 @@
+# Copyright 2017-2020 Mateusz Klos
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+""" GNU make jobserver support.
+
+A jobserver limits how many jobs run at the same time across a whole tree of
+processes. It's a pipe holding one byte (token) for every job that can run in
+addition to the one every process is allowed to run for free. A process takes
+a token before it starts another job and puts it back when the job is done.
+Child processes find the jobserver through ``MAKEFLAGS``.
+
+When peltak runs scripts in parallel (``peltak run -j N``) it becomes the
+jobserver for everything it starts: ``make`` (called without ``-jN``, that
+would start its own jobserver), nested ``peltak run`` and any other tool
+that speaks the protocol (e.g. ``cargo``, ``ninja``) share the same N
+slots as the peltak scripts. When peltak itself runs under a jobserver (for
+example from a ``make -j8`` recipe) it's a client: every script takes a slot
+from the inherited jobserver before it starts.
+
+Both the pipe (``--jobserver-auth=R,W``) and the named pipe
+(``--jobserver-auth=fifo:PATH``, make 4.4+) flavours are supported as a
+client. peltak's own jobserver uses the pipe flavour, as it works with all
+make versions. The pipe file descriptors have to be inherited by the child
+processes, so everything that starts processes has to pass `pass_fds()` to
+`subprocess.Popen`.
+
+Slots are re-entrant per thread: taking a slot in a thread that already holds
+one is free. That way, a python script calling ``shell.run()`` doesn't wait
+for a second slot while holding the first one.
+"""
+import os
+import re
+import select
+import stat
+import threading
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
+
+from . import exc, log
+
+
+# How often threads waiting for a token check if the free slot was released.
+POLL_INTERVAL = 0.05
+JOBSERVER_FLAG_RE = re.compile(r'--jobserver-(?:auth|fds)=(\S+)')
+VARIABLES_SEP_RE = re.compile(r'(?:^|\s)--(?=\s|$)')
+
+_active: Optional['Jobserver'] = None
+_inherited_checked = False
+_lock = threading.Lock()
+
+
+class JobserverError(exc.PeltakError):
+    msg = "Jobserver error"
+
+
+class Jobserver(object):
+    """ Hands out job slots from a jobserver.
+
+    The first slot is the one the process gets for free, all the others need
+    a token from the jobserver pipe.
+
+    Args:
+        read_fd (int):
+            The pipe read end, tokens are taken from here.
+        write_fd (int):
+            The pipe write end, tokens are returned here.
+        pass_fds (tuple[int, ...]):
+            File descriptors child processes need to inherit to use the
+            jobserver.
+    """
+
+    def __init__(
+        self,
+        read_fd: int,
+        write_fd: int,
+        pass_fds: Tuple[int, ...] = (),
+    ) -> None:
+        self.write_fd = write_fd
+        self.pass_fds = pass_fds
+        # Own file description, so the read end can be non-blocking without
+        # affecting other processes using the pipe.
+        self.read_fd = _reopen_nonblocking(read_fd)
+        self._free_slot = True
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """ Wait for a free job slot and hold it for the ``with`` block. """
+        depth = getattr(self._local, 'depth', 0)
+        if depth:
+            self._local.depth = depth + 1
+            try:
+                yield
+            finally:
+                self._local.depth = depth
+            return
+
+        token = self._acquire()
+        self._local.depth = 1
+        try:
+            yield
+        finally:
+            self._local.depth = 0
+            self._release(token)
+
+    def close(self) -> None:
+        """ Close the file descriptors opened by this process. """
+        os.close(self.read_fd)
+
+    def _acquire(self) -> Optional[bytes]:
+        while True:
+            with self._lock:
+                if self._free_slot:
+                    self._free_slot = False
+                    return None
+
+            readable, _, _ = select.select([self.read_fd], [], [], POLL_INTERVAL)
+            if not readable:
+                continue
+
+            try:
+                token = os.read(self.read_fd, 1)
+            except BlockingIOError:
+                # Another process was faster.
+                continue
+
+            if not token:
+                raise JobserverError("the jobserver pipe was closed")
+
+            return token
+
+    def _release(self, token: Optional[bytes]) -> None:
+        if token is None:
+            with self._lock:
+                self._free_slot = True
+        else:
+            os.write(self.write_fd, token)
+
+
+def get() -> Optional[Jobserver]:
+    """ Return the jobserver used by this process, if any.
+
+    That's either the jobserver created with `serve()` or the one inherited
+    from the parent process through ``MAKEFLAGS``.
+    """
+    global _active, _inherited_checked
+
+    with _lock:
+        if _active is None and not _inherited_checked:
+            _inherited_checked = True
+            _active = from_makeflags(os.environ.get('MAKEFLAGS', ''))
+
+        return _active
+
+
+@contextmanager
+def slot() -> Iterator[None]:
+    """ Hold a job slot for the ``with`` block, if there is a jobserver. """
+    jobserver = get()
+    if jobserver is None:
+        yield
+    else:
+        with jobserver.slot():
+            yield
+
+
+def pass_fds() -> Tuple[int, ...]:
+    """ File descriptors child processes need to use the jobserver.
+
+    Pass it as ``pass_fds`` to `subprocess.Popen`, the file descriptors are
+    closed in the child process otherwise.
+    """
+    jobserver = get()
+    return jobserver.pass_fds if jobserver is not None else ()
+
+
+@contextmanager
+def serve(jobs: int) -> Iterator[Optional[Jobserver]]:
+    """ Make peltak the jobserver for all its child processes.
+
+    Does nothing if a jobserver was inherited from the parent process (all
+    jobs are limited by that one) or if *jobs* is 1.
+
+    Args:
+        jobs (int):
+            The total number of jobs that can run at the same time.
+
+    Returns:
+        Optional[Jobserver]: The jobserver in use, if any.
+    """
+    global _active
+
+    inherited = get()
+    if inherited is not None or jobs <= 1:
+        yield inherited
+        return
+
+    read_fd, write_fd = os.pipe()
+    os.set_inheritable(read_fd, True)
+    os.set_inheritable(write_fd, True)
+    os.write(write_fd, b'+' * (jobs - 1))
+
+    jobserver = Jobserver(read_fd, write_fd, pass_fds=(read_fd, write_fd))
+    prev_makeflags = os.environ.get('MAKEFLAGS')
+    os.environ['MAKEFLAGS'] = _with_jobserver(
+        prev_makeflags or '',
+        [f'-j{jobs}', f'--jobserver-auth={read_fd},{write_fd}'],
+    )
+    log.dbg("Jobserver with <33>{}<90> slots: <33>{}", jobs, os.environ['MAKEFLAGS'])
+
+    with _lock:
+        _active = jobserver
+
+    try:
+        yield jobserver
+    finally:
+        with _lock:
+            _active = None
+
+        if prev_makeflags is None:
+            os.environ.pop('MAKEFLAGS', None)
+        else:
+            os.environ['MAKEFLAGS'] = prev_makeflags
+
+        jobserver.close()
+        os.close(read_fd)
+        os.close(write_fd)
+
+
+def from_makeflags(makeflags: str) -> Optional[Jobserver]:
+    """ Connect to the jobserver described in *makeflags*.
+
+    Returns:
+        Optional[Jobserver]: **None** if there is no jobserver or it can't be
+        used (e.g. the pipe file descriptors were not inherited).
+    """
+    matches = JOBSERVER_FLAG_RE.findall(makeflags)
+    if not matches:
+        return None
+
+    auth = matches[-1]
+    try:
+        if auth.startswith('fifo:'):
+            path = auth[len('fifo:'):]
+            read_fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+            try:
+                return Jobserver(read_fd, os.open(path, os.O_WRONLY))
+            finally:
+                os.close(read_fd)
+
+        read_fd, write_fd = (int(x) for x in auth.split(','))
+        # Both ends must be open pipes. make closes them for recipes it
+        # doesn't consider to be sub-makes, the numbers might be reused by
+        # unrelated files since.
+        if not all(stat.S_ISFIFO(os.fstat(fd).st_mode) for fd in (read_fd, write_fd)):
+            raise ValueError("not a pipe")
+
+        return Jobserver(read_fd, write_fd, pass_fds=(read_fd, write_fd))
+    except (OSError, ValueError) as ex:
+        log.dbg("Ignoring jobserver <33>{}<90>: {}", auth, ex)
+        return None
+
+
+def _with_jobserver(makeflags: str, flags: List[str]) -> str:
+    # Command line variables come after a lone ``--``, make would take
+    # anything after it for a variable too.
+    match = VARIABLES_SEP_RE.search(makeflags)
+    options, variables = makeflags, ''
+    if match:
+        options, variables = makeflags[:match.start()], makeflags[match.end() - 2:]
+
+    options = ' '.join(
+        [x for x in options.split() if not x.startswith(('--jobserver-', '-j'))]
+        + flags
+    )
+    return f'{options} {variables}' if variables else options
+
+
+def _reopen_nonblocking(fd: int) -> int:
+    path = f'/proc/self/fd/{fd}'
+    if os.path.exists(path):
+        return os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+
+    # No procfs, the read end is shared with the other processes. Reads can
+    # still block if another process takes the token first.
+    return os.dup(fd)
@@ -30,26 +30,15 @@ scripts subsystem very flexible.
 Get a list of scripts available in the project
 ==============================================
 
-To get a list of all scripts that are defined in :ref:`pelconf.yaml <peltak.core.conf>`
-you only need to run the ``peltak run`` command without any arguments.
-Here's an example from the **peltak** project itself (at the time ofwriting)::
+To get a list of all scripts that are defined in the project ``scripts_dir``
+you only need to run the ``peltak run`` command without any arguments::
 
     $ peltak run
-    Usage: peltak run [OPTIONS] COMMAND [ARGS]...
-
-      Run custom scripts
-
-    Options:
-      --help  Show this message and exit.
-
-    Commands:
-      checks       Run all checks (types, pep8, code style)
-      cov-core     Generate coverage report for peltak.core
-      cov-extra    Generate coverage report for peltak.extra
-      cov-scripts  Generate coverage report for peltak.extra.scripts
-      docs         Generate sphinx documentation
-      tests        Run unit tests
-      type-check   Run static type checks
+    build
+    check
+    ci/check-commit
+    docs
+    test
 
 
 Defining a script
@@ -165,4 +154,238 @@ away with all scripts that use it.
 
 You can find out more in `/reference/script_filters`
 
+
+Script dependencies and running scripts in parallel
+===================================================
+
+A script can declare other scripts that have to finish successfully before it
+runs with ``depends_on``. Scripts are named by their path relative to
+``scripts_dir``, without the extension:
+
+.. code-block:: bash
+
+    # peltak:
+    #   about: Run all checks
+    #   depends_on: [lint/mypy, lint/pylint, lint/isort]
+    echo "All checks passed"
+
+``peltak run`` runs the given scripts together with all their dependencies.
+With ``--jobs N`` up to **N** scripts that don't depend on each other run at
+the same time. The output of each script is prefixed with its name, and once
+all scripts are done, ``peltak run`` prints how long each of them took::
+
+    $ peltak run --jobs 4 check
+
+If any script fails, the scripts that are still running are killed and the
+ones that didn't start yet are skipped.
+
+Sharing the job limit with make
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+With ``--jobs N`` peltak is a GNU make jobserver for everything the scripts
+start. ``make`` (called without ``-j``, which would start a separate
+jobserver), a nested ``peltak run`` and other tools that speak the jobserver
+protocol share the same **N** slots with the peltak scripts, so the machine
+doesn't end up running **N** scripts times **N** make jobs at once.
+
+It works the other way around too: when ``peltak run`` is called from a
+``make -j8`` recipe (prefixed with ``+`` or ``$(MAKE)`` in the command, so
+make passes on the jobserver), every script takes one of make's 8 slots
+before it starts.
+
+.. code-block:: bash
+
+    # peltak:
+    #   about: Build all the C extensions
+    make -C ext/fast_json
+
+
+Passing many files to a script
+==============================
+
+By default ``{{ files }}`` holds all the files collected with ``files:`` and
+the command runs once. With many thousands of files that can exceed the
+maximum command line length, and a single tool process only uses one core.
+``files_mode`` changes how the files are passed:
+
+``batch``
+    The command runs once for every ``batch_size`` (500 by default) files,
+    with ``{{ files }}`` holding only the files in the batch. The batches run
+    in parallel (up to ``peltak run --jobs``, all cores when invoked
+    directly). The script fails if any of the batches fails.
+``argfile``
+    ``{{ argfile }}`` is the path to a temporary file listing all the files,
+    one per line, e.g. ``pylint @{{ argfile }}``.
+``stdin``
+    The files are written to the command stdin, separated with NUL, e.g.
+    ``xargs -0 -P 8 pycodestyle``.
+
+.. code-block:: bash
+
+    # peltak:
+    #   about: Run pycodestyle on all python files
+    #   files:
+    #     paths: [src]
+    #     include: '*.py'
+    #   files_mode: batch
+    #   batch_size: 200
+    pycodestyle {{ files | wrap_paths }}
+
+``batch`` mode records how long every batch took in
+``<build_dir>/script-timings.json`` (``scripts.timings_file`` in the config).
+Once the durations are known, the files are split into batches that take
+roughly the same time, so a handful of slow files don't end up in the same
+batch. Scripts using ``{{ files }}`` without ``files_mode`` record their
+durations too, the run time is split evenly between all the files.
+
+Splitting the work between CI machines
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+``peltak run --shard i/N`` only passes the i-th of N shards of the script files
+to the command. Running ``--shard 1/4`` up to ``--shard 4/4`` on 4 machines
+processes every file exactly once. The shards are balanced using the recorded
+durations, so all the machines should use the same timings file (e.g. restore
+it from the CI cache or commit it to the repo).
+
+.. code-block:: bash
+
+    $ peltak run --shard 2/4 test
+
+Bash built-ins
+==============
+
+Shell scripts can use a few helper functions by listing them in ``use:``. They
+are pure bash, so calling them doesn't start any new processes. Scripts that
+use any of them always run in bash, even if ``$SHELL`` is something else:
+
+.. code-block:: bash
+
+    # peltak:
+    #   about: Build everything
+    #   use: [header, peltak_time, peltak_parallel]
+    header "Building"
+    peltak_time docs make -C docs html
+    peltak_parallel "make -C app1" "make -C app2" "make -C app3"
+
+The durations measured with ``peltak_time`` are shown after the script
+finishes and in the ``peltak run`` summary. ``peltak_parallel`` runs at most
+``--jobs`` commands at a time. See `peltak.core.scripts.bash_builtins` for the
+full list.
+
+Replacing the peltak process
+============================
+
+Long running scripts, like dev servers or watch loops, don't need peltak once
+they started. With ``exec: true`` in the header (or ``peltak run --exec``) the
+rendered command replaces the peltak process, so it doesn't keep the python
+interpreter in memory and signals go straight to the script:
+
+.. code-block:: bash
+
+    # peltak:
+    #   about: Run the dev server
+    #   exec: true
+    flask run --reload
+
+Nothing is recorded in the run history for such scripts. ``exec`` only works
+if the command runs exactly once, so it can't be used with matrix scripts,
+``files_mode`` other than ``all`` or python scripts.
+
+Python scripts
+==============
+
+A ``.py`` file in ``scripts_dir`` that starts with the same ``# peltak:``
+header is a python script. Its ``main(ctx, files, opts)`` function is called in
+the peltak process, so it doesn't pay for starting a new interpreter and
+re-importing everything, and shares the already loaded config:
+
+.. code-block:: python
+
+    # peltak:
+    #   about: Check license headers
+    #   files:
+    #     paths: [src]
+    #     include: '*.py'
+    def main(ctx, files, opts):
+        missing = [p for p in files if 'Licensed under' not in open(p).read()]
+        print('\n'.join(missing))
+        return 1 if missing else 0
+
+The return value (or ``sys.exit()`` code) is the script exit code. With
+``--pretend`` the function is not called. ``.py`` files without the header are
+imported as before, so they can still define their own commands. See
+`peltak.core.scripts.inprocess` for details.
+
+Matrix scripts
+==============
+
+A script can be run for every combination of a set of parameters by defining
+a ``matrix:``. The values of the current combination are available in the
+template as ``{{ matrix }}``. Quote version numbers, YAML reads ``3.10`` as
+the number ``3.1``:
+
+.. code-block:: bash
+
+    # peltak:
+    #   about: Run tests against all supported environments
+    #   matrix:
+    #     python: ['3.8', '3.9', '3.10', '3.11']
+    #     db: [sqlite, pg-local]
+    tox -e py{{ matrix.python | replace('.', '') }} -- --db={{ matrix.db }}
+
+``peltak run --jobs 4 test`` will run all 8 combinations, 4 at a time, with
+each line of output prefixed with the combination, e.g.
+``test[python=3.8,db=sqlite]``. Calling the script directly (``peltak test``)
+runs the combinations one after another.
+
+Skipping scripts that are up to date
+====================================
+
+A script can declare everything its result depends on with ``inputs:`` (files,
+environment variables and config values) and the files it generates with
+``outputs:``:
+
+.. code-block:: bash
+
+    # peltak:
+    #   about: Build documentation
+    #   inputs:
+    #     files:
+    #       paths: [docs, src]
+    #       include: ['*.rst', '*.py']
+    #     env: [SPHINXOPTS]
+    #     conf: [version.files]
+    #   outputs: [docs/html]
+    sphinx-build -b html docs docs/html
+
+``peltak run`` will then skip the script if neither the rendered command nor
+any of the inputs changed since its last successful run and the outputs were
+not touched since. The output of that run is printed instead. The results are
+stored in ``<build_dir>/script-results.sqlite``, see ``peltak cache scripts``.
+Use ``peltak run --no-cache`` to always run the scripts.
+
+Script performance over time
+============================
+
+Every script run is recorded in ``<build_dir>/script-history.sqlite``, along
+with its CPU time, peak memory usage, exit code and number of files. ``peltak
+stats`` shows the timings of all scripts and which of them got slower recently;
+``peltak stats <script>`` shows the latest runs of a single script. The
+``peltak.cli.stats`` plugin has to be enabled in the config.
+
+Benchmarking scripts
+====================
+
+``peltak bench`` (the ``peltak.cli.bench`` plugin) runs scripts many times and
+reports the mean, standard deviation, median, min and max wall time, CPU time
+and peak memory. Scripts can be given with their options, to compare them, and
+other scripts can prepare every run or clean up after the benchmark:
+
+.. code-block:: bash
+
+    $ peltak bench -w 2 -r 20 -p clear-cache 'test' 'test --no-cov'
+    $ peltak bench build --export-json bench.json --export-markdown bench.md
+
+See `peltak.core.scripts.bench` for details.
+
 """
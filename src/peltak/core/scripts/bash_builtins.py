@@ -0,0 +1,160 @@
+# Copyright 2017-2020 Mateusz Klos
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+""" Bash functions that shell scripts can use.
+
+A script lists the built-ins it uses in its header and they are defined at the
+top of the script::
+
+    # peltak:
+    #   about: Build everything
+    #   use: [header, peltak_time, peltak_parallel]
+    header "Building"
+    peltak_time docs make -C docs html
+    peltak_parallel "make -C app1" "make -C app2" "make -C app3"
+
+All built-ins are pure bash, they don't start any processes (apart from the
+ones they are asked to run), so they are cheap to call in loops.
+
+``cprint <msg>``
+    Print a message with ``<NN>`` color codes, like `shell.cprint()`.
+``header <title>``
+    Print a section header.
+``peltak_time <label> <cmd> [args...]``
+    Run the command and report how long it took. The timings are shown by
+    peltak after the script finishes (next to the script in the ``peltak run``
+    summary).
+``peltak_parallel [-j N] [cmd...]``
+    Run the given commands (or the ones read from stdin, one per line) with at
+    most N (by default as many as there are CPU cores) running at the same
+    time. Fails if any of the commands fails.
+"""
+import textwrap
+from typing import Dict, List
+
+
+BUILTIN_FUNCTIONS = {
+    'cprint': textwrap.dedent('''
+        local text="$*<0>"
+        while [[ $text =~ \\<([0-9][0-9]?)\\> ]]; do
+            text=${text//"${BASH_REMATCH[0]}"/$'\\e['"${BASH_REMATCH[1]}m"}
+        done
+        printf '%s\\n' "$text"
+    '''),
+    'header': textwrap.dedent('''
+        local title="$*"
+        local bar_len=$(( 77 - ${#title} ))
+        (( bar_len > 0 )) || bar_len=0
+        local header_bar
+        printf -v header_bar '%*s' "$bar_len" ''
+
+        cprint "<32>= <35>$title <32>${header_bar// /=}"
+    '''),
+    'peltak_time': textwrap.dedent('''
+        local label="$1"
+        shift
+
+        local start=${EPOCHREALTIME/[.,]/}
+        local retcode=0
+        "$@" || retcode=$?
+        local elapsed=$(( ${EPOCHREALTIME/[.,]/} - start ))
+
+        if [[ -n $PELTAK_TIMINGS ]]; then
+            printf '%s\\t%d\\n' "$label" "$elapsed" >> "$PELTAK_TIMINGS"
+        else
+            printf -v elapsed '%d.%03ds' $(( elapsed / 1000000 )) \\
+                $(( elapsed / 1000 % 1000 ))
+            cprint "<90>$label took <0>$elapsed"
+        fi
+
+        return $retcode
+    '''),
+    'peltak_parallel': textwrap.dedent('''
+        local jobs=${PELTAK_JOBS:-4}
+        if [[ $1 == -j ]]; then
+            jobs=$2
+            shift 2
+        fi
+
+        local cmds=("$@")
+        if (( ${#cmds[@]} == 0 )); then
+            mapfile -t cmds
+        fi
+
+        # ``wait -n`` can miss jobs that finish at the same time, so it's
+        # only used to wait for a free slot. Exit codes are collected by PID.
+        local cmd pid running=0 failed=0
+        local pids=()
+        for cmd in "${cmds[@]}"; do
+            [[ -n $cmd ]] || continue
+
+            if (( running >= jobs )); then
+                wait -n || true
+                running=$(( running - 1 ))
+            fi
+
+            eval "$cmd" &
+            pids+=("$!")
+            running=$(( running + 1 ))
+        done
+
+        for pid in "${pids[@]}"; do
+            wait "$pid" || failed=1
+        done
+
+        return $failed
+    '''),
+}
+# Built-ins used by other built-ins.
+BUILTIN_DEPENDENCIES = {
+    'header': ['cprint'],
+    'peltak_time': ['cprint'],
+}
+
+
+def resolve(names: List[str]) -> List[str]:
+    """ Return the given built-ins and all the built-ins they depend on.
+
+    >>> resolve(['header'])
+    ['cprint', 'header']
+    >>> resolve(['unknown', 'cprint'])
+    ['cprint']
+    """
+    result: List[str] = []
+
+    def add(name: str) -> None:
+        if name in result or name not in BUILTIN_FUNCTIONS:
+            return
+
+        for dependency in BUILTIN_DEPENDENCIES.get(name, []):
+            add(dependency)
+
+        result.append(name)
+
+    for name in names:
+        add(name)
+
+    return result
+
+
+def render(names: List[str]) -> str:
+    """ Return bash code defining the given built-ins. """
+    functions: Dict[str, str] = {
+        name: textwrap.indent(BUILTIN_FUNCTIONS[name], prefix='    ')
+        for name in resolve(names)
+    }
+
+    return ''.join(
+        f'function {name}() {{{impl}}}\n' for name, impl in functions.items()
+    )
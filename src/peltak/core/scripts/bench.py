@@ -0,0 +1,354 @@
+# Copyright 2017-2020 Mateusz Klos
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+""" Benchmark scripts by running them many times.
+
+Every benchmark is run a few times without measuring anything (warmup, to fill
+the caches) and then measured ``runs`` times. For every run the wall time,
+user and system CPU time and the peak memory usage is recorded.
+
+A benchmark is a script name, optionally followed by the script options, so
+the same script can be compared with different options, e.g.
+``test --no-cov``. Matrix scripts are benchmarked for every combination
+separately.
+
+The benchmarked command is rendered once, so selecting the script files
+(``{{ files }}``) is not part of the measured time. Shell scripts are measured
+with ``wait4()`` so the usage includes every process the script started. Linux
+counts the memory of the forked peltak process before it started the shell, so
+the peak memory of a shell script is never lower than the size of peltak.
+Python scripts are run in the peltak process, their peak memory usage is the
+peak of the whole peltak process.
+"""
+import contextlib
+import dataclasses
+import json
+import os
+import resource
+import shlex
+import statistics
+import subprocess
+import time
+from typing import Any, Dict, List, Optional
+
+from peltak.core import conf, exc, jobserver
+
+from . import loader, logic
+from .history import rss_bytes
+from .types import CliOptions, Script
+
+
+class NotBenchmarkable(exc.PeltakError):
+    msg = "Cannot benchmark script"
+
+
+class BenchmarkFailed(exc.PeltakError):
+    msg = "Benchmark failed"
+
+
+@dataclasses.dataclass
+class BenchRun:
+    """ Measurements of a single benchmark run.
+
+    Attributes:
+        wall_time (float):
+            How long the run took, in seconds.
+        user_time (float):
+            CPU time spent in user mode, in seconds.
+        sys_time (float):
+            CPU time spent in the kernel, in seconds.
+        max_rss (int):
+            Peak resident memory, in bytes.
+        retcode (int):
+            The script exit code.
+    """
+    wall_time: float
+    user_time: float
+    sys_time: float
+    max_rss: int
+    retcode: int
+
+
+@dataclasses.dataclass
+class BenchResult:
+    """ All measured runs of a single benchmark. """
+    name: str
+    runs: List[BenchRun] = dataclasses.field(default_factory=list)
+
+    @property
+    def times(self) -> List[float]:
+        return [x.wall_time for x in self.runs]
+
+    @property
+    def mean(self) -> float:
+        return statistics.mean(self.times)
+
+    @property
+    def stddev(self) -> float:
+        """ Sample standard deviation of the wall time, 0 for a single run. """
+        return statistics.stdev(self.times) if len(self.runs) > 1 else 0.0
+
+    @property
+    def median(self) -> float:
+        return statistics.median(self.times)
+
+    @property
+    def min(self) -> float:
+        return min(self.times)
+
+    @property
+    def max(self) -> float:
+        return max(self.times)
+
+    @property
+    def user(self) -> float:
+        """ Mean user CPU time. """
+        return statistics.mean(x.user_time for x in self.runs)
+
+    @property
+    def system(self) -> float:
+        """ Mean system CPU time. """
+        return statistics.mean(x.sys_time for x in self.runs)
+
+    @property
+    def max_rss(self) -> int:
+        """ The highest peak memory usage of all runs. """
+        return max(x.max_rss for x in self.runs)
+
+    def as_dict(self) -> Dict[str, Any]:
+        """ Return the result summary and all the measurements. """
+        return {
+            'name': self.name,
+            'mean': self.mean,
+            'stddev': self.stddev,
+            'median': self.median,
+            'min': self.min,
+            'max': self.max,
+            'user': self.user,
+            'system': self.system,
+            'max_rss': self.max_rss,
+            'times': self.times,
+            'exit_codes': [x.retcode for x in self.runs],
+        }
+
+
+@dataclasses.dataclass
+class Benchmark:
+    """ A script with the options it's benchmarked with.
+
+    Attributes:
+        name (str):
+            The benchmark name shown in the results, e.g.
+            ``test[python=3.8] --no-cov``.
+        script (Script):
+            The script (single matrix instance) to run.
+        options (dict[str, Any]):
+            The script options.
+        cmd (Optional[str]):
+            The rendered command. **None** for python scripts.
+        files (Optional[list[str]]):
+            Files passed to python scripts, selected only once.
+    """
+    name: str
+    script: Script
+    options: CliOptions
+    cmd: Optional[str] = None
+    files: Optional[List[str]] = None
+
+    @classmethod
+    def parse(cls, spec: str) -> List['Benchmark']:
+        """ Create benchmarks for script name and options given in *spec*.
+
+        Returns one benchmark for every matrix combination.
+
+        Raises:
+            NotBenchmarkable: If the script runs a separate command for every
+                batch of files.
+        """
+        name, *args = shlex.split(spec)
+        script = loader.get_script(name)
+
+        if script.files_mode != 'all':
+            raise NotBenchmarkable(
+                f"{name}: files_mode: {script.files_mode} runs many commands"
+            )
+
+        options = script.parse_options(args)
+        result = []
+        for instance in script.matrix_instances():
+            benchmark = cls(
+                name=' '.join([instance.full_name] + args),
+                script=instance,
+                options=options,
+            )
+            if not instance.python_file:
+                benchmark.cmd = logic.compile_script(instance, options)
+            elif instance.files:
+                benchmark.files = list(logic.select_files(instance))
+
+            result.append(benchmark)
+
+        return result
+
+    def run(self, show_output: bool = False) -> BenchRun:
+        """ Run the benchmark once and measure it. """
+        if self.cmd is None:
+            return self._run_python(show_output)
+
+        output = None if show_output else subprocess.DEVNULL
+        start = time.monotonic()
+        p = subprocess.Popen(
+            self.cmd,
+            shell=True,
+            executable=logic.script_shell(self.script),
+            cwd=conf.proj_path(),
+            stdin=subprocess.DEVNULL,
+            stdout=output,
+            stderr=output,
+            pass_fds=jobserver.pass_fds(),
+        )
+        retcode, usage = logic.wait_process(p)
+        wall_time = time.monotonic() - start
+
+        if usage is None:
+            return BenchRun(wall_time, 0.0, 0.0, 0, retcode)
+
+        return BenchRun(
+            wall_time=wall_time,
+            user_time=usage.ru_utime,
+            sys_time=usage.ru_stime,
+            max_rss=rss_bytes(usage.ru_maxrss),
+            retcode=retcode,
+        )
+
+    def _run_python(self, show_output: bool) -> BenchRun:
+        with contextlib.ExitStack() as stack:
+            if not show_output:
+                devnull = stack.enter_context(open(os.devnull, 'w'))
+                stack.enter_context(contextlib.redirect_stdout(devnull))
+                stack.enter_context(contextlib.redirect_stderr(devnull))
+
+            before = resource.getrusage(resource.RUSAGE_SELF)
+            start = time.monotonic()
+            retcode = logic.exec_python_script(
+                self.script,
+                self.options,
+                pretend=False,
+                extra_ctx=None if self.files is None else {'files': self.files},
+            )
+            wall_time = time.monotonic() - start
+            after = resource.getrusage(resource.RUSAGE_SELF)
+
+        return BenchRun(
+            wall_time=wall_time,
+            user_time=after.ru_utime - before.ru_utime,
+            sys_time=after.ru_stime - before.ru_stime,
+            max_rss=rss_bytes(after.ru_maxrss),
+            retcode=retcode,
+        )
+
+
+def measure(
+    benchmark: Benchmark,
+    runs: int,
+    warmup: int = 0,
+    prepare: Optional[List[Benchmark]] = None,
+    cleanup: Optional[List[Benchmark]] = None,
+    ignore_failure: bool = False,
+    show_output: bool = False,
+) -> BenchResult:
+    """ Run the benchmark *warmup* + *runs* times and measure the last *runs*.
+
+    Args:
+        benchmark (Benchmark):
+            The benchmark to run.
+        runs (int):
+            How many times the benchmark is measured.
+        warmup (int):
+            How many times the benchmark is run before the measurements start.
+        prepare (list[Benchmark]):
+            Scripts run before every run of the benchmark, including warmup.
+            They are not measured.
+        cleanup (list[Benchmark]):
+            Scripts run once all runs of the benchmark finished.
+        ignore_failure (bool):
+            Keep going if the benchmarked script fails. Failing prepare and
+            cleanup scripts always stop the benchmark.
+        show_output (bool):
+            Show the output of the benchmarked script. Hidden by default.
+
+    Raises:
+        BenchmarkFailed: If any of the scripts failed.
+    """
+    result = BenchResult(benchmark.name)
+
+    for i in range(warmup + runs):
+        for hook in prepare or []:
+            _run_hook(hook, show_output)
+
+        run = benchmark.run(show_output)
+        failed = run.retcode not in benchmark.script.success_exit_codes
+        if failed and not ignore_failure:
+            raise BenchmarkFailed(
+                f"{benchmark.name} exited with {run.retcode}, use "
+                f"--ignore-failure to measure failing scripts"
+            )
+
+        if i >= warmup:
+            result.runs.append(run)
+
+    for hook in cleanup or []:
+        _run_hook(hook, show_output)
+
+    return result
+
+
+def to_json(results: List[BenchResult]) -> str:
+    """ Export the results, including every measured run, as JSON. """
+    return json.dumps({'results': [x.as_dict() for x in results]}, indent=2)
+
+
+def to_markdown(results: List[BenchResult]) -> str:
+    """ Export the results as a markdown table.
+
+    The times are in milliseconds if all benchmarks take less than a second.
+    The *Relative* column compares the mean time with the fastest benchmark.
+    """
+    fastest = min(x.mean for x in results)
+    unit, scale = ('ms', 1000) if max(x.mean for x in results) < 1 else ('s', 1)
+    lines = [
+        '| Script | Mean [{0}] | Median [{0}] | Min [{0}] | Max [{0}] | Relative |'
+        .format(unit),
+        '|:---|---:|---:|---:|---:|---:|',
+    ]
+    for result in results:
+        lines.append(
+            '| `{}` | {:.3f} ± {:.3f} | {:.3f} | {:.3f} | {:.3f} | {:.2f} |'.format(
+                result.name.replace('|', '\\|'),
+                result.mean * scale,
+                result.stddev * scale,
+                result.median * scale,
+                result.min * scale,
+                result.max * scale,
+                result.mean / fastest if fastest else 1.0,
+            )
+        )
+
+    return '\n'.join(lines) + '\n'
+
+
+def _run_hook(hook: Benchmark, show_output: bool) -> None:
+    run = hook.run(show_output)
+    if run.retcode not in hook.script.success_exit_codes:
+        raise BenchmarkFailed(f"{hook.name} exited with {run.retcode}")
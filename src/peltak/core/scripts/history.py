@@ -0,0 +1,372 @@
+# Copyright 2017-2020 Mateusz Klos
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+""" History of script runs.
+
+Every script run is recorded in ``<build_dir>/script-history.sqlite``: when it
+started, how long it took (wall and CPU time), how much memory it used, its exit
+code, how many files it got and a hash of the rendered command. ``peltak
+stats`` uses it to show how the scripts perform over time and which of them
+got slower.
+
+Configuration (all optional)::
+
+    scripts:
+      history:
+        enabled: true
+        max_runs: 1000      # Per script, the oldest runs are removed.
+"""
+import dataclasses
+import hashlib
+import os
+import sqlite3
+import sys
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from peltak.core import conf, log
+
+
+DEFAULT_MAX_RUNS = 1000
+
+_history: Optional['RunHistory'] = None
+
+
+@dataclasses.dataclass
+class ScriptRun:
+    """ A single script run.
+
+    Attributes:
+        script (str):
+            Name of the script, including the matrix values.
+        started (float):
+            Unix timestamp of when the script started.
+        cmd_hash (str):
+            Hash of the rendered command(s), see `command_hash()`.
+        wall_time (float):
+            How long the script took, in seconds.
+        cpu_time (float):
+            User + system CPU time of all the script processes, in seconds.
+        max_rss (int):
+            Peak memory usage (resident set size) of the biggest process, in
+            bytes.
+        retcode (Optional[int]):
+            The script exit code.
+        success (bool):
+            Whether the exit code is one of the script ``success_exit_codes``.
+        files (Optional[int]):
+            The number of files passed to the script, **None** if the script
+            doesn't use files.
+        processes (int):
+            How many times the script command was run, e.g. once for every
+            batch of files.
+    """
+    script: str
+    started: float
+    cmd_hash: str = ''
+    wall_time: float = 0.0
+    cpu_time: float = 0.0
+    max_rss: int = 0
+    retcode: Optional[int] = None
+    success: bool = False
+    files: Optional[int] = None
+    processes: int = 0
+
+    def add_usage(self, cpu_time: float, max_rss: int) -> None:
+        """ Add the resource usage of a single execution of the script command.
+
+        Args:
+            cpu_time (float):
+                CPU time used, in seconds.
+            max_rss (int):
+                Peak memory usage, in bytes.
+        """
+        self.cpu_time += cpu_time
+        self.max_rss = max(self.max_rss, max_rss)
+        self.processes += 1
+
+    def add_rusage(self, usage) -> None:
+        """ Add the resource usage of a finished script process.
+
+        Args:
+            usage (resource.struct_rusage):
+                The usage as returned by `os.wait4()`.
+        """
+        self.add_usage(usage.ru_utime + usage.ru_stime, rss_bytes(usage.ru_maxrss))
+
+
+@dataclasses.dataclass
+class ScriptStats:
+    """ Summary of the recorded runs of a single script.
+
+    Only successful runs are taken into account for the timings, failed runs
+    often stop early.
+
+    Attributes:
+        script (str):
+            Name of the script.
+        runs (int):
+            The number of recorded runs.
+        failed (int):
+            How many of the runs failed.
+        p50 (float):
+            Median wall time.
+        p95 (float):
+            95th percentile of the wall time.
+        max (float):
+            The longest run.
+        last (float):
+            Wall time of the latest successful run.
+        recent (float):
+            Median wall time of the latest runs.
+        baseline (Optional[float]):
+            Median wall time of the runs before the latest ones. **None** if
+            there are not enough runs to compare against.
+    """
+    script: str
+    runs: int
+    failed: int
+    p50: float
+    p95: float
+    max: float
+    last: float
+    recent: float
+    baseline: Optional[float]
+
+    @property
+    def change(self) -> Optional[float]:
+        """ How many times slower (or faster) the recent runs are. """
+        if not self.baseline:
+            return None
+
+        return self.recent / self.baseline
+
+    @classmethod
+    def from_runs(
+        cls,
+        script: str,
+        runs: List[ScriptRun],
+        window: int,
+    ) -> Optional['ScriptStats']:
+        """ Compute the stats for the given runs, oldest first.
+
+        Args:
+            script (str):
+                Name of the script.
+            runs (list[ScriptRun]):
+                All recorded runs of the script, oldest first.
+            window (int):
+                How many of the latest successful runs are compared against
+                the ones before them (up to 4 times as many).
+
+        Returns:
+            Optional[ScriptStats]: The stats or **None** if the script never
+            succeeded.
+        """
+        times = [r.wall_time for r in runs if r.success]
+        if not times:
+            return None
+
+        recent = times[-window:]
+        older = times[-5 * window:-window]
+
+        return cls(
+            script=script,
+            runs=len(runs),
+            failed=len(runs) - len(times),
+            p50=percentile(times, 50),
+            p95=percentile(times, 95),
+            max=max(times),
+            last=times[-1],
+            recent=percentile(recent, 50),
+            baseline=percentile(older, 50) if len(older) >= window else None,
+        )
+
+
+class RunHistory(object):
+    """ SQLite backed history of script runs.
+
+    All errors are logged and swallowed, the history should never break the
+    scripts. Access from multiple threads has to be serialized by the caller.
+    """
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            script TEXT NOT NULL,
+            started REAL NOT NULL,
+            cmd_hash TEXT NOT NULL,
+            wall_time REAL NOT NULL,
+            cpu_time REAL NOT NULL,
+            max_rss INTEGER NOT NULL,
+            retcode INTEGER,
+            success INTEGER NOT NULL,
+            files INTEGER,
+            processes INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS runs_script ON runs(script, id);
+    '''
+    FIELDS = [f.name for f in dataclasses.fields(ScriptRun)]
+
+    def __init__(self, path: str, max_runs: int = DEFAULT_MAX_RUNS):
+        self.path = path
+        self.max_runs = max_runs
+        self._db: Optional[sqlite3.Connection] = None
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        """ Lazily opened database connection. """
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._db = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            self._db.executescript(self.SCHEMA)
+
+        return self._db
+
+    def close(self) -> None:
+        """ Close the database connection. """
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def record(self, run: ScriptRun) -> None:
+        """ Store the script run.
+
+        Only the latest ``max_runs`` runs are kept for every script.
+        """
+        values = dataclasses.astuple(run)
+        try:
+            self.db.execute(
+                'INSERT INTO runs ({}) VALUES ({})'.format(
+                    ', '.join(self.FIELDS),
+                    ', '.join('?' * len(values)),
+                ),
+                values,
+            )
+            self.db.execute(
+                'DELETE FROM runs WHERE script = ? AND id NOT IN ('
+                '   SELECT id FROM runs WHERE script = ? ORDER BY id DESC LIMIT ?'
+                ')',
+                (run.script, run.script, self.max_runs),
+            )
+            self.db.commit()
+        except sqlite3.Error as ex:
+            log.dbg("Failed to record script run: {}", ex)
+
+    def runs(self, script: Optional[str] = None) -> List[ScriptRun]:
+        """ Return the recorded runs, oldest first.
+
+        Args:
+            script (Optional[str]):
+                If given, only return runs of that script.
+        """
+        if not os.path.exists(self.path):
+            return []
+
+        query = 'SELECT {} FROM runs'.format(', '.join(self.FIELDS))
+        params: Tuple[str, ...] = ()
+        if script is not None:
+            query += ' WHERE script = ?'
+            params = (script,)
+
+        try:
+            rows = self.db.execute(query + ' ORDER BY id', params).fetchall()
+        except sqlite3.Error as ex:
+            log.dbg("Failed to read script history: {}", ex)
+            return []
+
+        return [
+            dataclasses.replace(ScriptRun(*row), success=bool(row[7]))
+            for row in rows
+        ]
+
+    def stats(self, window: int = 5) -> List[ScriptStats]:
+        """ Return stats for every script that succeeded at least once.
+
+        See `ScriptStats.from_runs()` for the meaning of *window*.
+        """
+        by_script: Dict[str, List[ScriptRun]] = {}
+        for run in self.runs():
+            by_script.setdefault(run.script, []).append(run)
+
+        result = (
+            ScriptStats.from_runs(name, runs, window)
+            for name, runs in by_script.items()
+        )
+        return [x for x in result if x is not None]
+
+    def clear(self) -> None:
+        """ Remove all recorded runs. """
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def open_history() -> Optional[RunHistory]:
+    """ Return the script run history for the project.
+
+    Returns:
+        Optional[RunHistory]: The run history or **None** if it's disabled or
+        ``build_dir`` is not configured.
+    """
+    global _history
+
+    if _history is not None:
+        return _history
+
+    if not conf.get('scripts.history.enabled', True):
+        return None
+
+    build_dir = conf.get_path('build_dir', None)
+    if build_dir is None:
+        return None
+
+    _history = RunHistory(
+        os.path.join(build_dir, 'script-history.sqlite'),
+        max_runs=conf.get('scripts.history.max_runs', DEFAULT_MAX_RUNS),
+    )
+    return _history
+
+
+def command_hash(commands: Iterable[str]) -> str:
+    """ Return a short hash of the rendered script command(s).
+
+    >>> command_hash(['echo hello'])
+    '5f8d1ec1a96c'
+    """
+    digest = hashlib.sha1()
+    for cmd in commands:
+        digest.update(cmd.encode('utf-8'))
+        digest.update(b'\0')
+
+    return digest.hexdigest()[:12]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """ Return the given percentile of the values (nearest rank method).
+
+    >>> percentile([5, 1, 4, 2, 3], 50)
+    3
+    >>> percentile(list(range(1, 101)), 95)
+    95
+    """
+    if not values:
+        return 0.0
+
+    ordered = sorted(values)
+    rank = -(-len(ordered) * pct // 100)
+    return ordered[max(0, int(rank) - 1)]
+
+
+def rss_bytes(maxrss: int) -> int:
+    """ Convert ``ru_maxrss`` to bytes. Linux reports it in KiB, macOS in bytes. """
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
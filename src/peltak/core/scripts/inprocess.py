@@ -0,0 +1,132 @@
+# Copyright 2017-2020 Mateusz Klos
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+""" Python scripts called in the peltak process.
+
+A ``.py`` file in ``scripts_dir`` that starts with the same YAML header as the
+shell scripts is a python script. Instead of spawning a shell (and most likely
+a new python interpreter that has to import everything again), its ``main()``
+function is called in the peltak process:
+
+.. code-block:: python
+
+    # peltak:
+    #   about: Check that all modules have a license header
+    #   files:
+    #     paths: [src]
+    #     include: '*.py'
+    from peltak.core import log
+
+    def main(ctx, files, opts):
+        missing = [p for p in files if 'Licensed under' not in open(p).read()]
+        for path in missing:
+            log.err("Missing license header: {}", path)
+
+        return 1 if missing else 0
+
+*ctx* is the same context shell scripts get in their templates (``conf``,
+``ctx``, ``script``, ``matrix``...), *files* is the list of collected files and
+*opts* the command line options. The return value is the script exit code,
+**None** means 0. ``sys.exit()`` works as expected and an unhandled exception
+fails the script with exit code 1.
+"""
+import importlib.util
+import os
+import threading
+import traceback
+from pathlib import Path
+from types import ModuleType
+from typing import Any, Dict, List
+
+from peltak.core import exc, log
+
+
+HEADER_START = '# peltak:'
+
+_modules: Dict[str, ModuleType] = {}
+_modules_lock = threading.Lock()
+
+
+class NoMainFunction(exc.PeltakError):
+    msg = "No main() function"
+
+
+def is_python_script(path: Path) -> bool:
+    """ Return **True** if the given ``.py`` file is a peltak script.
+
+    Python files without the header are regular modules, imported when the
+    scripts are loaded so they can register their own commands.
+    """
+    with path.open() as fp:
+        for line in fp:
+            if line.startswith('#!') or (line.startswith('#') and 'coding' in line):
+                continue
+
+            return line.rstrip() == HEADER_START
+
+    return False
+
+
+def load_module(path: str) -> ModuleType:
+    """ Import the python script. Every script is imported only once. """
+    with _modules_lock:
+        module = _modules.get(path)
+        if module is None:
+            name = 'peltak_scripts.' + Path(path).stem.replace('-', '_')
+            spec = importlib.util.spec_from_file_location(name, path)
+            assert spec is not None
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)     # type: ignore
+            _modules[path] = module
+
+    return module
+
+
+def call_main(
+    path: str,
+    ctx: Dict[str, Any],
+    files: List[str],
+    opts: Dict[str, Any],
+) -> int:
+    """ Call the ``main()`` function of the python script.
+
+    Args:
+        path (str):
+            Path to the script file.
+        ctx (dict[str, Any]):
+            The script context, the same as shell scripts get in the template.
+        files (list[str]):
+            The collected script files.
+        opts (dict[str, Any]):
+            The script command line options.
+
+    Returns:
+        int: The script exit code.
+    """
+    main = getattr(load_module(path), 'main', None)
+    if not callable(main):
+        raise NoMainFunction(f"{path} doesn't define main(ctx, files, opts)")
+
+    try:
+        retcode = main(ctx, files, opts)
+    except SystemExit as ex:
+        retcode = ex.code
+    except Exception:  # pylint: disable=broad-except
+        log.err("Script {} failed:\n{}", os.path.basename(path), traceback.format_exc())
+        return 1
+
+    if retcode is None:
+        return 0
+
+    return retcode if isinstance(retcode, int) else 1
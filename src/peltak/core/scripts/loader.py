@@ -1,15 +1,15 @@
 import os
 import re
-import textwrap
 from pathlib import Path
-from typing import Any, Dict, Iterator, List, cast
+from typing import Any, Dict, Iterator, List, Optional, cast
 
 import click
 
 from peltak.cli import peltak_cli
 from peltak.core import conf, exc, log, util
 
-from . import types
+from . import bash_builtins, inprocess, types
+from .manifest import ScriptManifest
 
 
 class NoScript(exc.PeltakError):
@@ -20,37 +20,110 @@ class CommandAlreadyExists(exc.PeltakError):
     msg = "Command Already Exists"
 
 
-BUILTIN_FUNCTIONS = {
-    'cprint': textwrap.dedent('''
-        echo $(echo "$@<0>" | sed -E 's/<([0-9][0-9]?)>/\\x1b[\\1m/g')
-    '''),
-    'header': textwrap.dedent('''
-        local title="$@"
-        local title_len=$(echo $title | wc -m)
-        local bar_len=$(( 78 - title_len ))
-        local header_bar=$(head -c $bar_len < /dev/zero | tr '\\0' '=')
+class UnknownScript(exc.PeltakError):
+    msg = "Unknown Script"
 
-        echo $(echo "<32>= <35>$title <32>$header_bar<0>" \\
-            | sed -E 's/<([0-9][0-9]?)>/\\x1b[\\1m/g')
-    '''),
-}
+
+# All scripts loaded from scripts_dir, by their path relative to scripts_dir
+# without the extension (e.g. ``ci/check-commit``).
+_scripts: Dict[str, 'LazyScriptCommand'] = {}
+RE_HEADER = re.compile(r'^# (?P<content>.*)')
 
 
 def register_scripts_from(scripts_dir: Path) -> None:
-    """ Parse script files and build the ClI for it. """
+    """ Parse script files and build the ClI for it.
+
+    Only the script headers are parsed here (and cached in the
+    `ScriptManifest`), the scripts are registered as `LazyScriptCommand` and
+    fully loaded only when invoked.
+    """
     if not (scripts_dir.exists() and scripts_dir.is_dir()):
         # Silently return if the scripts directory does not exist. They are not
         # required and the completion should not brake so we can't raise
         # any exceptions or print anything to stdout/stderr.
         return
 
+    manifest = ScriptManifest.open()
+
     for script_path in _iter_script_files(scripts_dir):
         log.dbg(f"Loading script {script_path}")
 
-        script = _parse_script(script_path)
+        header = manifest.header(script_path, _parse_header)
         rel_path = script_path.relative_to(scripts_dir)
         script_cli_path = str(rel_path).split(os.sep)[:-1]
-        _register_script(script, script_cli_path)
+        name = _script_name(script_path)
+        command = LazyScriptCommand(name, script_path, header)
+        _register_command(command, script_cli_path)
+        _scripts['/'.join(script_cli_path + [name])] = command
+
+    manifest.save()
+
+
+def script_names() -> List[str]:
+    """ Return names of all scripts loaded from scripts_dir. """
+    return sorted(_scripts)
+
+
+def get_script(name: str) -> types.Script:
+    """ Return the script with the given name.
+
+    Args:
+        name (str):
+            The script path relative to scripts_dir, without the extension.
+            For example ``ci/check-commit`` for
+            ``<scripts_dir>/ci/check-commit.sh``.
+
+    Returns:
+        types.Script: The fully loaded script.
+
+    Raises:
+        UnknownScript: If there's no script with that name.
+    """
+    command = _scripts.get(name)
+    if command is None:
+        raise UnknownScript(f"Script '{name}' does not exist")
+
+    return command.script()
+
+
+class LazyScriptCommand(click.Command):
+    """ Click command for a script file that is loaded only when invoked.
+
+    The command is created from the script header alone, which is enough to
+    list it in the help. The script itself is parsed only when the command is
+    invoked (or its help or completions are requested).
+    """
+    def __init__(self, name: str, script_path: Path, header: Dict[str, Any]):
+        super().__init__(name, help=header.get('about', ''))
+        self.script_path = script_path
+        self._script: Optional[types.Script] = None
+        self._command: Optional[click.Command] = None
+
+    def script(self) -> types.Script:
+        """ Parse the script file. """
+        if self._script is None:
+            self._script = _parse_script(self.script_path)
+
+        return self._script
+
+    def load(self) -> click.Command:
+        """ Parse the script and create the actual click command for it. """
+        if self._command is None:
+            self._command = self.script().make_command()
+
+        return self._command
+
+    def make_context(
+        self,
+        info_name: Optional[str],
+        args: List[str],
+        parent: Optional[click.Context] = None,
+        **extra: Any,
+    ) -> click.Context:
+        return self.load().make_context(info_name, args, parent=parent, **extra)
+
+    def get_params(self, ctx: click.Context) -> List[click.Parameter]:
+        return self.load().get_params(ctx)
 
 
 def _iter_script_files(scripts_dir: Path) -> Iterator[Path]:
@@ -67,18 +140,41 @@ def _iter_script_files(scripts_dir: Path) -> Iterator[Path]:
         elif dir_item.name.endswith('.sh'):
             yield dir_item
         elif dir_item.name.endswith('.py'):
-            conf.py_import(dir_item.stem)
+            if inprocess.is_python_script(dir_item):
+                yield dir_item
+            else:
+                conf.py_import(dir_item.stem)
 
     return results
 
 
+def _script_name(script_path: Path) -> str:
+    return script_path.name.split('.')[0]
+
+
+def _parse_header(script_path: Path) -> Dict[str, Any]:
+    """ Parse only the script header, without reading the rest of the file. """
+    header_lines: List[str] = []
+
+    with script_path.open() as fp:
+        for i, line in enumerate(fp):
+            if i == 0 and line.startswith('#!'):
+                continue
+
+            m = RE_HEADER.match(line)
+            if not m or not m.group('content').strip():
+                break
+
+            header_lines.append(m.group('content'))
+
+    return _load_header(script_path, header_lines)
+
+
 def _parse_script(script_path: Path) -> types.Script:
     """ Parse a script file.
 
     The file starts wit the file header.
     """
-    script_name = script_path.name.split('.')[0]
-    re_header = re.compile(r'^# (?P<content>.*)')
     header_lines: List[str] = []
     source_lines: List[str] = []
     header_ended = False
@@ -96,7 +192,7 @@ def _parse_script(script_path: Path) -> types.Script:
             # Only the top lines are considered header, once it ends we won't
             # search for it anymore.
             if not header_ended:
-                m = re_header.match(line)
+                m = RE_HEADER.match(line)
                 if m:
                     content = m.group('content')
                     # An empty comment line also ends the header
@@ -111,17 +207,13 @@ def _parse_script(script_path: Path) -> types.Script:
 
             source_lines.append(line.rstrip())
 
-    # Check if we have the script header.
-    header_yaml = '\n'.join(header_lines)
-    if not header_yaml:
-        raise NoScript(f"peltak header is missing from file: {script_path}")
+    script_options = _load_header(script_path, header_lines)
 
-    # Load the header yaml and make sure it's a peltak script configuration.
-    header: Dict[str, Any] = cast(Dict[str, Any], util.yaml_load(header_yaml))
-    if len(header) == 1 and 'peltak' in header:
-        script_options = header['peltak']
-    else:
-        script_options = header
+    if script_path.suffix == '.py':
+        return types.Script.from_config(
+            name=_script_name(script_path),
+            script_conf={**script_options, 'python_file': str(script_path)},
+        )
 
     script_src = _inject_builtins(
         script_conf=script_options,
@@ -129,7 +221,7 @@ def _parse_script(script_path: Path) -> types.Script:
     )
 
     return types.Script.from_config(
-        name=script_name,
+        name=_script_name(script_path),
         script_conf={
             **script_options,
             'command': script_src,
@@ -137,26 +229,38 @@ def _parse_script(script_path: Path) -> types.Script:
     )
 
 
+def _load_header(script_path: Path, header_lines: List[str]) -> Dict[str, Any]:
+    # Check if we have the script header.
+    header_yaml = '\n'.join(header_lines)
+    if not header_yaml:
+        raise NoScript(f"peltak header is missing from file: {script_path}")
+
+    # Load the header yaml and make sure it's a peltak script configuration.
+    header: Dict[str, Any] = cast(Dict[str, Any], util.yaml_load(header_yaml))
+    if len(header) == 1 and 'peltak' in header:
+        return header['peltak']
+    else:
+        return header
+
+
 def _inject_builtins(script_conf: Dict[str, Any], script_src: str) -> str:
     """ Inject all built-ins the script specifies it's using. """
-    result = ''
-
-    for fn_name in script_conf.get('use', []):
-        impl = textwrap.indent(BUILTIN_FUNCTIONS.get(fn_name, ''), prefix='    ')
-        if not impl:
-            continue
-        result += f'function {fn_name}() {{{impl}}}' + '\n'
+    result = bash_builtins.render(script_conf.get('use', []))
+    if result:
+        # The script is rendered as a template, ``${#var}`` would start a
+        # jinja comment.
+        result = '{% raw %}' + result + '{% endraw %}\n'
 
     return f"### BUILTINS ###\n{result}### END BUILTINS ###\n{script_src}"
 
 
-def _register_script(script: types.Script, cli_path: List[str]):
+def _register_command(command: click.Command, cli_path: List[str]):
     parent_cli = peltak_cli
 
     for part in cli_path:
         parent_cli = _get_click_subgroup(parent_cli, part)
 
-    script.register(parent_cli)
+    parent_cli.add_command(command)
 
 
 def _get_click_subgroup(cli_group: click.Group, name: str) -> click.Group:
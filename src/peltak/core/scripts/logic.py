@@ -13,33 +13,177 @@
 # limitations under the License.
 #
 """ scripts logic. """
+import contextlib
 import dataclasses
+import functools
+import io
+import json
 import os
+import resource
+import shutil
+import signal
 import subprocess
 import sys
+import tempfile
+import threading
+import time
+from concurrent import futures
 from pathlib import Path
-from typing import Optional
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
 import yaml
 
-from peltak.core import conf, fs, log, shell, templates
+from peltak.core import conf, exc, fs, jobserver, log, shell, templates, util
 from peltak.core.context import RunContext
 
+from . import history as run_history
+from . import inprocess, loader, result_cache, scheduler, timings
 from .types import CliOptions, Script
 
 
+class ExecNotPossible(exc.PeltakError):
+    msg = "Cannot replace peltak with the script"
+
+
 def run_script(script: Script, options: CliOptions) -> None:
-    """ Run the script with the given (command line) options. """
+    """ Run the script with the given (command line) options.
+
+    Matrix scripts are run once for every combination, one after another. Use
+    `run_scripts()` to run them in parallel.
+    """
+    pretend = RunContext().get('pretend')
+
+    if script.exec:
+        sys.exit(exec_script(script, options))
+
+    for instance in script.matrix_instances():
+        if instance.matrix_values:
+            log.info("<35>{}{}", instance.name, instance.instance_suffix)
+
+        if script.files and script.files_mode != 'all' and not script.python_file:
+            with ScriptProcesses(
+                pretend=pretend,
+                history=run_history.open_history(),
+                jobs=os.cpu_count() or 1,
+            ) as runner:
+                retcode = runner.run(instance.full_name, instance, options)
+                _print_timings(runner.timings.get(instance.full_name, []), indent=0)
+        else:
+            retcode = _exec_and_record(instance, options, pretend)
+
+        log.dbg(f"Script exited with code: <33>{retcode}")
+
+        if retcode not in script.success_exit_codes:
+            sys.exit(retcode)
+
+
+def run_scripts(
+    names: List[str],
+    jobs: int = 1,
+    use_cache: bool = True,
+    use_exec: bool = False,
+    report_file: Optional[str] = None,
+    allow_exec: bool = True,
+) -> None:
+    """ Run the given scripts and their dependencies, possibly in parallel.
+
+    The scripts are run with their default options. Output of each script is
+    prefixed with its name so the output of scripts running at the same time
+    can be told apart. Once all scripts finish (or the first one fails) a
+    timing summary is printed.
+
+    A single script with ``exec: true`` in its header (or any single script if
+    *use_exec* is **True**) replaces the peltak process once its
+    dependencies finished. See `exec_script()`.
+
+    Args:
+        names (list[str]):
+            Names of the scripts to run (path relative to ``scripts_dir``
+            without the extension).
+        jobs (int):
+            Maximum number of scripts running at the same time.
+        use_cache (bool):
+            If **False**, scripts will run even if their inputs didn't change.
+            Their results will not be recorded either.
+        use_exec (bool):
+            Replace the peltak process with the script. Only works for a
+            single script.
+        report_file (Optional[str]):
+            If given, the results of all scripts are written there as JSON.
+            Used by `peltak.core.scripts.revisions` to compare revisions.
+        allow_exec (bool):
+            If **False**, ``exec: true`` in the script header is ignored. Used
+            to run the dependencies of a script that replaces peltak, only
+            that script can do it.
+    """
+    if use_exec and len(names) != 1:
+        raise ExecNotPossible("only a single script can replace peltak")
+
+    if allow_exec and len(names) == 1:
+        script = loader.get_script(names[0])
+        if use_exec or script.exec:
+            if script.depends_on:
+                run_scripts(script.depends_on, jobs, use_cache, allow_exec=False)
+
+            sys.exit(exec_script(script, script.default_options()))
+
+    graph = scheduler.build_graph(names, loader.get_script)
+    # Scripts are compiled in worker threads. Make sure the template engine
+    # singleton is fully initialized before any of them tries to use it.
+    templates.Engine()
+
+    with ScriptProcesses(
+        pretend=RunContext().get('pretend'),
+        prefix_width=max(len(x) for x in graph) if len(graph) > 1 else 0,
+        cache=result_cache.open_result_cache() if use_cache else None,
+        history=run_history.open_history(),
+        jobs=jobs,
+    ) as runner:
+        start = time.monotonic()
+        results = scheduler.Scheduler(graph, jobs).run(runner, cancel=runner.cancel)
+        _print_summary(results, time.monotonic() - start, runner.cached, runner.timings)
+
+    if report_file is not None:
+        with open(report_file, 'w') as fp:
+            json.dump([dataclasses.asdict(r) for r in results], fp)
+
+    failed = [r for r in results if r.status == scheduler.STATUS_FAILED]
+    if failed:
+        sys.exit(failed[0].retcode or 1)
+
+
+def compile_script(
+    script: Script,
+    options: CliOptions,
+    extra_ctx: Optional[Dict[str, Any]] = None,
+) -> str:
+    """ Render the script command template with the given options.
+
+    Args:
+        script (Script):
+            The script to compile.
+        options (dict[str, Any]):
+            The script command line options.
+        extra_ctx (Optional[dict[str, Any]]):
+            Values that will be added to (or replace the ones in) the template
+            context.
+
+    Returns:
+        str: The final shell command for the script.
+    """
     template_ctx = build_template_context(script, options)
+    template_ctx.update(extra_ctx or {})
     verbose = log.get_verbosity()
-    pretend = RunContext().get('pretend')
 
     if verbose >= 3:
         log.dbg('Compiling script <35>{name}\n{script}'.format(
             name=script.name,
             script=shell.highlight(script.command, 'jinja')
         ))
-        yaml_str = yaml.dump(template_ctx, default_flow_style=False)
+        yaml_str = yaml.dump(
+            templates.materialize(template_ctx),
+            default_flow_style=False,
+        )
         log.dbg('with context:\n{}\n'.format(shell.highlight(yaml_str, 'yaml')))
 
     # Command is either specified directly in pelconf.yaml or lives in a
@@ -52,20 +196,225 @@ def run_script(script: Script, options: CliOptions) -> None:
     if not command:
         raise ValueError("Scripts must have 'command' or 'command_file' specified.")
 
-    cmd = templates.Engine().render(command, template_ctx)
-    retcode = exec_script_command(cmd, pretend)
+    return templates.Engine().render(command, template_ctx)
+
+
+def _exec_and_record(script: Script, options: CliOptions, pretend: bool) -> int:
+    """ Run the script and record the run in the script history.
+
+    Scripts run directly are the only thing running at the time, so the
+    resource usage of all peltak child processes is the resource usage of the
+    script.
+    """
+    files = templates.Lazy(lambda: select_files(script))
+    extra_ctx = {'files': files} if script.files else {}
+
+    if script.python_file:
+        cmd = _python_source(script)
+        execute = functools.partial(
+            exec_python_script, script, options, pretend, extra_ctx
+        )
+    else:
+        cmd = compile_script(script, options, extra_ctx)
+        execute = functools.partial(
+            _exec_with_timings, cmd, pretend, script_shell(script)
+        )
+
+    history = run_history.open_history()
+    if pretend or history is None:
+        return execute()
+
+    script_run = run_history.ScriptRun(
+        script=script.full_name,
+        started=time.time(),
+        cmd_hash=run_history.command_hash([cmd]),
+    )
+    in_process = bool(script.python_file)
+    before = _rusage(in_process)
+    start = time.monotonic()
+
+    retcode = execute()
+
+    cpu_time, max_rss = _rusage(in_process)
+    script_run.add_usage(cpu_time - before[0], max_rss)
+    script_run.wall_time = time.monotonic() - start
+    script_run.files = len(files) if files.evaluated else None
+    script_run.retcode = retcode
+    script_run.success = retcode in script.success_exit_codes
+    history.record(script_run)
 
-    log.dbg(f"Script exited with code: <33>{retcode}")
+    return retcode
 
-    if retcode not in script.success_exit_codes:
-        sys.exit(retcode)
 
+def _exec_with_timings(cmd: str, pretend: bool, shell_path: Optional[str]) -> int:
+    """ Run the command with `exec_script_command()` and print its timings.
+
+    The timings are reported by the script with the ``peltak_time`` built-in.
+    """
+    if pretend:
+        return exec_script_command(cmd, pretend)
+
+    with tempfile.TemporaryDirectory(prefix='peltak-') as tmp_dir:
+        timings_file = os.path.join(tmp_dir, 'timings.tsv')
+        env = script_env(timings_file, os.cpu_count() or 1)
+
+        # The process inherits the environment. Nothing else runs in the
+        # meantime, so it's safe to change it for the duration of the script.
+        prev_env = {name: os.environ.get(name) for name in env}
+        os.environ.update(env)
+        try:
+            retcode = exec_script_command(cmd, pretend, shell_path)
+        finally:
+            for name, value in prev_env.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+
+        timings = read_script_timings(timings_file)
+
+    if timings:
+        log.info("<90>{}", '-' * 80)
+        _print_timings(timings, indent=0)
+
+    return retcode
+
+
+def script_env(timings_file: str, jobs: int) -> Dict[str, str]:
+    """ Return environment variables used by the script bash built-ins.
+
+    Args:
+        timings_file (str):
+            Where ``peltak_time`` writes the timings (``$PELTAK_TIMINGS``).
+        jobs (int):
+            Default number of jobs for ``peltak_parallel`` (``$PELTAK_JOBS``).
+
+    Returns:
+        dict[str, str]: The current environment with the built-ins variables
+        added.
+    """
+    return {
+        **os.environ,
+        'PELTAK_TIMINGS': timings_file,
+        'PELTAK_JOBS': str(jobs),
+    }
 
-def exec_script_command(cmd: str, pretend: bool) -> int:
+
+def read_script_timings(path: str) -> List[Tuple[str, float]]:
+    """ Read the timings reported by the script with ``peltak_time``.
+
+    Returns:
+        list[tuple[str, float]]: ``(label, seconds)`` pairs in the order they
+        were reported.
+    """
+    if not os.path.exists(path):
+        return []
+
+    result = []
+    with open(path) as fp:
+        for line in fp:
+            label, _, micro = line.rstrip('\n').rpartition('\t')
+            if label and micro.isdigit():
+                result.append((label, int(micro) / 1_000_000))
+
+    return result
+
+
+def exec_python_script(
+    script: Script,
+    options: CliOptions,
+    pretend: bool,
+    extra_ctx: Optional[Dict[str, Any]] = None,
+) -> int:
+    """ Call the python script ``main()`` in the peltak process.
+
+    See `peltak.core.scripts.inprocess` for details.
+
+    Args:
+        script (Script):
+            The python script to run.
+        options (dict[str, Any]):
+            The script command line options.
+        pretend (bool):
+            If set, only print what would be called.
+        extra_ctx (Optional[dict[str, Any]]):
+            Values that will be added to (or replace the ones in) the script
+            context.
+
+    Returns:
+        int: The script exit code.
+    """
+    assert script.python_file is not None
+    template_ctx = build_template_context(script, options)
+    template_ctx.update(extra_ctx or {})
+    files = template_ctx.pop('files', [])
+
+    if pretend:
+        log.info(
+            "<90>{bar}<0>\n{path}<90>: <0>main(ctx, files, opts)\n<90>{bar}",
+            bar='=' * 80,
+            path=script.python_file,
+        )
+        return 0
+
+    return inprocess.call_main(
+        conf.proj_path(script.python_file),
+        templates.materialize(template_ctx),
+        list(files),
+        template_ctx['opts'],
+    )
+
+
+def exec_script(script: Script, options: CliOptions) -> int:
+    """ Replace the peltak process with the script shell.
+
+    Useful for long running scripts, like dev servers or watch loops: there is
+    no peltak process waiting for the script to finish, so the signals go
+    straight to the script and its exit code is the exit code of the command.
+    The command is rendered as usual, nothing else (history, timings summary)
+    happens after the script starts.
+
+    Only works if the command is run exactly once, so it can't be used with
+    matrix scripts, ``files_mode`` other than ``all`` and python scripts.
+
+    Returns:
+        int: Only returns (0) with ``--pretend``, after printing the command.
+
+    Raises:
+        ExecNotPossible: If the script can't replace the peltak process.
+    """
+    if script.matrix:
+        raise ExecNotPossible("matrix scripts run once for every combination")
+    if script.files_mode != 'all':
+        raise ExecNotPossible(f"files_mode: {script.files_mode} runs many commands")
+    if script.python_file:
+        raise ExecNotPossible("python scripts run inside the peltak process")
+
+    cmd = compile_script(script, options)
+    if RunContext().get('pretend'):
+        return exec_script_command(cmd, pretend=True)
+
+    shell_path = script_shell(script) or '/bin/sh'
+    log.dbg("Replacing peltak with <35>{}", shell_path)
+
+    os.environ['PELTAK_JOBS'] = str(os.cpu_count() or 1)
+    os.chdir(conf.proj_path())
+    # Anything buffered would be lost once the process image is replaced.
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os.execv(shell_path, [shell_path, '-c', cmd])
+
+
+def exec_script_command(
+    cmd: str,
+    pretend: bool,
+    shell_path: Optional[str] = None,
+) -> int:
     """ This will execute the already compiled script command.
 
     This function serves the purpose of encapsulating the low level code of
-    spawning a subprocess from the rest of the logic.
+    spawning a subprocess from the rest of the logic. The command runs in
+    *shell_path*, `default_shell()` if not given.
     """
     if not pretend:
         with conf.within_proj_dir():
@@ -76,19 +425,25 @@ def exec_script_command(cmd: str, pretend: bool) -> int:
             # different. If we just use Popen directly, everything works as
             # expected  ¯\_(ツ)_/¯
             # TODO: This possibly happens because of exit_on_error in shell.run()
-            p = subprocess.Popen(
-                cmd,
-                shell=True,
-                # Replacement shell to use
-                # TODO: This works on POSIX systems, might cause problems on windows.
-                executable=_default_shell(),
-            )
-            try:
-                p.communicate()
-                return p.returncode
-            except KeyboardInterrupt:
-                p.kill()
-                return -1
+            options: Dict[str, Any] = {}
+            if jobserver.pass_fds():
+                options['pass_fds'] = jobserver.pass_fds()
+
+            with jobserver.slot():
+                p = subprocess.Popen(
+                    cmd,
+                    shell=True,
+                    # Replacement shell to use
+                    # TODO: This works on POSIX systems, might cause problems on windows.
+                    executable=shell_path or default_shell(),
+                    **options,
+                )
+                try:
+                    p.communicate()
+                    return p.returncode
+                except KeyboardInterrupt:
+                    p.kill()
+                    return -1
     else:
         log.info(
             "<90>{bar}<0>\n{script}\n<90>{bar}",
@@ -98,11 +453,615 @@ def exec_script_command(cmd: str, pretend: bool) -> int:
         return 0
 
 
+class ScriptProcesses(object):
+    """ Runs scripts for the `scheduler.Scheduler` as separate processes.
+
+    The output of every script is read line by line and printed with the
+    script name as prefix, so output of scripts running in parallel doesn't
+    get mixed up mid-line. At most *jobs* processes are running at any time,
+    including the batches of scripts using ``files_mode: batch``.
+
+    If a result cache is given, scripts that declare their inputs are run only
+    if the command or inputs changed since the last successful run. Otherwise
+    the recorded output is replayed.
+
+    If a run history is given, every script that was actually run (not
+    replayed from the cache) is recorded in it, together with the CPU time
+    and memory used by its processes.
+    """
+    def __init__(
+        self,
+        pretend: bool = False,
+        prefix_width: int = 0,
+        cache: Optional[result_cache.ResultCache] = None,
+        history: Optional[run_history.RunHistory] = None,
+        jobs: int = 1,
+    ):
+        """
+        Args:
+            pretend (bool):
+                If set, only print the compiled commands.
+            prefix_width (int):
+                Width of the script name prefix. If 0, the output is not
+                prefixed at all.
+            cache (Optional[result_cache.ResultCache]):
+                The script result cache to use, if any.
+            history (Optional[run_history.RunHistory]):
+                The history to record the script runs in, if any.
+            jobs (int):
+                Maximum number of processes running at the same time.
+        """
+        self.pretend = pretend
+        self.prefix_width = prefix_width
+        self.cache = cache
+        self.history = history
+        self.jobs = max(1, jobs)
+        self.cached: Set[str] = set()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.jobs)
+        self._procs: Set[subprocess.Popen] = set()
+        self._python_lock = threading.Lock()
+        self._tmp_dir: Optional[tempfile.TemporaryDirectory] = None
+        self._exit_stack = contextlib.ExitStack()
+        self._timings_files: Dict[str, str] = {}
+        # Labelled timings reported by the scripts with peltak_time.
+        self.timings: Dict[str, List[Tuple[str, float]]] = {}
+        # Python scripts redirect sys.stdout while they run.
+        self._stdout = sys.stdout
+        self._cancelled = False
+
+    def __call__(self, name: str, script: Script) -> int:
+        return self.run(name, script, script.default_options())
+
+    def run(self, name: str, script: Script, options: CliOptions) -> int:
+        """ Run the script with the given options.
+
+        Returns:
+            int: The script exit code. For scripts running in batches, this is
+            the first exit code that is not in ``success_exit_codes`` or the
+            exit code of the first batch if all succeeded.
+        """
+        prefix = ''
+        if self.prefix_width:
+            prefix = shell.fmt('<35>{}<90> | <0>', name.ljust(self.prefix_width))
+
+        script_run = run_history.ScriptRun(script=script.full_name, started=time.time())
+        start = time.monotonic()
+
+        retcode = self._run(name, script, options, prefix, script_run)
+
+        timings_file = self._timings_files.get(script.full_name)
+        if timings_file is not None and os.path.exists(timings_file):
+            self.timings[name] = read_script_timings(timings_file)
+
+        # Nothing to record for scripts replayed from the cache.
+        if self.history is not None and script_run.processes:
+            script_run.wall_time = time.monotonic() - start
+            script_run.retcode = retcode
+            script_run.success = retcode in script.success_exit_codes
+            with self._lock:
+                self.history.record(script_run)
+
+        return retcode
+
+    def _run(
+        self,
+        name: str,
+        script: Script,
+        options: CliOptions,
+        prefix: str,
+        script_run: run_history.ScriptRun,
+    ) -> int:
+        if script.python_file:
+            source = _python_source(script)
+            script_run.cmd_hash = run_history.command_hash([source])
+
+            if self.pretend:
+                with self._lock:
+                    return exec_python_script(script, options, True)
+
+            return self._run_cmd(
+                name, script, source, prefix, script_run,
+                execute=functools.partial(
+                    self._call_python, script, options, prefix, script_run
+                ),
+            )
+
+        if script.files and script.files_mode == 'batch':
+            return self._run_batches(script, options, prefix, script_run)
+
+        if script.files and script.files_mode == 'argfile':
+            with tempfile.TemporaryDirectory(prefix='peltak-') as tmp_dir:
+                argfile = os.path.join(tmp_dir, 'files.txt')
+                arg_files = []
+                with open(argfile, 'w') as fp:
+                    for path in iter_script_files(script):
+                        fp.write(path + '\n')
+                        arg_files.append(path)
+
+                script_run.files = len(arg_files)
+                cmd = compile_script(script, options, {'argfile': argfile})
+                # The argfile path is random, don't let it change the hash.
+                key_cmd = cmd.replace(argfile, '{{ argfile }}')
+                script_run.cmd_hash = run_history.command_hash([key_cmd])
+                return self._run_cmd(
+                    name, script, cmd, prefix, script_run,
+                    key_cmd=key_cmd,
+                    key_files=arg_files,
+                )
+
+        files = templates.Lazy(lambda: select_files(script))
+        cmd = compile_script(script, options, {'files': files} if script.files else {})
+        script_run.cmd_hash = run_history.command_hash([cmd])
+
+        if script.files and script.files_mode == 'stdin':
+            if not self._uses_cache(script):
+                return self._run_cmd(
+                    name, script, cmd, prefix, script_run,
+                    stdin=_counted(iter_script_files(script), script_run),
+                )
+
+            # The files are part of the cache key, they can't be streamed.
+            stdin_files = list(iter_script_files(script))
+            return self._run_cmd(
+                name, script, cmd, prefix, script_run,
+                stdin=_counted(stdin_files, script_run),
+                key_files=stdin_files,
+            )
+
+        if not files.evaluated:
+            return self._run_cmd(name, script, cmd, prefix, script_run)
+
+        # Record the durations, so the files can be balanced between shards.
+        script_run.files = len(files)
+        retcode = self._run_timed(name, script, cmd, prefix, script_run, list(files))
+        timings.open_timings().save()
+        return retcode
+
+    def close(self) -> None:
+        """ Remove the temporary files used by the scripts, stop the jobserver. """
+        with self._lock:
+            if self._tmp_dir is not None:
+                self._tmp_dir.cleanup()
+                self._tmp_dir = None
+                self._timings_files.clear()
+
+        self._exit_stack.close()
+
+    def __enter__(self) -> 'ScriptProcesses':
+        # Limit the jobs started by the scripts as well, unless peltak already
+        # runs under a jobserver.
+        self._exit_stack.enter_context(jobserver.serve(self.jobs))
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def cancel(self) -> None:
+        """ Kill all scripts that are still running. """
+        with self._lock:
+            self._cancelled = True
+            for p in self._procs:
+                try:
+                    os.killpg(p.pid, signal.SIGTERM)
+                except OSError:
+                    pass
+
+    def _run_batches(
+        self,
+        script: Script,
+        options: CliOptions,
+        prefix: str,
+        script_run: run_history.ScriptRun,
+    ) -> int:
+        """ Run the script command once for every batch of files.
+
+        If durations of the files are known from previous runs, the batches
+        are balanced so they take roughly the same time. Otherwise the files
+        are streamed into batches of ``batch_size`` files as they are found.
+        """
+        file_timings = timings.open_timings()
+        durations = file_timings.get(script.full_name)
+        files = iter_script_files(script)
+        batches: Iterable[List[str]]
+
+        if durations:
+            all_files = list(files)
+            count = -(-len(all_files) // script.batch_size)
+            batches = [
+                x for x in timings.partition(all_files, count, durations) if x
+            ]
+        else:
+            batches = util.in_batches(files, script.batch_size)
+
+        commands = []
+        script_run.files = 0
+        with futures.ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            running = []
+            for i, batch in enumerate(batches):
+                cmd = compile_script(script, options, {'files': batch})
+                commands.append(cmd)
+                script_run.files += len(batch)
+                running.append(pool.submit(
+                    self._run_timed,
+                    f'{script.name}[{i}]',
+                    script,
+                    cmd,
+                    prefix,
+                    script_run,
+                    batch,
+                ))
+            retcodes = [f.result() for f in running]
+
+        script_run.cmd_hash = run_history.command_hash(commands)
+
+        file_timings.save()
+
+        return next(
+            (x for x in retcodes if x not in script.success_exit_codes),
+            retcodes[0] if retcodes else 0,
+        )
+
+    def _run_timed(
+        self,
+        name: str,
+        script: Script,
+        cmd: str,
+        prefix: str,
+        script_run: run_history.ScriptRun,
+        files: List[str],
+    ) -> int:
+        """ Run *cmd* and split its duration between *files*. """
+        start = time.monotonic()
+        retcode = self._run_cmd(name, script, cmd, prefix, script_run)
+
+        # Replayed results would record bogus durations.
+        if not self.pretend and name not in self.cached:
+            timings.open_timings().record(
+                script.full_name, files, time.monotonic() - start
+            )
+
+        return retcode
+
+    def _run_cmd(
+        self,
+        name: str,
+        script: Script,
+        cmd: str,
+        prefix: str,
+        script_run: run_history.ScriptRun,
+        stdin: Optional[Iterable[str]] = None,
+        execute: Optional[Callable[[bool], Tuple[int, bytes]]] = None,
+        key_cmd: Optional[str] = None,
+        key_files: Iterable[str] = (),
+    ) -> int:
+        """ Run a single command, using the result cache if possible.
+
+        *execute* is called with a flag telling whether the output has to be
+        captured and returns the exit code and output. By default it runs
+        *cmd* in a new process.
+
+        The result cache key is built from *key_cmd* (*cmd* if not given, it
+        must not contain random values like temp file paths) and *key_files*,
+        the files the command gets outside of its command line.
+        """
+        if execute is None:
+            execute = functools.partial(
+                self._exec,
+                cmd,
+                prefix,
+                script_run=script_run,
+                stdin=stdin,
+                shell_path=script_shell(script),
+            )
+
+        if self.pretend:
+            with self._lock:
+                return exec_script_command(cmd, True)
+
+        cache_key = None
+        if self.cache is not None and self._uses_cache(script):
+            cache_key = self.cache.key(script, key_cmd or cmd, key_files)
+            with self._lock:
+                cached = self.cache.get(cache_key, script.outputs)
+
+            if cached is not None:
+                self.cached.add(name)
+                for line in cached.output.splitlines(keepends=True):
+                    self._write(prefix + line.decode('utf-8', 'replace'))
+                return cached.retcode
+
+        retcode, output = execute(cache_key is not None)
+
+        if cache_key is not None and retcode in script.success_exit_codes:
+            with self._lock:
+                self.cache.put(   # type: ignore
+                    cache_key,
+                    result_cache.CachedResult(retcode=retcode, output=output),
+                    script.outputs,
+                )
+
+        return retcode
+
+    def _uses_cache(self, script: Script) -> bool:
+        return self.cache is not None and script.inputs is not None
+
+    def _exec(
+        self,
+        cmd: str,
+        prefix: str,
+        capture: bool,
+        script_run: run_history.ScriptRun,
+        stdin: Optional[Iterable[str]] = None,
+        shell_path: Optional[str] = None,
+    ) -> Tuple[int, bytes]:
+        env = self._script_env(script_run.script)
+
+        # The jobserver slot is shared with everything the scripts run, e.g.
+        # make or nested peltak. See `peltak.core.jobserver`.
+        with self._slots, jobserver.slot():
+            with self._lock:
+                if self._cancelled:
+                    return -1, b''
+
+                p = subprocess.Popen(
+                    cmd,
+                    shell=True,
+                    cwd=conf.proj_path(),
+                    executable=shell_path or default_shell(),
+                    stdin=subprocess.DEVNULL if stdin is None else subprocess.PIPE,
+                    env=env,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT,
+                    pass_fds=jobserver.pass_fds(),
+                    # Own process group, so cancel() kills the whole script.
+                    start_new_session=True,
+                )
+                self._procs.add(p)
+
+            if stdin is not None:
+                writer = threading.Thread(
+                    target=_write_files, args=(p, stdin), daemon=True
+                )
+                writer.start()
+
+            output: List[bytes] = []
+            try:
+                assert p.stdout is not None
+                for line in p.stdout:
+                    if capture:
+                        output.append(line)
+                    self._write(prefix + line.decode('utf-8', 'replace'))
+
+                retcode, usage = wait_process(p)
+                if usage is not None:
+                    with self._lock:
+                        script_run.add_rusage(usage)
+
+                return retcode, b''.join(output)
+            finally:
+                with self._lock:
+                    self._procs.discard(p)
+
+    def _script_env(self, script_name: str) -> Dict[str, str]:
+        """ Environment for the script process, used by the bash built-ins. """
+        with self._lock:
+            if self._tmp_dir is None:
+                self._tmp_dir = tempfile.TemporaryDirectory(prefix='peltak-')
+
+            path = self._timings_files.get(script_name)
+            if path is None:
+                path = os.path.join(
+                    self._tmp_dir.name, f'timings-{len(self._timings_files)}.tsv'
+                )
+                self._timings_files[script_name] = path
+
+        return script_env(path, self.jobs)
+
+    def _call_python(
+        self,
+        script: Script,
+        options: CliOptions,
+        prefix: str,
+        script_run: run_history.ScriptRun,
+        capture: bool,
+    ) -> Tuple[int, bytes]:
+        """ Call the python script with its output redirected to the prefixed output.
+
+        The output is redirected by replacing `sys.stdout` and `sys.stderr`, so
+        only one python script runs at a time. Output of processes started by
+        the script is not redirected.
+        """
+        files = templates.Lazy(lambda: select_files(script))
+        output: List[bytes] = []
+
+        def write_line(line: str) -> None:
+            if capture:
+                output.append(line.encode('utf-8'))
+            self._write(prefix + line)
+
+        with self._slots, self._python_lock, jobserver.slot():
+            if self._cancelled:
+                return -1, b''
+
+            writer = _LineWriter(write_line)
+            cpu_start = time.thread_time()
+            with contextlib.redirect_stdout(writer), contextlib.redirect_stderr(writer):
+                retcode = exec_python_script(
+                    script, options, False, {'files': files} if script.files else {}
+                )
+            writer.finish()
+            cpu_time = time.thread_time() - cpu_start
+
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        with self._lock:
+            script_run.add_usage(cpu_time, run_history.rss_bytes(usage.ru_maxrss))
+            if files.evaluated:
+                script_run.files = len(files)
+
+        return retcode, b''.join(output)
+
+    def _write(self, text: str) -> None:
+        with self._lock:
+            self._stdout.write(text)
+            self._stdout.flush()
+
+
+def wait_process(p: subprocess.Popen) -> Tuple[int, Optional[resource.struct_rusage]]:
+    """ Wait for the process and return its exit code and resource usage.
+
+    The usage includes all the processes started by the script shell.
+    `resource.getrusage()` can't be used as it covers all child processes,
+    including other scripts running at the same time.
+    """
+    try:
+        _, status, usage = os.wait4(p.pid, 0)
+    except ChildProcessError:
+        return p.wait(), None
+
+    if os.WIFSIGNALED(status):
+        p.returncode = -os.WTERMSIG(status)
+    else:
+        p.returncode = os.WEXITSTATUS(status)
+
+    return p.returncode, usage
+
+
+def _counted(files: Iterable[str], script_run: run_history.ScriptRun) -> Iterator[str]:
+    script_run.files = 0
+    for path in files:
+        script_run.files += 1
+        yield path
+
+
+def _rusage(include_self: bool) -> Tuple[float, int]:
+    """ Return the CPU time and peak RSS of peltak child processes.
+
+    Python scripts run in the peltak process, so for them the usage of peltak
+    itself is included as well.
+    """
+    usages = [resource.getrusage(resource.RUSAGE_CHILDREN)]
+    if include_self:
+        usages.append(resource.getrusage(resource.RUSAGE_SELF))
+
+    cpu_time = sum(x.ru_utime + x.ru_stime for x in usages)
+    max_rss = max(x.ru_maxrss for x in usages)
+    return cpu_time, run_history.rss_bytes(max_rss)
+
+
+def _python_source(script: Script) -> str:
+    assert script.python_file is not None
+    with open(conf.proj_path(script.python_file)) as fp:
+        return fp.read()
+
+
+class _LineWriter(io.TextIOBase):
+    """ File-like object that passes whatever is written to it line by line. """
+    def __init__(self, write_line: Callable[[str], None]):
+        super().__init__()
+        self._write_line = write_line
+        self._buffer = ''
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:  # type: ignore
+        lines = (self._buffer + text).split('\n')
+        self._buffer = lines.pop()
+        for line in lines:
+            self._write_line(line + '\n')
+
+        return len(text)
+
+    def finish(self) -> None:
+        """ Pass the last line, even if it's not terminated with a newline. """
+        if self._buffer:
+            self._write_line(self._buffer + '\n')
+            self._buffer = ''
+
+
+def _write_files(p: subprocess.Popen, files: Iterable[str]) -> None:
+    """ Stream the files to the process stdin, NUL separated. """
+    assert p.stdin is not None
+    try:
+        for path in files:
+            p.stdin.write(path.encode('utf-8') + b'\0')
+        p.stdin.close()
+    except (BrokenPipeError, OSError):
+        # The process exited without reading all the files.
+        pass
+
+
+def select_files(script: Script) -> List[str]:
+    """ Collect the script files.
+
+    When running a single shard (``peltak run --shard i/N``), only the files
+    belonging to that shard are returned. The shards are balanced using the
+    durations recorded in previous runs.
+    """
+    assert script.files is not None
+    return list(_shard_files(script, fs.collect_files(script.files)))
+
+
+def iter_script_files(script: Script) -> Iterable[str]:
+    """ Same as `select_files()` but streams the files if not sharding. """
+    assert script.files is not None
+    return _shard_files(script, fs.iter_files(script.files))
+
+
+def _shard_files(script: Script, files: Iterable[str]) -> Iterable[str]:
+    shard = RunContext().get('shard', None)
+    if shard is None:
+        return files
+
+    index, count = shard
+    durations = timings.open_timings().get(script.full_name)
+    return timings.partition(files, count, durations)[index - 1]
+
+
+def _print_summary(
+    results: List[scheduler.ScriptResult],
+    total: float,
+    cached: Set[str],
+    timings: Dict[str, List[Tuple[str, float]]],
+) -> None:
+    status_colors = {
+        scheduler.STATUS_OK: 32,
+        scheduler.STATUS_FAILED: 31,
+        scheduler.STATUS_CANCELLED: 33,
+        scheduler.STATUS_SKIPPED: 90,
+    }
+    width = max(len(r.name) for r in results)
+
+    log.info("<90>{}", '-' * 80)
+    for result in results:
+        duration = '' if result.retcode is None else f'{result.duration:8.2f}s'
+        log.info(
+            "<{color}>{status:10}<0> {name}  <90>{duration}{cached}",
+            color=status_colors[result.status],
+            status=result.status.upper(),
+            name=result.name.ljust(width),
+            duration=duration,
+            cached=' (cached)' if result.name in cached else '',
+        )
+        _print_timings(timings.get(result.name, []), indent=13)
+
+    log.info(
+        "<90>Total <0>{total:.2f}s<90> (scripts took {cpu:.2f}s combined)",
+        total=total,
+        cpu=sum(r.duration for r in results),
+    )
+
+
 def build_template_context(script, options):
     """ Build command template context.
 
     This will collect all the values like current configuration, command line
     options, runtime context etc. and pass it to the script template.
+
+    Values that are expensive to compute (the list of files, the script
+    definition) are wrapped in `templates.Lazy` so they are only computed if
+    the template actually uses them.
     """
     template_ctx = {
         'opts': dict(
@@ -110,22 +1069,50 @@ def build_template_context(script, options):
             pretend=RunContext().get('pretend'),
             **options
         ),
-        'script': dataclasses.asdict(script),
+        'script': templates.Lazy(lambda: dataclasses.asdict(script)),
+        'matrix': script.matrix_values,
         'conf': conf.as_dict(),
         'ctx': RunContext().values,
         'proj_path': conf.proj_path,
     }
 
     if script.files:
-        template_ctx['files'] = fs.collect_files(script.files)
+        template_ctx['files'] = templates.Lazy(lambda: select_files(script))
 
     return template_ctx
 
 
-def _default_shell() -> Optional[str]:
-    default_shell = os.environ.get('SHELL', None)
+def _print_timings(timings: List[Tuple[str, float]], indent: int) -> None:
+    if not timings:
+        return
+
+    width = max(len(label) for label, _ in timings)
+    for label, duration in timings:
+        log.info(
+            "{indent}<90>{label}  {duration:8.2f}s",
+            indent=' ' * indent,
+            label=label.ljust(width),
+            duration=duration,
+        )
+
 
-    if default_shell in (None, '/bin/sh') and Path('/bin/bash').exists():
-        default_shell = '/bin/bash'
+def default_shell() -> Optional[str]:
+    """ Return the shell used to run the scripts. Prefers bash over sh. """
+    shell_path = os.environ.get('SHELL', None)
+
+    if shell_path in (None, '/bin/sh') and Path('/bin/bash').exists():
+        shell_path = '/bin/bash'
+
+    return shell_path
+
+
+def script_shell(script: Script) -> Optional[str]:
+    """ Return the shell used to run *script*.
+
+    The built-ins listed in ``use:`` are written in bash, so those scripts
+    always run in bash, no matter what ``$SHELL`` is.
+    """
+    if script.use:
+        return shutil.which('bash') or '/bin/bash'
 
-    return default_shell
+    return default_shell()
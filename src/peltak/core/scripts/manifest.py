@@ -0,0 +1,130 @@
+# Copyright 2017-2020 Mateusz Klos
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+""" Cache of parsed script headers.
+
+Parsing the headers of all scripts in ``scripts_dir`` on every peltak run
+makes the startup time grow with the number of scripts. The manifest stores the
+parsed headers in ``<build_dir>/scripts-manifest.json`` keyed by the script path
+and only re-parses scripts that changed since (different mtime or size).
+"""
+import json
+import os
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Set
+
+from peltak.core import conf, log
+
+
+Header = Dict[str, Any]
+MANIFEST_VERSION = 1
+
+
+class ScriptManifest(object):
+    """ Persistent store of script headers.
+
+    Any errors while reading or writing the manifest are logged and ignored,
+    in the worst case the scripts will just be parsed again.
+    """
+    def __init__(self, path: Optional[str]):
+        """
+        Args:
+            path (Optional[str]):
+                Path to the manifest file. If **None**, the manifest only
+                lives in memory.
+        """
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.dirty = False
+        self._seen: Set[str] = set()
+
+        if path and os.path.exists(path):
+            try:
+                with open(path) as fp:
+                    data = json.load(fp)
+
+                if data.get('version') == MANIFEST_VERSION:
+                    self.entries = data['scripts']
+            except (OSError, ValueError, KeyError) as ex:
+                log.dbg("Failed to read script manifest {}: {}", path, ex)
+
+    @classmethod
+    def open(cls) -> 'ScriptManifest':
+        """ Open the manifest for the current project.
+
+        The manifest is stored in ``build_dir``. If it's not configured,
+        the manifest will not be persisted.
+        """
+        try:
+            build_dir = conf.get_path('build_dir', None)
+        except conf.ConfigNotInitialized:
+            build_dir = None
+
+        if build_dir is None:
+            return cls(None)
+
+        return cls(os.path.join(build_dir, 'scripts-manifest.json'))
+
+    def header(self, script_path: Path, parse: Callable[[Path], Header]) -> Header:
+        """ Return the header for the given script.
+
+        Args:
+            script_path (Path):
+                Path to the script.
+            parse (Callable[[Path], Header]):
+                Called to parse the script header if it's not cached or the
+                script changed since it was cached.
+
+        Returns:
+            dict[str, Any]: The script header.
+        """
+        key = str(script_path)
+        stat = script_path.stat()
+        self._seen.add(key)
+        entry = self.entries.get(key)
+
+        if entry and entry['mtime'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+            return entry['header']
+
+        header = parse(script_path)
+        self.entries[key] = {
+            'mtime': stat.st_mtime_ns,
+            'size': stat.st_size,
+            'header': header,
+        }
+        self.dirty = True
+        return header
+
+    def save(self) -> None:
+        """ Write the manifest to disk if anything changed.
+
+        Scripts that were not looked up since the manifest was opened no
+        longer exist and are removed from the manifest.
+        """
+        removed = set(self.entries) - self._seen
+        for key in removed:
+            del self.entries[key]
+
+        if not (self.path and (self.dirty or removed)):
+            return
+
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as fp:
+                json.dump({'version': MANIFEST_VERSION, 'scripts': self.entries}, fp)
+            os.replace(tmp_path, self.path)
+            self.dirty = False
+        except (OSError, TypeError, ValueError) as ex:
+            log.dbg("Failed to write script manifest {}: {}", self.path, ex)
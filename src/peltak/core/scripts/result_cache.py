@@ -0,0 +1,304 @@
+# Copyright 2017-2020 Mateusz Klos
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+""" Cache of script results.
+
+Scripts that declare their ``inputs:`` are only run by ``peltak run`` if the
+rendered command or any of the inputs changed since the last successful run.
+Otherwise the captured output of that run is replayed. The results are stored
+in ``<build_dir>/script-results.sqlite``.
+
+Configuration (all optional)::
+
+    scripts:
+      result_cache:
+        enabled: true
+        max_size: 52428800     # bytes
+"""
+import dataclasses
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from typing import Iterable, List, Optional
+
+from peltak.core import conf, fs, log
+
+from .types import Script
+
+
+DEFAULT_MAX_SIZE = 50 * 1024 * 1024
+READ_CHUNK_SIZE = 1024 * 1024
+
+_cache: Optional['ResultCache'] = None
+
+
+@dataclasses.dataclass
+class CachedResult:
+    """ A recorded successful script run.
+
+    Attributes:
+        retcode (int):
+            The script exit code.
+        output (bytes):
+            Everything the script printed (stdout and stderr).
+    """
+    retcode: int
+    output: bytes
+
+
+@dataclasses.dataclass
+class ResultCacheStats:
+    """ Script result cache statistics.
+
+    Attributes:
+        path (str):
+            Path to the cache database.
+        entries (int):
+            Number of results stored in the cache.
+        size (int):
+            Total size of the stored output in bytes.
+        max_size (int):
+            The maximum size of stored output before the least recently used
+            results are evicted.
+    """
+    path: str
+    entries: int
+    size: int
+    max_size: int
+
+
+class ResultCache(object):
+    """ SQLite backed store of script results keyed by a hash of their inputs.
+
+    All errors are logged and swallowed, a broken cache should never break
+    the scripts using it. In that case it just behaves as if it was empty.
+    """
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS results (
+            key TEXT PRIMARY KEY,
+            retcode INTEGER NOT NULL,
+            output BLOB NOT NULL,
+            outputs TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            last_used REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS results_last_used ON results(last_used);
+    '''
+
+    def __init__(self, path: str, max_size: int = DEFAULT_MAX_SIZE):
+        self.path = path
+        self.max_size = max_size
+        self._db: Optional[sqlite3.Connection] = None
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        """ Lazily opened database connection. """
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            # The scripts are run from worker threads. All access goes through
+            # ScriptProcesses which serializes it.
+            self._db = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            self._db.executescript(self.SCHEMA)
+
+        return self._db
+
+    def close(self) -> None:
+        """ Close the database connection. """
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def key(self, script: Script, cmd: str, files: Iterable[str] = ()) -> str:
+        """ Return the cache key for running *cmd* for the given script.
+
+        The key is a hash of the rendered command, the contents of all input
+        files, the values of the input env variables and config values and
+        the list of outputs. *files* are the files passed to the command
+        outside of the command line (in an argfile or on stdin).
+        """
+        digest = hashlib.sha256()
+
+        def add(*parts: str) -> None:
+            for part in parts:
+                digest.update(part.encode('utf-8'))
+                digest.update(b'\0')
+
+        add('cmd', cmd)
+        add('files', *files)
+        add('outputs', *script.outputs)
+
+        inputs = script.inputs
+        if inputs is not None:
+            if inputs.files is not None:
+                proj_path = conf.proj_path()
+                for path in sorted(fs.collect_files(inputs.files)):
+                    add('file', os.path.relpath(path, proj_path), _file_hash(path))
+
+            for name in inputs.env:
+                add('env', name, json.dumps(os.environ.get(name)))
+
+            for name in inputs.conf:
+                add('conf', name, json.dumps(conf.get(name, None), default=str))
+
+        return digest.hexdigest()
+
+    def get(self, key: str, outputs: List[str]) -> Optional[CachedResult]:
+        """ Return the recorded result or **None** on a miss.
+
+        A result is only returned if all the script outputs are still exactly
+        as they were left by the recorded run.
+        """
+        try:
+            row = self.db.execute(
+                'SELECT retcode, output, outputs FROM results WHERE key = ?',
+                (key,),
+            ).fetchone()
+
+            if row is None or row[2] != _outputs_fingerprint(outputs):
+                return None
+
+            self.db.execute(
+                'UPDATE results SET last_used = ? WHERE key = ?',
+                (time.time(), key),
+            )
+            self.db.commit()
+            return CachedResult(retcode=row[0], output=row[1])
+        except sqlite3.Error as ex:
+            log.dbg("Script result cache read failed: {}", ex)
+            return None
+
+    def put(self, key: str, result: CachedResult, outputs: List[str]) -> None:
+        """ Record a successful script run.
+
+        If this makes the cache exceed its maximum size, the least recently
+        used results will be evicted.
+        """
+        try:
+            self.db.execute(
+                'INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)',
+                (
+                    key,
+                    result.retcode,
+                    result.output,
+                    _outputs_fingerprint(outputs),
+                    len(result.output),
+                    time.time(),
+                ),
+            )
+            self._evict()
+            self.db.commit()
+        except sqlite3.Error as ex:
+            log.dbg("Script result cache write failed: {}", ex)
+
+    def stats(self) -> ResultCacheStats:
+        """ Return cache statistics. """
+        entries, size = 0, 0
+        if os.path.exists(self.path):
+            entries, size = self.db.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results'
+            ).fetchone()
+
+        return ResultCacheStats(
+            path=self.path,
+            entries=entries,
+            size=size,
+            max_size=self.max_size,
+        )
+
+    def clear(self) -> None:
+        """ Remove all results from the cache. """
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def _evict(self) -> None:
+        total = self.db.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM results'
+        ).fetchone()[0]
+
+        if total <= self.max_size:
+            return
+
+        rows = self.db.execute(
+            'SELECT key, size FROM results ORDER BY last_used ASC'
+        ).fetchall()
+
+        evicted = []
+        for key, size in rows:
+            if total <= self.max_size:
+                break
+            evicted.append((key,))
+            total -= size
+
+        self.db.executemany('DELETE FROM results WHERE key = ?', evicted)
+
+
+def open_result_cache() -> Optional[ResultCache]:
+    """ Return the script result cache for the project.
+
+    Returns:
+        Optional[ResultCache]: The result cache or **None** if it's disabled
+        or ``build_dir`` is not configured.
+    """
+    global _cache
+
+    if _cache is not None:
+        return _cache
+
+    if not conf.get('scripts.result_cache.enabled', True):
+        return None
+
+    build_dir = conf.get_path('build_dir', None)
+    if build_dir is None:
+        return None
+
+    _cache = ResultCache(
+        os.path.join(build_dir, 'script-results.sqlite'),
+        max_size=conf.get('scripts.result_cache.max_size', DEFAULT_MAX_SIZE),
+    )
+    return _cache
+
+
+def _file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fp:
+        for chunk in iter(lambda: fp.read(READ_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _outputs_fingerprint(outputs: List[str]) -> str:
+    """ Describe the current state of the outputs (make style, by mtime). """
+    entries = []
+
+    for output in outputs:
+        path = conf.proj_path(output)
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    entries.append(_stat_entry(os.path.join(root, name)))
+        else:
+            entries.append(_stat_entry(path))
+
+    return json.dumps(sorted(entries))
+
+
+def _stat_entry(path: str) -> List:
+    try:
+        stat = os.stat(path)
+        return [path, stat.st_size, stat.st_mtime_ns]
+    except OSError:
+        return [path, None, None]
@@ -0,0 +1,218 @@
+# Copyright 2017-2020 Mateusz Klos
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+""" Run scripts against other revisions of the project.
+
+``peltak run --at main,HEAD bench`` checks out every revision in a worktree
+from `peltak.core.git.worktree.WorktreePool` and runs ``peltak run bench``
+there, all revisions at the same time. The working copy is not touched. Each
+revision uses its own config and scripts, as they were at that revision, and
+its own ``build_dir`` inside the worktree.
+
+The output of every revision is prefixed with the revision name and once all
+of them finish, the results are shown side by side::
+
+    ----------------------------------------------------------------------
+                main                HEAD
+    bench       OK         12.31s   OK          9.87s
+    lint        OK          1.20s   FAILED      1.05s
+"""
+import dataclasses
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent import futures
+from typing import List
+
+from peltak.core import jobserver, log, shell
+from peltak.core.context import RunContext
+from peltak.core.git import worktree
+
+from . import scheduler
+
+
+# Runs the same peltak the current process is using.
+PELTAK_CMD = [
+    sys.executable, '-c', 'from peltak.main import peltak_cli; peltak_cli()'
+]
+
+
+@dataclasses.dataclass
+class RevisionResult:
+    """ Result of running the scripts at a single revision.
+
+    Attributes:
+        rev (str):
+            The revision as given by the user.
+        sha (str):
+            The commit the revision pointed to.
+        retcode (int):
+            Exit code of ``peltak run`` in the revision worktree.
+        duration (float):
+            How long it took to run all scripts, in seconds.
+        scripts (list[scheduler.ScriptResult]):
+            Results of the individual scripts. Empty if ``peltak run`` failed
+            before running any of them (e.g. unknown script at that revision).
+    """
+    rev: str
+    sha: str
+    retcode: int
+    duration: float
+    scripts: List[scheduler.ScriptResult] = dataclasses.field(default_factory=list)
+
+
+def run_at_revisions(
+    names: List[str],
+    revs: List[str],
+    jobs: int = 1,
+    use_cache: bool = True,
+) -> None:
+    """ Run the scripts at every revision, at the same time.
+
+    Args:
+        names (list[str]):
+            Names of the scripts to run, as in `logic.run_scripts()`.
+        revs (list[str]):
+            Revisions to run the scripts at, anything ``git rev-parse``
+            understands.
+        jobs (int):
+            Maximum number of scripts running at the same time, for every
+            revision.
+        use_cache (bool):
+            If **False**, scripts will run even if their inputs didn't change.
+    """
+    pool = worktree.get_pool()
+    # Fail early, before anything is checked out.
+    shas = [pool.resolve(rev) for rev in revs]
+
+    peltak_args = ['run', '-j', str(jobs)] + ([] if use_cache else ['--no-cache'])
+
+    if RunContext().get('pretend'):
+        for rev, sha in zip(revs, shas):
+            log.info("<35>{} <90>({})<0>: peltak {}", rev, sha[:8], ' '.join(
+                peltak_args + names
+            ))
+        return
+
+    runner = _RevisionRunner(pool, prefix_width=max(len(x) for x in revs))
+    # Every revision runs up to *jobs* scripts, all of them share the slots.
+    with jobserver.serve(jobs * len(revs)), \
+            futures.ThreadPoolExecutor(len(revs)) as executor:
+        results = list(executor.map(
+            lambda rev, sha: runner.run(rev, sha, peltak_args + names),
+            revs,
+            shas,
+        ))
+
+    print_comparison(results)
+
+    failed = next((r for r in results if r.retcode != 0), None)
+    if failed is not None:
+        sys.exit(failed.retcode)
+
+
+def print_comparison(results: List[RevisionResult]) -> None:
+    """ Print the results of all scripts at all revisions side by side. """
+    status_colors = {
+        scheduler.STATUS_OK: 32,
+        scheduler.STATUS_FAILED: 31,
+        scheduler.STATUS_CANCELLED: 33,
+        scheduler.STATUS_SKIPPED: 90,
+    }
+    names: List[str] = []
+    for result in results:
+        names += [s.name for s in result.scripts if s.name not in names]
+
+    name_width = max([len(x) for x in names + ['total']])
+    col_width = max([len(r.rev) for r in results] + [18])
+
+    log.info("<90>{}", '-' * 80)
+    log.info("{}  <35>{}", ' ' * name_width, '  '.join(
+        r.rev.ljust(col_width) for r in results
+    ))
+
+    for name in names:
+        cells = []
+        for result in results:
+            script = next((s for s in result.scripts if s.name == name), None)
+            if script is None:
+                cells.append(shell.fmt('<90>{}<0>', '-'.ljust(col_width)))
+            else:
+                cells.append(shell.fmt(
+                    '<{}>{:10}<0>{:>{}}',
+                    status_colors[script.status],
+                    script.status.upper(),
+                    '' if script.retcode is None else f'{script.duration:.2f}s',
+                    col_width - 10,
+                ))
+
+        log.info("{}  {}", name.ljust(name_width), '  '.join(cells))
+
+    log.info("<90>{}  {}", 'total'.ljust(name_width), '  '.join(
+        '{:10}{:>{}}'.format(
+            f'exit {r.retcode}', f'{r.duration:.2f}s', col_width - 10
+        ) for r in results
+    ))
+
+
+class _RevisionRunner(object):
+    def __init__(self, pool: worktree.WorktreePool, prefix_width: int) -> None:
+        self.pool = pool
+        self.prefix_width = prefix_width
+        self._lock = threading.Lock()
+
+    def run(self, rev: str, sha: str, peltak_args: List[str]) -> RevisionResult:
+        prefix = shell.fmt('<35>{}<90> | <0>', rev.ljust(self.prefix_width))
+
+        with self.pool.checkout(sha) as path, jobserver.slot(), \
+                tempfile.TemporaryDirectory(prefix='peltak-') as tmp_dir:
+            report_file = os.path.join(tmp_dir, 'report.json')
+            start = time.monotonic()
+            p = subprocess.Popen(
+                PELTAK_CMD + peltak_args + ['--report', report_file],
+                cwd=path,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                pass_fds=jobserver.pass_fds(),
+            )
+            assert p.stdout is not None
+            for line in p.stdout:
+                self._write(prefix + line.decode('utf-8', 'replace'))
+
+            retcode = p.wait()
+            return RevisionResult(
+                rev=rev,
+                sha=sha,
+                retcode=retcode,
+                duration=time.monotonic() - start,
+                scripts=_read_report(report_file),
+            )
+
+    def _write(self, text: str) -> None:
+        with self._lock:
+            sys.stdout.write(text)
+            sys.stdout.flush()
+
+
+def _read_report(path: str) -> List[scheduler.ScriptResult]:
+    if not os.path.exists(path):
+        return []
+
+    with open(path) as fp:
+        return [scheduler.ScriptResult(**x) for x in json.load(fp)]
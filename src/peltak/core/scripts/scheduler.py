@@ -0,0 +1,223 @@
+# Copyright 2017-2020 Mateusz Klos
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+""" Run scripts and their dependencies in parallel.
+
+Scripts can declare other scripts they depend on with ``depends_on``. The
+scheduler builds a graph of all the scripts requested and their (transitive)
+dependencies and runs every script as soon as all of its dependencies finished
+successfully, with at most *jobs* scripts running at the same time.
+
+If any of the scripts fails, no new scripts are started and the ones that are
+still running are cancelled (fail fast).
+"""
+import dataclasses
+import threading
+import time
+from concurrent import futures
+from typing import Callable, Dict, List, Optional, Set
+
+from peltak.core import exc, log
+
+from .types import Script
+
+
+ScriptRunner = Callable[[str, Script], int]
+
+STATUS_OK = 'ok'
+STATUS_FAILED = 'failed'
+STATUS_CANCELLED = 'cancelled'
+STATUS_SKIPPED = 'skipped'
+
+
+class DependencyCycle(exc.PeltakError):
+    msg = "Dependency Cycle"
+
+
+@dataclasses.dataclass
+class ScriptResult:
+    """ The outcome of a single script run.
+
+    Attributes:
+        name (str):
+            The script name.
+        status (str):
+            One of ``ok``, ``failed``, ``cancelled`` (killed because another
+            script failed) or ``skipped`` (never started).
+        retcode (Optional[int]):
+            The script exit code or **None** if it was never started.
+        duration (float):
+            How long the script was running, in seconds.
+    """
+    name: str
+    status: str
+    retcode: Optional[int] = None
+    duration: float = 0.0
+
+
+def build_graph(
+    names: List[str],
+    get_script: Callable[[str], Script],
+) -> Dict[str, Script]:
+    """ Collect the given scripts and all their dependencies.
+
+    Scripts with a ``matrix`` are expanded into one node per matrix
+    combination, named like ``test[python=3.8,db=pg]``. Depending on a matrix
+    script means depending on all of its instances.
+
+    Args:
+        names (list[str]):
+            Names of the scripts to run.
+        get_script (Callable[[str], Script]):
+            Called to load a script by name.
+
+    Returns:
+        dict[str, Script]: All scripts that need to run, by name. Dependencies
+        come before the scripts that depend on them. The ``depends_on`` of
+        every script in the graph lists the names of graph nodes.
+
+    Raises:
+        DependencyCycle: If the scripts depend on each other in a cycle.
+    """
+    graph: Dict[str, Script] = {}
+    instances: Dict[str, List[str]] = {}
+    visiting: List[str] = []
+
+    def visit(name: str) -> None:
+        if name in instances:
+            return
+
+        if name in visiting:
+            cycle = visiting[visiting.index(name):] + [name]
+            raise DependencyCycle(' -> '.join(cycle))
+
+        visiting.append(name)
+        script = get_script(name)
+        for dep in script.depends_on:
+            visit(dep)
+        visiting.pop()
+
+        depends_on = [x for dep in script.depends_on for x in instances[dep]]
+        instances[name] = []
+        for instance in script.matrix_instances():
+            node_name = name + instance.instance_suffix
+            graph[node_name] = dataclasses.replace(instance, depends_on=depends_on)
+            instances[name].append(node_name)
+
+    for name in names:
+        visit(name)
+
+    return graph
+
+
+class Scheduler(object):
+    """ Runs a graph of scripts on a bounded pool of worker threads.
+
+    The scheduler only decides what runs when. Running a single script is done
+    by the *runner* passed to `Scheduler.run()`.
+    """
+    def __init__(self, graph: Dict[str, Script], jobs: int = 1):
+        """
+        Args:
+            graph (dict[str, Script]):
+                The scripts to run, as returned by `build_graph()`.
+            jobs (int):
+                How many scripts can run at the same time.
+        """
+        self.graph = graph
+        self.jobs = max(1, jobs)
+        self.cancelled = threading.Event()
+
+    def run(
+        self,
+        runner: ScriptRunner,
+        cancel: Optional[Callable[[], None]] = None,
+    ) -> List[ScriptResult]:
+        """ Run all the scripts.
+
+        Args:
+            runner (Callable[[str, Script], int]):
+                Runs a single script and returns its exit code. Called from
+                the worker threads.
+            cancel (Callable[[], None]):
+                Called once when a script fails, should stop all the scripts
+                that are still running.
+
+        Returns:
+            list[ScriptResult]: Results for all the scripts in the graph, in
+            the order they finished. Scripts that were never started come
+            last.
+        """
+        results: Dict[str, ScriptResult] = {}
+        done: Set[str] = set()
+        running: Dict[futures.Future, str] = {}
+        pending = list(self.graph)
+
+        with futures.ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            while pending or running:
+                if not self.cancelled.is_set():
+                    for name in self._ready(pending, done, len(running)):
+                        pending.remove(name)
+                        running[pool.submit(self._run_one, runner, name)] = name
+
+                if not running:
+                    break
+
+                finished, _ = futures.wait(
+                    running, return_when=futures.FIRST_COMPLETED
+                )
+                for future in finished:
+                    name = running.pop(future)
+                    result = future.result()
+                    results[name] = result
+
+                    if result.status == STATUS_OK:
+                        done.add(name)
+                    elif not self.cancelled.is_set():
+                        self.cancelled.set()
+                        if cancel is not None:
+                            cancel()
+
+        for name in pending:
+            results[name] = ScriptResult(name=name, status=STATUS_SKIPPED)
+
+        return list(results.values())
+
+    def _ready(self, pending: List[str], done: Set[str], running: int) -> List[str]:
+        ready = [
+            name for name in pending
+            if all(dep in done for dep in self.graph[name].depends_on)
+        ]
+        return ready[:self.jobs - running]
+
+    def _run_one(self, runner: ScriptRunner, name: str) -> ScriptResult:
+        script = self.graph[name]
+        start = time.monotonic()
+
+        try:
+            retcode = runner(name, script)
+        except Exception as ex:   # pylint: disable=broad-except
+            log.err("Script <35>{}<31> failed: {}", name, ex)
+            retcode = -1
+
+        duration = time.monotonic() - start
+
+        if retcode in script.success_exit_codes:
+            status = STATUS_OK
+        elif self.cancelled.is_set():
+            status = STATUS_CANCELLED
+        else:
+            status = STATUS_FAILED
+
+        return ScriptResult(name=name, status=status, retcode=retcode, duration=duration)
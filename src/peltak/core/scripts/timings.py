@@ -0,0 +1,170 @@
+# Copyright 2017-2020 Mateusz Klos
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+""" Per file durations of script runs, used to balance work between shards.
+
+Scripts running with ``files_mode: batch`` record how long every batch took.
+The time is split evenly between the files in the batch (so with
+``batch_size: 1`` the durations are exact). Next runs use those durations to
+split the files into shards and batches that take roughly the same time,
+instead of having the same number of files.
+
+The durations are stored in ``<build_dir>/script-timings.json``. Different
+location can be configured with::
+
+    scripts:
+      timings_file: ops/script-timings.json
+"""
+import heapq
+import json
+import os
+import threading
+from typing import Dict, Iterable, List, Optional
+
+from peltak.core import conf, log
+
+
+Durations = Dict[str, float]
+# How much weight the latest measurement has compared to the history.
+SMOOTHING = 0.5
+
+_timings: Optional['FileTimings'] = None
+
+
+class FileTimings(object):
+    """ Persistent store of per file durations for every script.
+
+    Files are stored relative to *root* so the timings can be shared between
+    machines that have the project checked out in different places.
+    """
+    def __init__(self, path: Optional[str], root: str = ''):
+        """
+        Args:
+            path (Optional[str]):
+                Path to the JSON file with timings. If **None**, the timings
+                are only kept in memory.
+            root (str):
+                The directory the files are stored relative to. By default the
+                paths are stored as given.
+        """
+        self.path = path
+        self.root = root
+        self.scripts: Dict[str, Durations] = {}
+        self._lock = threading.Lock()
+
+        if path and os.path.exists(path):
+            try:
+                with open(path) as fp:
+                    self.scripts = json.load(fp)
+            except (OSError, ValueError) as ex:
+                log.dbg("Failed to read script timings {}: {}", path, ex)
+
+    def get(self, script: str) -> Durations:
+        """ Return the recorded per file durations for the given script. """
+        durations = self.scripts.get(script, {})
+        if not self.root:
+            return durations
+
+        return {os.path.join(self.root, p): d for p, d in durations.items()}
+
+    def record(self, script: str, files: List[str], duration: float) -> None:
+        """ Record a run of *script* over *files* that took *duration* seconds.
+
+        The duration is split evenly between all the files and smoothed with
+        the previously recorded values.
+        """
+        if not files:
+            return
+
+        per_file = duration / len(files)
+        with self._lock:
+            durations = self.scripts.setdefault(script, {})
+            for path in files:
+                if self.root:
+                    path = os.path.relpath(path, self.root)
+
+                prev = durations.get(path)
+                durations[path] = per_file if prev is None else (
+                    SMOOTHING * per_file + (1 - SMOOTHING) * prev
+                )
+
+    def save(self) -> None:
+        """ Write the timings to disk. """
+        if not self.path:
+            return
+
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = self.path + '.tmp'
+            with self._lock, open(tmp_path, 'w') as fp:
+                json.dump(self.scripts, fp, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.path)
+        except OSError as ex:
+            log.dbg("Failed to write script timings {}: {}", self.path, ex)
+
+
+def open_timings() -> FileTimings:
+    """ Return the file timings for the current project. """
+    global _timings
+
+    if _timings is None:
+        path = conf.get_path('scripts.timings_file', None)
+        if path is None:
+            build_dir = conf.get_path('build_dir', None)
+            if build_dir is not None:
+                path = os.path.join(build_dir, 'script-timings.json')
+
+        _timings = FileTimings(path, root=conf.proj_path())
+
+    return _timings
+
+
+def partition(files: Iterable[str], count: int, durations: Durations) -> List[List[str]]:
+    """ Split files into *count* groups that take roughly the same time.
+
+    Uses the longest-processing-time-first heuristic: files are assigned from
+    the slowest to the fastest, always to the group with the lowest total.
+    Files without a recorded duration are assumed to take the average time.
+    The result only depends on the arguments, so every CI job computes the
+    same partition as long as they all use the same timings.
+
+    >>> partition(['a', 'b', 'c', 'd'], 2, {'a': 4, 'b': 3, 'c': 2, 'd': 1})
+    [['a', 'd'], ['b', 'c']]
+
+    Args:
+        files (Iterable[str]):
+            The files to split.
+        count (int):
+            The number of groups.
+        durations (dict[str, float]):
+            Known durations per file.
+
+    Returns:
+        list[list[str]]: Exactly *count* groups. Files in every group are
+        sorted.
+    """
+    default = sum(durations.values()) / len(durations) if durations else 1.0
+    weighted = sorted(
+        ((durations.get(path, default), path) for path in files),
+        key=lambda x: (-x[0], x[1]),
+    )
+
+    groups: List[List[str]] = [[] for _ in range(count)]
+    heap = [(0.0, i) for i in range(count)]
+    for duration, path in weighted:
+        total, i = heapq.heappop(heap)
+        groups[i].append(path)
+        heapq.heappush(heap, (total + duration, i))
+
+    return [sorted(group) for group in groups]
@@ -14,6 +14,7 @@
 #
 """ Types and classes used by ``peltak.extra.scripts``. """
 import dataclasses
+import itertools
 from typing import Any, Callable, Dict, List, Optional, Type, cast
 
 from peltak.cli import click, pretend_option, verbose_option
@@ -23,6 +24,14 @@ from peltak.core import types
 AnyFn = Callable[..., Any]
 YamlConf = Dict[str, Any]
 CliOptions = Dict[str, Any]
+# How the collected files are passed to the script:
+# - all: ``{{ files }}`` holds all the files, the command is run once.
+# - batch: the command is run once for every ``batch_size`` files, with
+#   ``{{ files }}`` holding only the files in the batch.
+# - argfile: ``{{ argfile }}`` is a path to a file listing all the files, one
+#   per line.
+# - stdin: all files are written to the command stdin, separated with NUL.
+FILES_MODES = ('all', 'batch', 'argfile', 'stdin')
 
 
 @dataclasses.dataclass
@@ -73,6 +82,43 @@ class ScriptOption:
         )
 
 
+@dataclasses.dataclass
+class ScriptInputs:
+    """ Everything a script result depends on, apart from its command.
+
+    If a script declares its inputs, `peltak run` will only run it if the
+    command or any of the inputs changed since the last successful run.
+    Otherwise the output of the previous run is replayed.
+
+    Attributes:
+        files (Optional[types.FilesCollection]):
+            Files the script reads. Same as the script ``files:`` section.
+        env (list[str]):
+            Names of environment variables that affect the script.
+        conf (list[str]):
+            Config values (as in ``conf.get()``) that affect the script.
+    """
+    files: Optional[types.FilesCollection] = None
+    env: List[str] = dataclasses.field(default_factory=list)
+    conf: List[str] = dataclasses.field(default_factory=list)
+
+    @classmethod
+    def from_config(cls, inputs_conf: YamlConf) -> 'ScriptInputs':
+        """ Load script inputs from the script ``inputs:`` section. """
+        files = None
+        if 'files' in inputs_conf:
+            files = types.FilesCollection.from_config(inputs_conf['files'])
+
+        env = inputs_conf.get('env', [])
+        conf_keys = inputs_conf.get('conf', [])
+
+        return cls(
+            files=files,
+            env=[env] if isinstance(env, str) else env,
+            conf=[conf_keys] if isinstance(conf_keys, str) else conf_keys,
+        )
+
+
 @dataclasses.dataclass
 class Script:
     """ Represents a single script defined in pelconf.yaml.
@@ -85,13 +131,32 @@ class Script:
     name: str
     command: str
     command_file: Optional[str] = None
+    # Python script whose main() is called in-process instead of a command.
+    python_file: Optional[str] = None
     about: str = ''
     root_cli: bool = False
     success_exit_codes: List[int] = dataclasses.field(default_factory=lambda: [0])
     options: List[ScriptOption] = dataclasses.field(default_factory=list)
     files: Optional[types.FilesCollection] = None
+    # How the files are passed to the command, one of FILES_MODES.
+    files_mode: str = 'all'
+    # Number of files passed to every command invocation in 'batch' mode.
+    batch_size: int = 500
     # Script can use any (or none) of the peltak provided helpers.
     use: List[str] = dataclasses.field(default_factory=list)
+    # Scripts that have to finish successfully before this one can run.
+    depends_on: List[str] = dataclasses.field(default_factory=list)
+    # If inputs are given, the script results are cached. See `ScriptInputs`.
+    inputs: Optional[ScriptInputs] = None
+    # Files and directories generated by the script.
+    outputs: List[str] = dataclasses.field(default_factory=list)
+    # Parameter grid, the script is run once for every combination of values.
+    matrix: Dict[str, List[Any]] = dataclasses.field(default_factory=dict)
+    # Values for a single matrix combination, available as ``{{ matrix }}``.
+    matrix_values: Dict[str, Any] = dataclasses.field(default_factory=dict)
+    # Replace the peltak process with the script shell instead of running it
+    # as a child process. See `peltak.core.scripts.logic.exec_script()`.
+    exec: bool = False
 
     @classmethod
     def from_config(cls, name: str, script_conf: YamlConf) -> 'Script':
@@ -114,10 +179,34 @@ class Script:
         if isinstance(success_exit_codes, int):
             success_exit_codes = [success_exit_codes]
 
-        # Cannot have a script without a 'command' or `command_file`.
-        if 'command' not in script_conf and 'command_file' not in script_conf:
+        depends_on = script_conf.get('depends_on', [])
+        if isinstance(depends_on, str):
+            depends_on = [depends_on]
+
+        inputs = None
+        if 'inputs' in script_conf:
+            inputs = ScriptInputs.from_config(script_conf['inputs'])
+
+        outputs = script_conf.get('outputs', [])
+        if isinstance(outputs, str):
+            outputs = [outputs]
+
+        files_mode = script_conf.get('files_mode', fields['files_mode'].default)
+        if files_mode not in FILES_MODES:
+            raise ValueError("Unsupported files_mode '{}' for script '{}'".format(
+                files_mode, name
+            ))
+
+        matrix = {
+            name: values if isinstance(values, list) else [values]
+            for name, values in script_conf.get('matrix', {}).items()
+        }
+
+        # Cannot have a script without a 'command', `command_file` or
+        # `python_file`.
+        if not {'command', 'command_file', 'python_file'} & set(script_conf):
             raise ValueError(
-                "'command' or 'command_file' must be specified "
+                "'command', 'command_file' or 'python_file' must be specified "
                 "for script '{}'".format(name)
             )
 
@@ -125,19 +214,97 @@ class Script:
             name=name,
             command=script_conf.get('command', ''),
             command_file=script_conf.get('command_file', ''),
+            python_file=script_conf.get('python_file'),
             about=script_conf.get('about', fields['about'].default),
             root_cli=script_conf.get('root_cli', fields['root_cli'].default),
             success_exit_codes=success_exit_codes,
             options=[ScriptOption.from_config(opt_conf) for opt_conf in options],
             files=files,
-            use=script_conf.get('use', [])
+            files_mode=files_mode,
+            batch_size=script_conf.get('batch_size', fields['batch_size'].default),
+            use=script_conf.get('use', []),
+            depends_on=depends_on,
+            inputs=inputs,
+            outputs=outputs,
+            matrix=matrix,
+            exec=script_conf.get('exec', fields['exec'].default),
         )
 
+    def matrix_instances(self) -> List['Script']:
+        """ Return a copy of the script for every matrix combination.
+
+        A script without a matrix has only one instance - itself.
+
+        >>> script = Script.from_config('test', {
+        ...     'command': 'tox -e py{{ matrix.python }}',
+        ...     'matrix': {'python': ['38', '39'], 'db': ['sqlite', 'pg']},
+        ... })
+        >>> for instance in script.matrix_instances():
+        ...     print(instance.matrix_values)
+        {'python': '38', 'db': 'sqlite'}
+        {'python': '38', 'db': 'pg'}
+        {'python': '39', 'db': 'sqlite'}
+        {'python': '39', 'db': 'pg'}
+        """
+        if not self.matrix:
+            return [self]
+
+        names = list(self.matrix)
+        return [
+            dataclasses.replace(self, matrix_values=dict(zip(names, values)))
+            for values in itertools.product(*self.matrix.values())
+        ]
+
+    @property
+    def full_name(self) -> str:
+        """ Script name including the matrix values, e.g. ``test[python=3.8]``. """
+        return self.name + self.instance_suffix
+
+    @property
+    def instance_suffix(self) -> str:
+        """ Describes the matrix combination, for example ``[python=38,db=pg]``. """
+        if not self.matrix_values:
+            return ''
+
+        return '[{}]'.format(','.join(
+            f'{name}={value}' for name, value in self.matrix_values.items()
+        ))
+
     def register(self, cli_group: Any):
         """ Register the script with click.
 
         *cli_group* is the result of using the ``@click.group()`` decorator.
         """
+        cli_group.command(self.name)(self._make_command_fn())
+
+    def make_command(self) -> click.Command:
+        """ Create a standalone click command for the script. """
+        return click.command(self.name)(self._make_command_fn())
+
+    def default_options(self) -> CliOptions:
+        """ Return the script options as if it was called without any. """
+        return self.parse_options([])
+
+    def parse_options(self, args: List[str]) -> CliOptions:
+        """ Return the script options as if it was called with *args*.
+
+        >>> script = Script.from_config('test', {
+        ...     'command': 'pytest',
+        ...     'options': [{'name': '--db', 'default': 'sqlite'}],
+        ... })
+        >>> script.parse_options(['--db', 'pg'])
+        {'db': 'pg'}
+        """
+        def options_only(**options):  # pylint: disable=missing-docstring
+            pass  # nocov
+
+        for option in self.options:
+            options_only = self._add_option(options_only, option)
+
+        cmd = click.command(self.name)(options_only)
+        return cmd.make_context(self.name, list(args)).params
+
+    def _make_command_fn(self) -> AnyFn:
         @verbose_option
         @pretend_option
         @click.pass_context
@@ -151,7 +318,7 @@ class Script:
         for option in self.options:
             script_command = self._add_option(script_command, option)
 
-        cli_group.command(self.name)(script_command)
+        return script_command
 
     def _add_option(self, cmd_fn: AnyFn, option: ScriptOption) -> AnyFn:
         return click.option(
@@ -16,14 +16,20 @@
 .. module:: peltak.core.shell
     :synopsis: Shell related helpers.
 """
+import atexit
 import dataclasses
 import os
 import re
+import selectors
+import shlex
 import subprocess
 import sys
-from typing import Any, Dict, Optional
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple, cast
 
-from . import context
+from . import context, exc, jobserver
 
 
 EnvDict = Dict[str, str]
@@ -58,6 +64,8 @@ class ExecResult:
 
 
 is_tty = sys.stdout.isatty()
+_session: Optional['ShellSession'] = None
+_generation = 0
 
 
 def decolorize(text: str) -> str:
@@ -139,13 +147,30 @@ def run(cmd: str,
     if context.get('verbose', 0) > 2:
         cprint('<90>{}', cmd)
 
-    options: Dict[str, Any] = {
-        'shell': shell
-    }
+    if not never_pretend:
+        # Any command that is not read-only might change the repo state.
+        _bump_generation()
 
     if exit_on_error is None:
         exit_on_error = not capture
 
+    if _session is not None and shell and capture:
+        # Only captured commands can go through the persistent session. The
+        # others might need the terminal (prompts, editors, progress bars).
+        retcode, stdout, stderr = _session.exec(cmd, env=env)
+
+        if exit_on_error and retcode != 0:
+            sys.exit(retcode)
+
+        return ExecResult(cmd, retcode, stdout, stderr, retcode == 0, retcode != 0)
+
+    options: Dict[str, Any] = {
+        'shell': shell,
+    }
+
+    if jobserver.pass_fds():
+        options['pass_fds'] = jobserver.pass_fds()
+
     if capture:
         options.update({
             'stdout': subprocess.PIPE,
@@ -156,6 +181,16 @@ def run(cmd: str,
         options['env'] = dict(os.environ)
         options['env'].update(env)
 
+    # Commands started by peltak count towards the jobserver limit too.
+    with jobserver.slot():
+        return _run_process(cmd, options, exit_on_error)
+
+
+def _run_process(
+    cmd: str,
+    options: Dict[str, Any],
+    exit_on_error: bool,
+) -> ExecResult:
     p = subprocess.Popen(cmd, **options)
 
     try:
@@ -188,6 +223,284 @@ def run(cmd: str,
         raise
 
 
+def generation() -> int:
+    """ Return a counter incremented every time a command might change state.
+
+    Commands executed with ``never_pretend=True`` are read-only and do not
+    increment the counter. Use it as a `util.memoize` token to invalidate
+    results that depend on things a shell command could have changed.
+    """
+    return _generation
+
+
+def _bump_generation() -> None:
+    global _generation
+    _generation += 1
+
+
+class CommandFailed(exc.PeltakError):
+    msg = "Command failed"
+
+
+def iter_records(
+    cmd: str,
+    sep: str = '\0',
+    cwd: Optional[str] = None,
+    check: bool = True,
+) -> Iterator[str]:
+    """ Run a command and lazily yield its output split into records.
+
+    This is meant for read-only commands that can produce a lot of output (like
+    ``git log``). The output is streamed, so the caller can start processing
+    the records before the command finishes and only one record is kept in
+    memory at a time. Since the command is not supposed to modify anything it
+    will be executed even in pretend mode.
+
+    The trailing separator is optional, an empty record after the last
+    separator is not yielded. If the generator is closed before it's exhausted,
+    the command will be killed.
+
+    Once all the output is read, a failed command raises `CommandFailed`, so
+    an error is not mistaken for an empty output.
+
+    Args:
+        cmd (str):
+            The shell command to execute.
+        sep (str):
+            Record separator. Defaults to NUL which is what git uses with ``-z``.
+        cwd (str):
+            The directory the command will be executed in. Defaults to the
+            current working directory.
+        check (bool):
+            If set to **False**, the command exit code is ignored.
+
+    Returns:
+        Iterator[str]: Records read from the command stdout.
+
+    Raises:
+        CommandFailed: If *check* is **True** and the command exits with
+            a non-zero code.
+    """
+    if context.get('verbose', 0) > 2:
+        cprint('<90>{}', cmd)
+
+    bsep = sep.encode('utf-8')
+    p = subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE, cwd=cwd)
+
+    try:
+        pending = b''
+        for chunk in iter(lambda: p.stdout.read1(65536), b''):   # type: ignore
+            *records, pending = (pending + chunk).split(bsep)
+            for record in records:
+                yield record.decode('utf-8')
+
+        if pending:
+            yield pending.decode('utf-8')
+
+        if p.wait() != 0 and check:
+            raise CommandFailed(f"'{cmd}' exited with code {p.returncode}")
+    finally:
+        if p.poll() is None:
+            p.kill()
+            p.wait()
+
+        p.stdout.close()    # type: ignore
+
+
+class ShellSession(object):
+    """ A persistent bash coprocess used to run many short commands.
+
+    Every command is written to the coprocess stdin followed by a sentinel that
+    marks the end of its output on both stdout and stderr. This allows
+    reading back the exit code and output of each command separately while
+    paying the cost of spawning the shell only once. Each command runs in
+    a subshell, in the current working directory and with the current
+    ``os.environ`` so it behaves the same way it would with `run()`.
+
+    If the coprocess dies (killed by a command for example) it will be
+    restarted on the next call to `ShellSession.exec()`.
+
+    You usually don't want to use this class directly, use
+    `persistent_session()` instead.
+    """
+    def __init__(self, executable: str = '/bin/bash'):
+        self.executable = executable
+        self.proc: Optional[subprocess.Popen] = None
+        self.sentinel = ''
+        self._env: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def alive(self) -> bool:
+        """ **True** if the coprocess is running. """
+        return self.proc is not None and self.proc.poll() is None
+
+    def start(self) -> None:
+        """ Start the coprocess. Will restart it if it's already running. """
+        self.close()
+        self.sentinel = '__peltak_{}__'.format(uuid.uuid4().hex)
+        self._env = dict(os.environ)
+        self.proc = subprocess.Popen(
+            [self.executable, '--noprofile', '--norc'],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env=self._env,
+        )
+
+    def close(self) -> None:
+        """ Stop the coprocess if it's running. """
+        proc, self.proc = self.proc, None
+
+        if proc is None:
+            return
+
+        if proc.poll() is None:
+            try:
+                proc.stdin.close()      # type: ignore
+                proc.wait(timeout=1)
+            except (OSError, subprocess.TimeoutExpired):
+                proc.kill()
+                proc.wait()
+
+        proc.stdout.close()     # type: ignore
+        proc.stderr.close()     # type: ignore
+
+    def exec(self, cmd: str, env: Optional[EnvDict] = None) -> Tuple[int, str, str]:
+        """ Execute a command in the coprocess.
+
+        Args:
+            cmd (str):
+                The shell command to execute.
+            env (dict[str, str]):
+                Extra environment variables for this command only.
+
+        Returns:
+            tuple[int, str, str]: The exit code, stdout and stderr of the
+            executed command.
+        """
+        with self._lock:
+            if not self.alive:
+                self.start()
+
+            try:
+                self.proc.stdin.write(self._frame(cmd, env))   # type: ignore
+                self.proc.stdin.flush()     # type: ignore
+            except BrokenPipeError:
+                self.start()
+                self.proc.stdin.write(self._frame(cmd, env))   # type: ignore
+                self.proc.stdin.flush()     # type: ignore
+
+            return self._read_result()
+
+    def _frame(self, cmd: str, env: Optional[EnvDict]) -> bytes:
+        environ = dict(os.environ)
+        environ.update(env or {})
+
+        lines = ['cd -- {} && ('.format(shlex.quote(os.getcwd()))]
+        lines += [
+            'unset {}'.format(name) for name in self._env if name not in environ
+        ]
+        lines += [
+            'export {}={}'.format(name, shlex.quote(value))
+            for name, value in environ.items()
+            if self._env.get(name) != value
+        ]
+        lines += [
+            'eval {}'.format(shlex.quote(cmd)),
+            ') </dev/null',
+            "printf '\\n%s %d\\n' {0} $?".format(self.sentinel),
+            "printf '\\n%s\\n' {0} >&2".format(self.sentinel),
+            '',
+        ]
+        return '\n'.join(lines).encode('utf-8')
+
+    def _read_result(self) -> Tuple[int, str, str]:
+        proc = cast(subprocess.Popen, self.proc)
+        marker = '\n{}'.format(self.sentinel).encode('utf-8')
+        re_rc = re.compile(re.escape(marker) + rb' (-?\d+)\n$')
+        buffers = {'stdout': bytearray(), 'stderr': bytearray()}
+        retcode: Optional[int] = None
+
+        assert proc.stdout is not None and proc.stderr is not None
+        with selectors.DefaultSelector() as sel:
+            sel.register(proc.stdout, selectors.EVENT_READ, 'stdout')
+            sel.register(proc.stderr, selectors.EVENT_READ, 'stderr')
+
+            while sel.get_map():
+                for key, _ in sel.select():
+                    chunk = os.read(key.fd, 65536)
+                    buf = buffers[key.data]
+
+                    if not chunk:
+                        # The coprocess died before finishing the command.
+                        sel.unregister(key.fileobj)
+                        continue
+
+                    buf += chunk
+                    if key.data == 'stdout':
+                        m = re_rc.search(buf)
+                        if m:
+                            retcode = int(m.group(1))
+                            del buf[m.start():]
+                            sel.unregister(key.fileobj)
+                    elif buf.endswith(marker + b'\n'):
+                        del buf[-len(marker) - 1:]
+                        sel.unregister(key.fileobj)
+
+        if retcode is None:
+            self.close()
+            retcode = proc.returncode or -1
+
+        return (
+            retcode,
+            buffers['stdout'].decode('utf-8'),
+            buffers['stderr'].decode('utf-8'),
+        )
+
+
+@contextmanager
+def persistent_session() -> Iterator[Optional[ShellSession]]:
+    """ Run captured shell commands through a persistent bash coprocess.
+
+    Inside this context manager, all `run()` calls with ``capture=True`` are
+    executed by a single long-lived bash process instead of spawning a new
+    shell for every command. This makes a big difference for code that runs
+    dozens of short commands (like querying git). The pretend and verbose
+    behaviour of `run()` stays exactly the same. Commands that are not
+    captured still spawn a new process as they might need the terminal.
+
+    Nesting is allowed, only the outermost context manager owns the session.
+    If bash is not available, this does nothing.
+
+    Example:
+
+        >>> from peltak.core import shell
+        >>>
+        >>> with shell.persistent_session():
+        ...     shell.run('echo hello', capture=True).stdout
+        'hello\\n'
+    """
+    global _session
+
+    if _session is not None or not os.path.exists('/bin/bash'):
+        yield _session
+        return
+
+    _session = ShellSession()
+    try:
+        yield _session
+    finally:
+        session, _session = _session, None
+        session.close()
+
+
+@atexit.register
+def _close_session() -> None:
+    if _session is not None:
+        _session.close()
+
+
 def highlight(code: str, fmt: str) -> str:
     """ Highlight a given code snippet for printing in the terminal.
 
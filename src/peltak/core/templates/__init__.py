@@ -70,6 +70,12 @@ Peltak will inject the following context into the template.
  ``script``         | The script configuration as read from `pelconf.yaml`.
                     | This will only contain the configuration for the currently
                     | running script, not the entire **scripts:** section.
+ ``matrix``         | Values of the current matrix combination for scripts that
+                    | define a ``matrix:``. Empty for all other scripts.
+ ``files``          | Files collected with the script ``files:`` section. With
+                    | ``files_mode: batch`` only the files in the current batch.
+ ``argfile``        | Path to a file listing all the collected files, one per
+                    | line. Only with ``files_mode: argfile``.
  ``ctx``            | Current runtime context. This is a value store that exists
                     | only when peltak is running and is recreated on every run.
                     | This is a way to share runtime information between commands
@@ -88,5 +94,11 @@ Dev Reference
 .. autoclass:: peltak.core.templates.Engine
     :members:
 
+.. autoclass:: peltak.core.templates.Lazy
+    :members:
+
+.. autofunction:: peltak.core.templates.materialize
+
 """
 from .engine import Engine  # noqa: F401
+from .lazy import Lazy, materialize  # noqa: F401
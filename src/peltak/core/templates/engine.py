@@ -13,16 +13,25 @@
 # limitations under the License.
 #
 """ Engine wraps the jinja2 environment and exposes it to the rest of the code. """
+import hashlib
+import os
+import threading
+from collections import OrderedDict
 from typing import Any, Dict, Optional
 
 import jinja2
 
-from peltak.core import util
+from peltak.core import conf, log, util
 
 from . import filters
 
 
 TemplateCtx = Dict[str, Any]
+# Prefix for the names of templates rendered from strings. The rest of the name
+# is the SHA1 of the template source.
+STRING_PREFIX = 'string:'
+# How many compiled templates are kept in memory.
+CACHE_SIZE = 400
 
 
 class Engine(util.Singleton):
@@ -45,11 +54,15 @@ class Engine(util.Singleton):
     >>> Engine() is Engine()
     True
 
+    Templates are compiled only once and kept in memory. If ``build_dir`` is
+    configured, the compiled bytecode is also stored in ``<build_dir>/jinja``
+    so the following peltak runs don't have to compile them at all.
     """
     def __init__(self):
         if not self._singleton_initialized:
+            self._sources: 'OrderedDict[str, str]' = OrderedDict()
+            self._sources_lock = threading.Lock()
             self.env = self._make_env()
-            pass
 
     def render(
         self,
@@ -58,6 +71,9 @@ class Engine(util.Singleton):
     ) -> str:
         """ Render a script template using the given context.
 
+        The template is loaded by the SHA1 of its source so rendering the same
+        template again will reuse the already compiled one.
+
         Examples:
 
             >>> from peltak.core.templates import Engine
@@ -66,7 +82,16 @@ class Engine(util.Singleton):
             'HELLO'
 
         """
-        return self.env.from_string(template_str).render(template_ctx)
+        name = STRING_PREFIX + hashlib.sha1(template_str.encode('utf-8')).hexdigest()
+        # The source is only needed until jinja compiles it, so keep only as
+        # many as there are compiled templates in the jinja cache.
+        with self._sources_lock:
+            self._sources[name] = template_str
+            self._sources.move_to_end(name)
+            if len(self._sources) > CACHE_SIZE:
+                self._sources.popitem(last=False)
+
+        return self.env.get_template(name).render(template_ctx)
 
     def render_file(
         self,
@@ -143,7 +168,12 @@ class Engine(util.Singleton):
     def _make_env(self) -> jinja2.Environment:
         """ Initialize jinja2 env. """
         env = jinja2.Environment(
-            loader=jinja2.PackageLoader('peltak', 'templates'),
+            loader=jinja2.ChoiceLoader([
+                jinja2.FunctionLoader(self._load_string_template),
+                jinja2.PackageLoader('peltak', 'templates'),
+            ]),
+            bytecode_cache=self._make_bytecode_cache(),
+            cache_size=CACHE_SIZE,
             variable_start_string='{{',
             variable_end_string='}}',
             trim_blocks=True,
@@ -156,3 +186,31 @@ class Engine(util.Singleton):
         env.filters['wrap_paths'] = filters.wrap_paths_filter
 
         return env
+
+    def _load_string_template(self, name: str) -> Optional[str]:
+        """ Load source of a template previously passed to `render()`. """
+        return self._sources.get(name)
+
+    def _make_bytecode_cache(self) -> Optional[jinja2.BytecodeCache]:
+        """ Create persistent bytecode cache in the project build directory.
+
+        Returns:
+            Optional[jinja2.BytecodeCache]: The bytecode cache or **None** if
+            ``build_dir`` is not configured or can't be created.
+        """
+        try:
+            build_dir = conf.get_path('build_dir', None)
+        except conf.ConfigNotInitialized:
+            return None
+
+        if build_dir is None:
+            return None
+
+        cache_dir = os.path.join(build_dir, 'jinja')
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+        except OSError as ex:
+            log.dbg("Failed to create template cache in {}: {}", cache_dir, ex)
+            return None
+
+        return jinja2.FileSystemBytecodeCache(cache_dir)
@@ -0,0 +1,98 @@
+# Copyright 2017-2020 Mateusz Klos
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+""" Lazily evaluated template context values. """
+from typing import Any, Callable, Dict, Iterator
+
+
+_MISSING = object()
+
+
+class Lazy(object):
+    """ A proxy for a template context value that is expensive to compute.
+
+    The value is computed on first access and then cached. Anything the
+    template does with the proxy (iterating, indexing, attribute access,
+    printing etc.) is forwarded to the computed value. This means that if the
+    template never uses the value, for example because it's only referenced
+    inside a branch that is not taken, it is never computed.
+
+    >>> from peltak.core.templates import Engine, Lazy
+    >>>
+    >>> files = Lazy(lambda: ['a.py', 'b.py'])
+    >>> Engine().render("{{ files | join(' ') }}", {'files': files})
+    'a.py b.py'
+
+    """
+    __slots__ = ('_factory', '_value')
+
+    def __init__(self, factory: Callable[[], Any]):
+        self._factory = factory
+        self._value = _MISSING
+
+    @property
+    def value(self) -> Any:
+        """ The proxied value. Computed on first access. """
+        if self._value is _MISSING:
+            self._value = self._factory()
+        return self._value
+
+    @property
+    def evaluated(self) -> bool:
+        """ **True** if the value was already computed. """
+        return self._value is not _MISSING
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.value, name)
+
+    def __getitem__(self, key: Any) -> Any:
+        return self.value[key]
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self.value)
+
+    def __len__(self) -> int:
+        return len(self.value)
+
+    def __contains__(self, item: Any) -> bool:
+        return item in self.value
+
+    def __bool__(self) -> bool:
+        return bool(self.value)
+
+    def __eq__(self, other: Any) -> bool:
+        return self.value == other
+
+    def __ne__(self, other: Any) -> bool:
+        return self.value != other
+
+    __hash__ = None     # type: ignore
+
+    def __str__(self) -> str:
+        return str(self.value)
+
+    def __repr__(self) -> str:
+        return repr(self.value)
+
+
+def materialize(template_ctx: Dict[str, Any]) -> Dict[str, Any]:
+    """ Return a copy of the context with all `Lazy` values computed.
+
+    Useful when the context has to be serialized, for example to dump it in
+    the logs.
+    """
+    return {
+        name: value.value if isinstance(value, Lazy) else value
+        for name, value in template_ctx.items()
+    }
@@ -16,15 +16,19 @@
 .. module:: peltak.core.util
     :synopsis: Various helpers that do not depend on anything else in the project.
 """
+import itertools
 import re
+import threading
 import time
 import warnings
+from collections import OrderedDict
 from functools import wraps
 from pprint import pformat
 from typing import (
     Any,
     Callable,
     Dict,
+    Hashable,
     Iterable,
     Iterator,
     List,
@@ -193,6 +197,92 @@ class cached_result(object):
         if hasattr(fn, cls.CACHE_VAR):
             delattr(fn, cls.CACHE_VAR)
 
+        # Also works for functions decorated with `memoize`.
+        if hasattr(fn, 'cache_clear'):
+            fn.cache_clear()
+
+
+class memoize(object):
+    """ Decorator that caches function results by their arguments.
+
+    Unlike `cached_result`, this works with functions that take arguments and
+    keeps at most *maxsize* results (least recently used are dropped first).
+
+    Each cached result is stored with the current value of all *tokens*. If any
+    of them changed since the result was cached, the function is called again.
+    This allows caching results that depend on external state, for example
+    the state of the git repository.
+
+    Args:
+        maxsize (int):
+            The maximum number of cached results.
+        tokens (Iterable[Callable[[], Hashable]]):
+            Functions returning values that identify the state the function
+            result depends on. They are called on every call so they must be
+            cheap.
+
+    Example:
+        >>> from peltak.core import util
+        >>>
+        >>> state = {'version': 1}
+        >>>
+        >>> @util.memoize(tokens=[lambda: state['version']])
+        ... def double(value):
+        ...     print('computing')
+        ...     return value * 2
+        >>> double(2)
+        computing
+        4
+        >>> double(2)
+        4
+        >>> state['version'] = 2
+        >>> double(2)
+        computing
+        4
+        >>> double(2, refresh=True)
+        computing
+        4
+    """
+    def __init__(
+        self,
+        maxsize: int = 128,
+        tokens: Iterable[Callable[[], Hashable]] = (),
+    ):
+        self.maxsize = maxsize
+        self.tokens = list(tokens)
+
+    def __call__(self, fn: AnyFunction) -> AnyFunction:
+        cache: 'OrderedDict[Hashable, Any]' = OrderedDict()
+        lock = threading.Lock()
+
+        @wraps(fn)
+        def wrapper(*args, refresh=False, **kw):   # pylint: disable=missing-docstring
+            key = (args, tuple(sorted(kw.items())))
+            token = tuple(get_token() for get_token in self.tokens)
+
+            with lock:
+                entry = cache.get(key)
+                if not refresh and entry is not None and entry[0] == token:
+                    cache.move_to_end(key)
+                    return entry[1]
+
+            result = fn(*args, **kw)
+
+            with lock:
+                cache[key] = (token, result)
+                cache.move_to_end(key)
+                while len(cache) > self.maxsize:
+                    cache.popitem(last=False)
+
+            return result
+
+        def cache_clear():   # pylint: disable=missing-docstring
+            with lock:
+                cache.clear()
+
+        wrapper.cache_clear = cache_clear   # type: ignore
+        return wrapper
+
 
 def in_batches(iterable: Iterable[Any], batch_size: int) -> Iterator[List[Any]]:
     """ Split the given iterable into batches.
@@ -206,7 +296,8 @@ def in_batches(iterable: Iterable[Any], batch_size: int) -> Iterator[List[Any]]:
 
     Returns:
         Iterator[list[Any]]: Will yield all items in batches of **batch_size**
-            size.
+            size. The items are consumed lazily, only one batch is kept in
+            memory at a time.
 
     Example:
 
@@ -220,11 +311,14 @@ def in_batches(iterable: Iterable[Any], batch_size: int) -> Iterator[List[Any]]:
         [[1, 2, 3], [4, 5, 6], [7]]
 
     """
-    items = list(iterable)
-    size = len(items)
+    iterator = iter(iterable)
+
+    while True:
+        batch = list(itertools.islice(iterator, batch_size))
+        if not batch:
+            return
 
-    for i in range(0, size, batch_size):
-        yield items[i:min(i + batch_size, size)]
+        yield batch
 
 
 def yaml_load(str_or_fp: TextOrStream) -> YamlData:
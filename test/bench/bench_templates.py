@@ -0,0 +1,101 @@
+# Copyright 2017-2020 Mateusz Klos
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+""" Benchmark rendering of large ``command_file`` script templates.
+
+Run from the project root::
+
+    $ python test/bench/bench_templates.py [--lines N] [--runs N]
+
+It compares compiling the template from scratch on every render (the old
+behaviour) with the in-memory cache (same process) and the bytecode cache in
+``build_dir`` (fresh process, simulated with a fresh `Engine` instance).
+"""
+import argparse
+import os
+import tempfile
+import time
+from unittest.mock import patch
+
+from peltak.core import util
+from peltak.core.templates import Engine
+
+
+STEP = """
+{% if opts.verbose >= 2 %}
+echo "step {{ i }}: {{ script.name | upper }}"
+{% endif %}
+{% for path in files %}
+pylint {{ opts.verbose | count_flag('v') }} {{ path }} --step={{ i }}
+{% endfor %}
+"""
+
+
+def make_template(lines: int) -> str:
+    """ Generate a ``command_file`` template with roughly *lines* lines. """
+    steps = max(1, lines // STEP.count('\n'))
+    return ''.join(STEP.replace('{{ i }}', str(i)) for i in range(steps))
+
+
+def timeit(fn, runs: int) -> float:
+    """ Return the average time of a single *fn* call in milliseconds. """
+    start = time.perf_counter()
+    for _ in range(runs):
+        fn()
+    return (time.perf_counter() - start) * 1000 / runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--lines', type=int, default=5000)
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    template = make_template(args.lines)
+    ctx = {
+        'opts': {'verbose': 2},
+        'script': {'name': 'lint'},
+        'files': ['src/a.py', 'src/b.py'],
+    }
+
+    with tempfile.TemporaryDirectory() as build_dir, \
+            patch('peltak.core.conf.get_path', return_value=build_dir):
+
+        def fresh_engine():
+            util.Singleton.instances = {}
+            return Engine()
+
+        engine = fresh_engine()
+        uncached = timeit(
+            lambda: engine.env.from_string(template).render(ctx), args.runs
+        )
+        cold = timeit(lambda: fresh_engine().render(template, ctx), 1)
+        memory = timeit(lambda: engine.render(template, ctx), args.runs)
+        bytecode = timeit(lambda: fresh_engine().render(template, ctx), args.runs)
+        size = sum(
+            os.path.getsize(os.path.join(build_dir, 'jinja', x))
+            for x in os.listdir(os.path.join(build_dir, 'jinja'))
+        )
+
+    util.Singleton.instances = {}
+
+    print(f"template: {len(template.splitlines())} lines, {len(template)} bytes")
+    print(f"compile on every render:  {uncached:8.2f} ms")
+    print(f"first render (cold):      {cold:8.2f} ms")
+    print(f"in-memory cache:          {memory:8.2f} ms")
+    print(f"bytecode cache:           {bytecode:8.2f} ms  ({size} bytes on disk)")
+
+
+if __name__ == '__main__':
+    main()
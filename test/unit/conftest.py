@@ -1,12 +1,30 @@
 # Import all fixtures
 from pathlib import Path
+from unittest.mock import Mock, patch
 
 import pytest
 
 from peltak import testing
+from peltak.core import util
+from peltak.core.git import backend
 from peltak.testing.fixtures import *  # noqa pylint: disable=wildcard-import unused-import unused-wildcard-import
 
 
 @pytest.fixture
 def unit_test_data():
     yield testing.DataLoader(Path(__file__).parent / '_data')
+
+
+@pytest.fixture(autouse=True)
+def no_commit_cache():
+    # Never write the commit cache into the repository running the tests.
+    with patch('peltak.core.git.cache.open_cache', Mock(return_value=None)):
+        yield
+
+
+@pytest.fixture(autouse=True)
+def reset_git_backend():
+    # The backend is bound to the project path, which changes between tests.
+    util.cached_result.clear(backend.get_backend)
+    yield
+    util.cached_result.clear(backend.get_backend)
@@ -0,0 +1,140 @@
+# pylint: disable=missing-docstring
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from peltak.core import git
+
+
+pytestmark = pytest.mark.skipif(
+    shutil.which('git') is None,
+    reason="requires git"
+)
+
+
+def run_git(cwd, *args) -> str:
+    return subprocess.run(
+        ['git'] + list(args),
+        cwd=str(cwd),
+        check=True,
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+    ).stdout.strip()
+
+
+@pytest.fixture(scope='module')
+def repo(tmp_path_factory):
+    path = tmp_path_factory.mktemp('catfile')
+    run_git(path, 'init', '-q')
+
+    for i in range(20):
+        (path / 'file{}.txt'.format(i)).write_text('content {}\n'.format(i) * i)
+
+    run_git(path, 'add', '-A')
+    run_git(
+        path, '-c', 'user.name=John', '-c', 'user.email=john@example.com',
+        'commit', '-q', '-m', 'Initial commit',
+    )
+    return path
+
+
+@pytest.fixture
+def pool(repo):
+    pool = git.CatFilePool(str(repo))
+    yield pool
+    pool.close()
+
+
+def test_reads_objects_by_any_name(pool, repo):
+    obj = pool.read('HEAD:file3.txt')
+
+    assert obj == git.GitObject('blob', b'content 3\n' * 3)
+    assert pool.read('HEAD').type == 'commit'
+
+
+def test_reads_empty_objects(pool):
+    assert pool.read('HEAD:file0.txt') == git.GitObject('blob', b'')
+
+
+def test_batch_check_returns_only_info(repo):
+    pool = git.CatFilePool(str(repo), mode='batch-check')
+
+    try:
+        info = pool.info('HEAD:file2.txt')
+    finally:
+        pool.close()
+
+    assert info == git.ObjectInfo(
+        run_git(repo, 'rev-parse', 'HEAD:file2.txt'),
+        'blob',
+        len('content 2\n' * 2),
+    )
+
+
+def test_raises_if_object_does_not_exist(pool):
+    with pytest.raises(git.ObjectNotFound):
+        pool.read('HEAD:does-not-exist.txt')
+
+    # The process is still usable afterwards.
+    assert pool.read('HEAD:file1.txt').data == b'content 1\n'
+
+
+def test_raises_if_object_with_spaces_in_name_does_not_exist(pool):
+    with pytest.raises(git.ObjectNotFound):
+        pool.read('HEAD:my file')
+
+    with pytest.raises(git.ObjectNotFound):
+        pool.read('HEAD:my other file.txt')
+
+    # The process is still usable.
+    assert pool.read('HEAD:file1.txt') == git.GitObject('blob', b'content 1\n')
+
+
+def test_uses_a_single_process_for_sequential_reads(pool):
+    with pool.acquire() as proc:
+        proc.request('HEAD')
+        pid = proc.proc.pid
+
+    for i in range(20):
+        pool.read('HEAD:file{}.txt'.format(i))
+
+    with pool.acquire() as proc:
+        assert proc.proc.pid == pid
+
+
+def test_restarts_dead_processes(pool):
+    with pool.acquire() as proc:
+        proc.request('HEAD')
+        proc.proc.kill()
+        proc.proc.wait()
+
+    assert pool.read('HEAD:file1.txt').data == b'content 1\n'
+
+
+def test_is_thread_safe(pool, repo):
+    names = ['HEAD:file{}.txt'.format(i % 20) for i in range(200)]
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(pool.read, names))
+
+    assert [r.data for r in results] == [
+        'content {}\n'.format(i % 20).encode() * (i % 20) for i in range(200)
+    ]
+    assert pool._count <= pool.size
+
+
+def test_close_stops_all_processes(pool):
+    with pool.acquire() as proc:
+        proc.request('HEAD')
+        popen = proc.proc
+
+    pool.close()
+
+    assert popen.poll() is not None
+
+
+def test_rejects_names_with_new_lines(pool):
+    with pytest.raises(ValueError):
+        pool.read('HEAD\nHEAD')
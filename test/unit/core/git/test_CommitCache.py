@@ -0,0 +1,129 @@
+# pylint: disable=missing-docstring
+import os
+from unittest.mock import Mock, patch
+
+import pytest
+
+from peltak.core import git
+from peltak.core.git.cache import CommitCache
+
+
+def make_commit(sha1_char: str, parents=()) -> git.CommitDetails:
+    return git.CommitDetails(
+        sha1=sha1_char * 40,
+        author=git.Author('John', 'john@example.com'),
+        title='Commit {}'.format(sha1_char),
+        desc='',
+        parents_sha1=tuple(p * 40 for p in parents),
+    )
+
+
+@pytest.fixture
+def cache(tmp_path):
+    commit_cache = CommitCache(str(tmp_path / 'peltak' / 'commits.sqlite'))
+    yield commit_cache
+    commit_cache.close()
+
+
+def test_returns_stored_commits(cache):
+    cache.put_many([make_commit('a', parents='b'), make_commit('b')])
+
+    assert cache.get('a' * 40) == make_commit('a', parents='b')
+    assert cache.get_many(['b' * 40, 'c' * 40]) == {'b' * 40: make_commit('b')}
+
+
+def test_returns_none_on_miss(cache):
+    assert cache.get('a' * 40) is None
+
+
+def test_evicts_least_recently_used_commits(cache):
+    cache.max_entries = 2
+
+    with patch('time.time', Mock(return_value=1)):
+        cache.put_many([make_commit('a'), make_commit('b')])
+
+    with patch('time.time', Mock(return_value=2)):
+        cache.get('a' * 40)
+
+    with patch('time.time', Mock(return_value=3)):
+        cache.put_many([make_commit('c')])
+
+    assert set(cache.get_many(['a' * 40, 'b' * 40, 'c' * 40])) == {
+        'a' * 40,
+        'c' * 40,
+    }
+
+
+def test_reads_do_not_write_to_the_database(cache):
+    cache.put_many([make_commit('a'), make_commit('b')])
+    changes = cache.db.total_changes
+
+    cache.get_many(['a' * 40, 'b' * 40])
+
+    assert cache.db.total_changes == changes
+
+
+def test_stores_last_use_times_on_close(cache):
+    with patch('time.time', Mock(return_value=1)):
+        cache.put_many([make_commit('a'), make_commit('b')])
+
+    cache.get('a' * 40)
+    with patch('time.time', Mock(return_value=5)):
+        cache.close()
+
+    rows = cache.db.execute('SELECT sha1, last_used FROM commits').fetchall()
+    assert dict(rows) == {'a' * 40: 5, 'b' * 40: 1}
+
+
+def test_stats(cache):
+    cache.put_many([make_commit('a'), make_commit('b')])
+
+    stats = cache.stats()
+
+    assert stats.path == cache.path
+    assert stats.entries == 2
+    assert stats.size == os.path.getsize(cache.path)
+
+
+def test_stats_of_a_broken_database(cache):
+    os.makedirs(os.path.dirname(cache.path))
+    with open(cache.path, 'w') as fp:
+        fp.write('not a database' * 100)
+
+    assert cache.stats().entries == 0
+
+
+def test_clear_removes_the_database(cache):
+    cache.put_many([make_commit('a')])
+
+    cache.clear()
+
+    assert not os.path.exists(cache.path)
+    assert cache.get('a' * 40) is None
+
+
+def test_get_many_loads_only_missing_commits(cache, app_conf):
+    cache.put_many([make_commit('a', parents='b')])
+    show_output = iter([
+        'b' * 40, 'John', 'john@example.com', 'Commit b', '', '', '',
+    ])
+    records = [iter(['a' * 40, 'b' * 40]), show_output]
+
+    with patch('peltak.core.git.cache.open_cache', Mock(return_value=cache)):
+        with patch('peltak.core.shell.iter_records', side_effect=records) as p:
+            commits = list(git.iter_commits('HEAD'))
+
+    assert commits == [make_commit('a', parents='b'), make_commit('b')]
+    assert p.call_args_list[0][0][0] == 'git rev-list HEAD --'
+    assert p.call_args_list[1][0][0].endswith(' ' + 'b' * 40)
+    assert cache.get('b' * 40) == make_commit('b')
+
+
+@patch('peltak.core.shell.run')
+def test_commit_details_get_uses_the_cache(p_run, cache, app_conf):
+    cache.put_many([make_commit('a')])
+
+    with patch('peltak.core.git.cache.open_cache', Mock(return_value=cache)):
+        assert git.CommitDetails.get('a' * 40) == make_commit('a')
+
+    p_run.assert_not_called()
@@ -0,0 +1,23 @@
+# pylint: disable=missing-docstring
+from unittest.mock import patch
+
+from peltak.core.git import types
+
+
+def make_commit(sha1, parents=''):
+    return types.CommitDetails.create(sha1, 'John', 'john@example.com', '', '', parents)
+
+
+@patch('peltak.core.git.types.CommitDetails.get')
+def test_loads_each_parent_only_once(p_get):
+    types._load_commit.cache_clear()
+    p_get.side_effect = lambda sha1: make_commit(sha1)
+    first = make_commit('c' * 40, 'a' * 40 + ' ' + 'b' * 40)
+    second = make_commit('d' * 40, 'a' * 40)
+
+    parents = first.parents
+
+    assert [x.sha1 for x in parents] == ['a' * 40, 'b' * 40]
+    assert second.parents[0] is parents[0]
+    assert p_get.call_count == 2
+    types._load_commit.cache_clear()
@@ -0,0 +1,87 @@
+# pylint: disable=missing-docstring
+from unittest.mock import Mock, patch
+
+import pytest
+
+from peltak.core import git
+
+
+#   master   develop          feature
+#      A <---- B <---- C <---- D <---- E
+#                       \                \
+#                        `---- F <------- M (merge-feature)
+ROWS = [
+    ('M', ('E', 'F')),
+    ('E', ('D',)),
+    ('F', ('C',)),
+    ('D', ('C',)),
+    ('C', ('B',)),
+    ('B', ('A',)),
+    ('A', ()),
+]
+TIPS = {
+    'master': 'A',
+    'develop': 'C',
+    'feature': 'E',
+    'merge-feature': 'M',
+}
+
+
+@pytest.fixture
+def graph():
+    return git.CommitGraph(ROWS, TIPS, head='E')
+
+
+@pytest.mark.parametrize('sha1,expected', [
+    ('A', ['develop', 'feature', 'master', 'merge-feature']),
+    ('C', ['develop', 'feature', 'merge-feature']),
+    ('D', ['feature', 'merge-feature']),
+    ('F', ['merge-feature']),
+    ('M', ['merge-feature']),
+    ('unknown', []),
+])
+def test_branches_containing(graph, sha1, expected):
+    assert graph.branches_containing(sha1) == expected
+
+
+def test_parents(graph):
+    assert graph.parents('M') == ('E', 'F')
+    assert graph.parents('A') == ()
+
+
+def test_fork_point_is_the_first_commit_shared_with_other_branch(graph):
+    assert graph.fork_point('develop') == 'C'
+    assert graph.fork_point('feature') == 'E'
+
+
+def test_fork_point_prefers_merge_parent_only_on_the_branch(graph):
+    # Following E would stop right away as it's also on 'feature'.
+    assert graph.fork_point('merge-feature') == 'C'
+
+
+def test_fork_point_is_None_if_history_is_not_shared():
+    graph = git.CommitGraph([('B', ('A',)), ('A', ())], {'master': 'B'}, 'B')
+
+    assert graph.fork_point('master') is None
+
+
+def test_resolves_branch_names_in_memory(graph):
+    with patch('peltak.core.shell.run') as p_run:
+        assert graph.resolve('develop') == 'C'
+        assert graph.resolve('M') == 'M'
+
+    p_run.assert_not_called()
+
+
+@patch('peltak.core.git.branch.current_branch', Mock(
+    return_value=git.BranchDetails.parse('feature/test')
+))
+def test_guess_base_branch_uses_the_graph(app_conf):
+    graph = git.CommitGraph(
+        [('C', ('B',)), ('B', ('A',)), ('A', ())],
+        {'develop': 'A', 'feature/test': 'C'},
+        head='C',
+    )
+
+    with patch('peltak.core.git.branch.commit_graph', Mock(return_value=graph)):
+        assert git.guess_base_branch(refresh=True) == 'develop'
@@ -0,0 +1,169 @@
+# pylint: disable=missing-docstring
+""" Conformance tests run against all git backends. """
+import shutil
+import subprocess
+
+import pytest
+
+from peltak.core import git
+from peltak.core.git.types import COMMIT_FORMAT
+
+
+pytestmark = pytest.mark.skipif(
+    shutil.which('git') is None,
+    reason="requires git"
+)
+BACKENDS = [git.CliBackend, git.NativeBackend]
+
+
+def run_git(cwd, *args, input=None) -> bytes:
+    return subprocess.run(
+        ['git'] + list(args),
+        cwd=str(cwd),
+        input=input,
+        check=True,
+        stdout=subprocess.PIPE,
+    ).stdout
+
+
+def commit(path, message: bytes, *args):
+    run_git(path, 'add', '-A')
+    run_git(path, *args, 'commit', '-q', '--cleanup=verbatim', '-F', '-', input=message)
+
+
+def make_repo(path):
+    path.mkdir()
+    run_git(path, 'init', '-q', '-b', 'master')
+    run_git(path, 'config', 'user.name', 'Zoë Ünicode')
+    run_git(path, 'config', 'user.email', 'zoe@example.com')
+
+    lines = ['line {}\n'.format(i) for i in range(2000)]
+    big = path / 'big.txt'
+
+    big.write_text(''.join(lines))
+    commit(path, b'Initial commit\n\nFirst paragraph.\n\nSecond one.\n')
+
+    for i in range(5):
+        lines[i * 100] = 'changed {}\n'.format(i)
+        big.write_text(''.join(lines))
+        commit(path, 'Change {}\n'.format(i).encode('utf-8'))
+
+    run_git(path, 'checkout', '-q', '-b', 'feature', 'HEAD~2')
+    (path / 'feature.txt').write_bytes(b'binary \x00\xff data')
+    commit(path, b'\n\n  Multi line  \nsubject \n\n\nBody\n  with spaces  \n')
+    run_git(path, 'checkout', '-q', 'master')
+    run_git(path, 'merge', '-q', '--no-ff', '-m', 'Merge feature', 'feature')
+
+    (path / 'latin.txt').write_text('latin')
+    commit(path, 'Caf\xe9\n'.encode('latin-1'), '-c', 'i18n.commitEncoding=ISO-8859-1')
+
+    run_git(path, 'tag', '-a', 'v1.0.0', '-m', 'Release 1.0.0')
+
+
+@pytest.fixture(scope='module', params=['loose', 'ofs-delta', 'ref-delta'])
+def repo_path(request, tmp_path_factory):
+    path = tmp_path_factory.mktemp('repos') / request.param
+    make_repo(path)
+
+    if request.param == 'ofs-delta':
+        run_git(path, 'repack', '-adfq', '--depth=50', '--window=50')
+    elif request.param == 'ref-delta':
+        run_git(
+            path, '-c', 'repack.useDeltaBaseOffset=false',
+            'repack', '-adfq', '--depth=50', '--window=50'
+        )
+
+    return path
+
+
+@pytest.fixture(params=BACKENDS, ids=lambda cls: cls.name)
+def backend(request, repo_path):
+    backend = request.param(str(repo_path))
+    yield backend
+    backend.close()
+
+
+def all_commits(repo_path):
+    out = run_git(
+        repo_path, 'log', '-z', '--all', '--format={}'.format(COMMIT_FORMAT)
+    ).decode('utf-8')
+    return list(git.CommitDetails._from_records(out.split('\0')))
+
+
+def test_packed_repos_contain_deltas(repo_path):
+    if repo_path.name == 'loose':
+        pytest.skip("loose objects only")
+
+    pack = next((repo_path / '.git' / 'objects' / 'pack').glob('*.idx'))
+    out = run_git(repo_path, 'verify-pack', '-v', str(pack)).decode('utf-8')
+
+    assert 'chain length = 1' in out
+
+
+def test_reads_commits_same_as_git_log(backend, repo_path):
+    expected = all_commits(repo_path)
+
+    assert backend.commits([c.sha1 for c in expected]) == expected
+
+
+def test_reads_commit_messages_like_git_pretty_formats(backend, repo_path):
+    commits = {
+        c.title: c for c in backend.commits([
+            c.sha1 for c in all_commits(repo_path)
+        ])
+    }
+
+    assert commits['Initial commit'].desc == 'First paragraph.\n\nSecond one.\n'
+    assert commits['  Multi line subject'].desc == 'Body\n  with spaces  \n'
+    assert commits['Initial commit'].author == git.Author(
+        'Zoë Ünicode', 'zoe@example.com'
+    )
+    assert 'Café' in commits
+    assert len(commits['Merge feature'].parents_sha1) == 2
+
+
+def test_reads_blobs(backend, repo_path):
+    for name in ('big.txt', 'feature.txt'):
+        sha1 = run_git(repo_path, 'rev-parse', 'feature:' + name).decode().strip()
+        expected = run_git(repo_path, 'cat-file', 'blob', sha1)
+
+        assert backend.blob(sha1) == expected
+
+
+def test_reads_trees_and_tags(backend, repo_path):
+    tree = run_git(repo_path, 'rev-parse', 'HEAD^{tree}').decode().strip()
+    tag = run_git(repo_path, 'rev-parse', 'v1.0.0').decode().strip()
+
+    tree_obj = backend.read_object(tree)
+    tag_obj = backend.read_object(tag)
+
+    assert tree_obj.type == 'tree'
+    assert tree_obj.data == run_git(repo_path, 'cat-file', 'tree', tree)
+    assert tag_obj.type == 'tag'
+    assert tag_obj.data.startswith(b'object ')
+
+
+def test_reads_object_info(backend, repo_path):
+    sha1 = run_git(repo_path, 'rev-parse', 'master:big.txt').decode().strip()
+
+    info = backend.object_info(sha1)
+
+    assert info == git.ObjectInfo(sha1, 'blob', len(backend.blob(sha1)))
+
+
+def test_raises_if_object_does_not_exist(backend):
+    with pytest.raises(git.ObjectNotFound):
+        backend.read_object('0' * 40)
+
+    with pytest.raises(git.ObjectNotFound):
+        backend.object_info('0' * 40)
+
+    with pytest.raises(git.ObjectNotFound):
+        backend.commits(['0' * 40])
+
+
+def test_raises_if_object_has_a_different_type(backend, repo_path):
+    tree = run_git(repo_path, 'rev-parse', 'HEAD^{tree}').decode().strip()
+
+    with pytest.raises(git.ObjectNotFound):
+        backend.blob(tree)
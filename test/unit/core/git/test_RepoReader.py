@@ -0,0 +1,153 @@
+# pylint: disable=missing-docstring
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from peltak.core.git import repo
+from peltak.core.git.repo import RepoReader
+
+
+pytestmark = pytest.mark.skipif(
+    shutil.which('git') is None,
+    reason="requires git"
+)
+
+
+def git(cwd, *args) -> str:
+    return subprocess.run(
+        ['git'] + list(args),
+        cwd=str(cwd),
+        check=True,
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+    ).stdout
+
+
+@pytest.fixture
+def git_repo(tmp_path, monkeypatch):
+    home = tmp_path / 'home'
+    home.mkdir()
+    monkeypatch.setenv('HOME', str(home))
+    monkeypatch.setenv('XDG_CONFIG_HOME', str(home / '.config'))
+    monkeypatch.setenv('GIT_CONFIG_NOSYSTEM', '1')
+
+    path = tmp_path / 'repo'
+    path.mkdir()
+    git(path, 'init', '-q', '-b', 'master')
+    git(path, 'config', 'user.name', 'John')
+    git(path, 'config', 'user.email', 'john@example.com')
+    git(path, 'commit', '-q', '--allow-empty', '-m', 'Initial commit')
+
+    for branch in ('develop', 'feature/one', 'feature/two'):
+        git(path, 'branch', branch)
+
+    for tag in ('v1.0.0', 'v1.10.0', 'v1.2.0', 'v1.2.0-rc1', 'v0.9'):
+        git(path, 'tag', tag)
+
+    monkeypatch.chdir(path)
+    return path
+
+
+def test_branches_match_git(git_repo):
+    expected = [x.strip('* ') for x in git(git_repo, 'branch').splitlines()]
+
+    assert RepoReader.discover(str(git_repo)).branches() == expected
+
+
+def test_tags_match_git(git_repo):
+    expected = git(git_repo, 'tag', '--sort=v:refname').splitlines()
+
+    assert RepoReader.discover(str(git_repo)).tags() == expected
+
+
+def test_reads_packed_refs(git_repo):
+    git(git_repo, 'pack-refs', '--all')
+    git(git_repo, 'branch', 'loose')
+
+    reader = RepoReader.discover(str(git_repo))
+
+    assert reader.branches() == [
+        'develop', 'feature/one', 'feature/two', 'loose', 'master'
+    ]
+    assert reader.tags()[-1] == 'v1.10.0'
+
+
+def test_current_branch(git_repo):
+    git(git_repo, 'checkout', '-q', 'feature/one')
+
+    assert RepoReader.discover(str(git_repo / 'sub' / '..')).current_branch() == (
+        'feature/one'
+    )
+
+
+def test_detached_head_is_left_to_git(git_repo):
+    git(git_repo, 'checkout', '-q', '--detach')
+
+    with pytest.raises(repo.Unsupported):
+        RepoReader.discover(str(git_repo)).current_branch()
+
+
+def test_discovers_repo_from_subdirectory(git_repo):
+    subdir = git_repo / 'a' / 'b'
+    subdir.mkdir(parents=True)
+
+    reader = RepoReader.discover(str(subdir))
+
+    assert reader.git_dir == str(git_repo / '.git')
+
+
+def test_follows_linked_worktrees(git_repo, tmp_path):
+    worktree = tmp_path / 'worktree'
+    git(git_repo, 'worktree', 'add', '-q', str(worktree), 'develop')
+
+    reader = RepoReader.discover(str(worktree))
+
+    assert reader.common_dir == str(git_repo / '.git')
+    assert reader.current_branch() == 'develop'
+    assert 'master' in reader.branches()
+
+
+def test_config_matches_git(git_repo):
+    home = os.environ['HOME']
+    with open(os.path.join(home, '.gitconfig'), 'w') as fp:
+        fp.write('[user]\n\tname = Global User\n[include]\n\tpath = extra.cfg\n')
+    with open(os.path.join(home, 'extra.cfg'), 'w') as fp:
+        fp.write('[alias]\n\tlg = "log --oneline" # comment\n')
+
+    git(git_repo, 'config', 'remote.origin.url', 'git@example.com:repo.git')
+    git(git_repo, 'config', 'user.name', 'Local User')
+
+    expected = dict(
+        line.split('=', 1)
+        for line in git(git_repo, 'config', '--list').splitlines()
+    )
+
+    assert RepoReader.discover(str(git_repo)).config() == expected
+
+
+def test_conditional_includes_are_left_to_git(git_repo):
+    git(git_repo, 'config', 'includeIf.gitdir:~/work/.path', 'work.cfg')
+
+    with pytest.raises(repo.Unsupported):
+        RepoReader.discover(str(git_repo)).config()
+
+
+def test_versionsort_suffix_is_left_to_git(git_repo):
+    git(git_repo, 'config', 'versionsort.suffix', '-rc')
+
+    with pytest.raises(repo.Unsupported):
+        RepoReader.discover(str(git_repo)).tags()
+
+    assert repo.read(RepoReader.tags) is None
+
+
+def test_returns_none_outside_git_repo(tmp_path):
+    assert RepoReader.discover(str(tmp_path)) is None
+
+
+def test_is_disabled_when_git_dir_is_overridden(git_repo, monkeypatch):
+    monkeypatch.setenv('GIT_DIR', str(git_repo / '.git'))
+
+    assert repo.open_reader() is None
@@ -0,0 +1,137 @@
+# pylint: disable=missing-docstring
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from peltak.core import git
+
+
+pytestmark = pytest.mark.skipif(
+    shutil.which('git') is None,
+    reason="requires git"
+)
+
+
+def run_git(cwd, *args) -> str:
+    return subprocess.run(
+        ['git'] + list(args),
+        cwd=str(cwd),
+        check=True,
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+    ).stdout.strip()
+
+
+def commit(repo, version):
+    (repo / 'version.txt').write_text(version)
+    run_git(repo, 'add', '-A')
+    run_git(
+        repo, '-c', 'user.name=John', '-c', 'user.email=john@example.com',
+        'commit', '-q', '-m', f'Version {version}',
+    )
+    return run_git(repo, 'rev-parse', 'HEAD')
+
+
+@pytest.fixture
+def repo(tmp_path):
+    path = tmp_path / 'repo'
+    path.mkdir()
+    run_git(path, 'init', '-q')
+    (path / '.gitignore').write_text('.build\nignored.txt\n')
+    commit(path, '1')
+    commit(path, '2')
+    return path
+
+
+@pytest.fixture
+def pool(repo):
+    return git.WorktreePool(str(repo), str(repo / '.build' / 'worktrees'))
+
+
+def read(path, name='version.txt'):
+    with open(f'{path}/{name}') as fp:
+        return fp.read()
+
+
+def test_checks_out_revision_without_touching_working_copy(pool, repo):
+    (repo / 'version.txt').write_text('local change')
+
+    with pool.checkout('HEAD~1') as path:
+        assert read(path) == '1'
+
+    assert read(repo) == 'local change'
+
+
+def test_resolves_revisions_to_full_sha(pool, repo):
+    assert pool.resolve('HEAD') == run_git(repo, 'rev-parse', 'HEAD')
+
+
+def test_raises_UnknownRevision_for_unknown_revisions(pool):
+    with pytest.raises(git.UnknownRevision):
+        pool.resolve('no-such-branch')
+
+
+def test_reuses_worktrees(pool):
+    with pool.checkout('HEAD~1'):
+        pass
+
+    with pool.checkout('HEAD') as path:
+        assert read(path) == '2'
+
+    assert len(pool.worktrees()) == 1
+
+
+def test_prefers_worktree_with_the_revision_checked_out(pool):
+    with pool.checkout('HEAD~1') as old, pool.checkout('HEAD') as new:
+        pass
+
+    with pool.checkout('HEAD') as path:
+        assert path == new
+
+    with pool.checkout('HEAD~1') as path:
+        assert path == old
+
+
+def test_uses_separate_worktrees_at_the_same_time(pool):
+    with pool.checkout('HEAD') as first, pool.checkout('HEAD') as second:
+        assert first != second
+        assert read(first) == read(second) == '2'
+
+
+def test_resets_local_changes_and_keeps_ignored_files(pool):
+    with pool.checkout('HEAD') as path:
+        with open(f'{path}/version.txt', 'w') as fp:
+            fp.write('modified')
+        with open(f'{path}/untracked.txt', 'w') as fp:
+            fp.write('untracked')
+        with open(f'{path}/ignored.txt', 'w') as fp:
+            fp.write('build artifact')
+
+    with pool.checkout('HEAD') as path:
+        assert read(path) == '2'
+        assert read(path, 'ignored.txt') == 'build artifact'
+        with pytest.raises(FileNotFoundError):
+            read(path, 'untracked.txt')
+
+
+def test_recreates_removed_worktrees(pool):
+    with pool.checkout('HEAD') as path:
+        pass
+
+    shutil.rmtree(pool.root)
+
+    with pool.checkout('HEAD') as path:
+        assert read(path) == '2'
+
+
+def test_checks_out_from_many_threads(pool, repo):
+    revs = ['HEAD', 'HEAD~1'] * 3
+
+    def checkout(rev):
+        with pool.checkout(rev) as path:
+            return read(path)
+
+    with ThreadPoolExecutor(len(revs)) as executor:
+        assert list(executor.map(checkout, revs)) == ['2', '1'] * 3
@@ -1,10 +1,11 @@
 # pylint: disable=missing-docstring
-from unittest.mock import patch
+from unittest.mock import Mock, patch
 
 from peltak import testing
 from peltak.core import git
 
 
+@patch('peltak.core.git.repo.open_reader', Mock(return_value=None))
 @patch('peltak.core.shell.run')
 def test_works_as_expected(p_run):
     git.current_branch().name()
@@ -18,12 +19,14 @@ def test_works_as_expected(p_run):
 @patch('peltak.core.shell.run')
 def test_runs_the_git_command_in_project_root(p_run, p_within_proj_dir):
     p_run.return_value = testing.mock_result(
-        stdout='hash||name||email||title||desc||parent'
+        stdout='hash\0name\0email\0title\0desc\0parent\0'
     )
 
     assert git.latest_commit().author == git.Author('name', 'email')
 
     p_within_proj_dir.assert_called_once_with()
-    p_run.assert_called_once_with('git show -s --format="%H||%an||%ae||%s||%b||%P" ',
-                                  capture=True,
-                                  never_pretend=True)
+    p_run.assert_called_once_with(
+        'git show -s -z --format="%H%x00%an%x00%ae%x00%s%x00%b%x00%P" ',
+        capture=True,
+        never_pretend=True,
+    )
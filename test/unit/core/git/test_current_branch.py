@@ -1,10 +1,11 @@
 # pylint: disable=missing-docstring
-from unittest.mock import patch
+from unittest.mock import Mock, patch
 
 from peltak import testing
 from peltak.core import git, util
 
 
+@patch('peltak.core.git.repo.open_reader', Mock(return_value=None))
 @patch('peltak.core.shell.run')
 def test_calls_git_cli(p_run):
     util.cached_result.clear(git.current_branch)
@@ -16,8 +17,42 @@ def test_calls_git_cli(p_run):
                                   never_pretend=True)
 
 
+@patch('peltak.core.git.repo.open_reader', Mock(return_value=None))
 @testing.patch_run(stdout='test ')
 def test_strips_output_from_git_porcelain():
     util.cached_result.clear(git.current_branch)
 
     assert git.current_branch().name == 'test'
+
+
+@patch('peltak.core.shell.run')
+def test_reads_head_without_calling_git(p_run, tmp_path, monkeypatch):
+    (tmp_path / '.git' / 'refs' / 'heads').mkdir(parents=True)
+    (tmp_path / '.git' / 'HEAD').write_text('ref: refs/heads/feature/test\n')
+    monkeypatch.chdir(tmp_path)
+    util.cached_result.clear(git.current_branch)
+
+    assert git.current_branch().name == 'feature/test'
+
+    p_run.assert_not_called()
+    util.cached_result.clear(git.current_branch)
+
+
+@patch('peltak.core.git.repo.open_reader', Mock(return_value=None))
+def test_is_refreshed_after_shell_commands(app_conf):
+    from peltak.core import shell
+
+    util.cached_result.clear(git.current_branch)
+
+    with patch('peltak.core.shell.subprocess.Popen') as p_popen:
+        p_popen.return_value.communicate.return_value = (b'master', b'')
+        p_popen.return_value.returncode = 0
+
+        git.current_branch()
+        git.current_branch()
+        assert p_popen.call_count == 1
+
+        shell.run('git checkout develop', capture=True)
+        p_popen.return_value.communicate.return_value = (b'develop', b'')
+
+        assert git.current_branch().name == 'develop'
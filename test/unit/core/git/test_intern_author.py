@@ -0,0 +1,19 @@
+# pylint: disable=missing-docstring
+from peltak.core.git import types
+
+
+def test_shares_author_instances():
+    first = types.intern_author('John', 'john@example.com')
+
+    assert types.intern_author('John', 'john@example.com') is first
+    assert first == types.Author('John', 'john@example.com')
+
+
+def test_keeps_only_recently_used_authors():
+    types.intern_author.cache_clear()
+    first = types.intern_author('John', 'john@example.com')
+
+    for i in range(types.AUTHORS_CACHE_SIZE):
+        types.intern_author(f'Author {i}', f'author{i}@example.com')
+
+    assert types.intern_author('John', 'john@example.com') is not first
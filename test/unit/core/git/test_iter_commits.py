@@ -0,0 +1,56 @@
+# pylint: disable=missing-docstring
+from unittest.mock import Mock, patch
+
+from peltak.core import git
+
+
+FAKE_LOG = [
+    'a' * 40, 'John', 'john@example.com', 'First || title', 'Body with || pipes\n',
+    'b' * 40,
+    'b' * 40, 'Jane', 'jane@example.com', 'Root commit', '', '',
+]
+
+
+@patch('peltak.core.shell.iter_records', Mock(return_value=iter(FAKE_LOG)))
+def test_parses_all_commits(app_conf):
+    commits = list(git.iter_commits('HEAD'))
+
+    assert [c.sha1 for c in commits] == ['a' * 40, 'b' * 40]
+    assert commits[0].author == git.Author('John', 'john@example.com')
+    assert commits[0].title == 'First || title'
+    assert commits[0].desc == 'Body with || pipes\n'
+    assert commits[0].parents_sha1 == ('b' * 40,)
+    assert commits[1].parents_sha1 == ()
+
+
+@patch('peltak.core.shell.iter_records')
+def test_uses_a_single_git_log_call(p_iter_records, app_conf):
+    p_iter_records.return_value = iter(FAKE_LOG)
+
+    list(git.CommitDetails.get_many('v1.0..HEAD', max_count=10))
+
+    p_iter_records.assert_called_once_with(
+        'git log -z --format="%H%x00%an%x00%ae%x00%s%x00%b%x00%P" -n 10 v1.0..HEAD --',
+        cwd=app_conf.proj_path(),
+    )
+
+
+def test_loads_commits_lazily(app_conf):
+    records = iter(FAKE_LOG)
+
+    with patch('peltak.core.shell.iter_records', Mock(return_value=records)):
+        commits = git.iter_commits()
+        next(commits)
+
+    assert next(records) == 'b' * 40
+
+
+def test_commits_are_compact_and_share_authors(app_conf):
+    log = FAKE_LOG + ['c' * 40, 'John', 'john@example.com', 'Third', '', 'a' * 40]
+
+    with patch('peltak.core.shell.iter_records', Mock(return_value=iter(log))):
+        first, _, third = git.iter_commits()
+
+    assert not hasattr(first, '__dict__')
+    assert first.author is third.author
+    assert third.parents_sha1[0] is first.sha1
@@ -0,0 +1,54 @@
+# pylint: disable=missing-docstring
+import pytest
+
+from peltak.core.git.repo import parse_config
+
+
+def test_parses_sections_and_subsections():
+    assert list(parse_config('\n'.join([
+        '[Core]',
+        '    Bare = false',
+        '[remote "Origin"]',
+        '\turl = git@example.com:repo.git',
+        '[old.Style]',
+        '\tkey = value',
+    ]))) == [
+        ('core.bare', 'false'),
+        ('remote.Origin.url', 'git@example.com:repo.git'),
+        ('old.style.key', 'value'),
+    ]
+
+
+@pytest.mark.parametrize('line,expected', [
+    ('key = value', 'value'),
+    ('key=  spaced   value  ', 'spaced   value'),
+    ('key = value # comment', 'value'),
+    ('key = value ; comment', 'value'),
+    ('key = "quoted # not a comment"', 'quoted # not a comment'),
+    ('key = "  keep spaces  "', '  keep spaces  '),
+    ('key = tab\\tand\\nnewline', 'tab\tand\nnewline'),
+    ('key = multi \\\nline', 'multi line'),
+    ('key', 'true'),
+    ('key = ', ''),
+])
+def test_parses_values(line, expected):
+    assert list(parse_config('[section]\n' + line + '\n')) == [
+        ('section.key', expected)
+    ]
+
+
+def test_skips_comments_and_blank_lines():
+    assert list(parse_config('# comment\n\n; other\n[a]\n\n  b = c\n')) == [
+        ('a.b', 'c'),
+    ]
+
+
+@pytest.mark.parametrize('text', [
+    'key = value\n',
+    '[section\nkey = value\n',
+    '[section]\nkey = "unterminated\n',
+    '[section]\nkey = invalid \\x escape\n',
+])
+def test_raises_on_invalid_config(text):
+    with pytest.raises(ValueError):
+        list(parse_config(text))
@@ -0,0 +1,76 @@
+# pylint: disable=missing-docstring
+from unittest.mock import Mock, patch
+
+from peltak import testing
+from peltak.core import git
+from peltak.core.git.status import parse_status
+
+
+HASH = 'a' * 40
+
+
+def test_parses_renames_with_their_origin():
+    snapshot = parse_status('\0'.join([
+        f'2 R. N... 100644 100644 100644 {HASH} {HASH} R100 new name.txt',
+        'old name.txt',
+        '',
+    ]))
+
+    assert snapshot.entries == [git.StatusEntry(
+        path='new name.txt',
+        index='R',
+        worktree='.',
+        orig_path='old name.txt',
+    )]
+
+
+def test_parses_submodule_flags():
+    snapshot = parse_status(
+        f'1 .M SCM. 160000 160000 160000 {HASH} {HASH} libs/sub\0'
+    )
+
+    assert snapshot.entries[0].submodule == git.SubmoduleState(
+        commit_changed=True,
+        modified=True,
+        untracked=False,
+    )
+
+
+def test_unmerged_files_are_neither_staged_nor_unstaged():
+    snapshot = parse_status(
+        f'u UU N... 100644 100644 100644 100644 {HASH} {HASH} {HASH} file.txt\0'
+    )
+
+    assert snapshot.entries[0].unmerged
+    assert snapshot.staged() == []
+    assert snapshot.unstaged() == []
+    assert snapshot.has_changes
+
+
+def test_untracked_files_are_not_changes():
+    snapshot = parse_status('? new.txt\0! ignored.txt\0')
+
+    assert snapshot.untracked() == ['new.txt']
+    assert not snapshot.has_changes
+
+
+@patch('peltak.core.git.status._status_fingerprint', Mock(return_value=(1, b'')))
+@testing.patch_run(stdout='? new.txt\0')
+def test_runs_git_status_once_until_fingerprint_changes(app_conf):
+    from peltak.core import shell
+
+    git.status_snapshot(refresh=True)
+    git.staged()
+    git.unstaged()
+    git.untracked()
+
+    shell.run.assert_called_once_with(   # type: ignore
+        'git status --porcelain=v2 -z',
+        capture=True,
+        never_pretend=True,
+    )
+
+    with patch('peltak.core.git.status._status_fingerprint', Mock(return_value=(2, b''))):
+        git.untracked()
+
+    assert shell.run.call_count == 2    # type: ignore
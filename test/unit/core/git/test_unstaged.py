@@ -0,0 +1,28 @@
+# pylint: disable=missing-docstring
+from peltak import testing
+from peltak.core import git
+
+
+FAKE_GIT_STATUS = '\0'.join([
+    '1 D. N... 100644 000000 000000 {h} {z} deleted.txt',
+    '1 .M N... 100644 100644 100644 {h} {h} unstaged.txt',
+    '1 M. N... 100644 100644 100644 {h} {h} staged_1.txt',
+    '1 M. N... 100644 100644 100644 {h} {h} staged 2.txt',
+    '2 R. N... 100644 100644 100644 {h} {h} R100 to/renamed_1.txt',
+    'from/renamed_1.txt',
+    '2 RM N... 100644 100644 100644 {h} {h} R90 to/renamed_and_modified.txt',
+    'from/renamed_and_modified.txt',
+    'u UU N... 100644 100644 100644 100644 {h} {h} {h} conflict.txt',
+    '? untracked_1.txt',
+    '? untracked "2".txt',
+    '! ignored.txt',
+    '',
+]).format(h='a' * 40, z='0' * 40)
+
+
+@testing.patch_run(stdout=FAKE_GIT_STATUS)
+def test_returns_unstaged_files_properly(app_conf):
+    assert frozenset(git.unstaged(refresh=True)) == frozenset([
+        'unstaged.txt',
+        'to/renamed_and_modified.txt',
+    ])
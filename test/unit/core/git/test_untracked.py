@@ -3,27 +3,26 @@ from peltak import testing
 from peltak.core import git
 
 
-FAKE_GIT_STATUS = '\n'.join([
-    'D  deleted.txt',
-    ' M unstaged.txt',
-    'M  staged.txt',
-    'R  from/renamed_1.txt -> to/renamed_1.txt',
-    'R  from/renamed_2.txt -> to/renamed_2.txt',
-    'RM from/renamed_and_modified_1.txt -> to/renamed_and_modified_1.txt',
-    'RM from/renamed_and_modified_2.txt -> to/renamed_and_modified_2.txt',
-    'RM from/renamed_and_modified_3.txt -> to/renamed_and_modified_3.txt',
-    '?? untracked_1.txt',
-    '?? untracked_2.txt',
-    '?? untracked_3.txt',
-    '?? untracked_4.txt',
-])
+FAKE_GIT_STATUS = '\0'.join([
+    '1 D. N... 100644 000000 000000 {h} {z} deleted.txt',
+    '1 .M N... 100644 100644 100644 {h} {h} unstaged.txt',
+    '1 M. N... 100644 100644 100644 {h} {h} staged_1.txt',
+    '1 M. N... 100644 100644 100644 {h} {h} staged 2.txt',
+    '2 R. N... 100644 100644 100644 {h} {h} R100 to/renamed_1.txt',
+    'from/renamed_1.txt',
+    '2 RM N... 100644 100644 100644 {h} {h} R90 to/renamed_and_modified.txt',
+    'from/renamed_and_modified.txt',
+    'u UU N... 100644 100644 100644 100644 {h} {h} {h} conflict.txt',
+    '? untracked_1.txt',
+    '? untracked "2".txt',
+    '! ignored.txt',
+    '',
+]).format(h='a' * 40, z='0' * 40)
 
 
 @testing.patch_run(stdout=FAKE_GIT_STATUS)
 def test_returns_untracked_files_properly(app_conf):
-    assert frozenset(git.untracked()) == frozenset([
+    assert frozenset(git.untracked(refresh=True)) == frozenset([
         'untracked_1.txt',
-        'untracked_2.txt',
-        'untracked_3.txt',
-        'untracked_4.txt',
+        'untracked "2".txt',
     ])
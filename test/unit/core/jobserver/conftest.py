@@ -0,0 +1,21 @@
+# pylint: disable=missing-docstring
+import os
+
+import pytest
+
+from peltak.core import jobserver
+
+
+@pytest.fixture(autouse=True)
+def clean_jobserver(monkeypatch):
+    monkeypatch.delenv('MAKEFLAGS', raising=False)
+    monkeypatch.setattr(jobserver, '_active', None)
+    monkeypatch.setattr(jobserver, '_inherited_checked', False)
+
+
+@pytest.fixture
+def pipe():
+    read_fd, write_fd = os.pipe()
+    yield read_fd, write_fd
+    os.close(read_fd)
+    os.close(write_fd)
@@ -0,0 +1,119 @@
+# pylint: disable=missing-docstring
+import os
+import threading
+import time
+
+import pytest
+
+from peltak.core import jobserver
+
+
+def test_first_slot_is_free(pipe):
+    server = jobserver.Jobserver(*pipe)
+
+    with server.slot():
+        with pytest.raises(BlockingIOError):
+            os.read(server.read_fd, 1)
+
+    server.close()
+
+
+def test_takes_token_from_pipe_and_puts_it_back(pipe):
+    read_fd, write_fd = pipe
+    os.write(write_fd, b'x')
+    server = jobserver.Jobserver(read_fd, write_fd)
+    held = threading.Event()
+    done = threading.Event()
+
+    def other_job():
+        with server.slot():
+            held.set()
+            done.wait(5)
+
+    with server.slot():
+        thread = threading.Thread(target=other_job)
+        thread.start()
+        assert held.wait(5)
+
+        # Both the free slot and the only token are in use.
+        with pytest.raises(BlockingIOError):
+            os.read(server.read_fd, 1)
+
+        done.set()
+        thread.join(5)
+
+    assert os.read(server.read_fd, 1) == b'x'
+    server.close()
+
+
+def test_limits_concurrent_jobs(pipe):
+    read_fd, write_fd = pipe
+    os.write(write_fd, b'++')
+    server = jobserver.Jobserver(read_fd, write_fd)
+    lock = threading.Lock()
+    running = []
+    max_running = []
+
+    def job():
+        with server.slot():
+            with lock:
+                running.append(1)
+                max_running.append(len(running))
+            time.sleep(0.05)
+            with lock:
+                running.pop()
+
+    threads = [threading.Thread(target=job) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+    assert len(max_running) == 8
+    assert max(max_running) == 3
+    server.close()
+
+
+def test_is_reentrant_within_a_thread(pipe):
+    server = jobserver.Jobserver(*pipe)
+
+    with server.slot():
+        # There are no tokens in the pipe, this would block otherwise.
+        with server.slot():
+            pass
+
+        with server.slot():
+            pass
+
+    # The free slot was released only once, by the outermost block.
+    with server.slot():
+        pass
+
+    server.close()
+
+
+def test_closed_pipe_raises():
+    read_fd, write_fd = os.pipe()
+    server = jobserver.Jobserver(read_fd, write_fd)
+    os.close(read_fd)
+    os.close(write_fd)
+    held = threading.Event()
+    done = threading.Event()
+
+    def first_job():
+        with server.slot():
+            held.set()
+            done.wait(5)
+
+    thread = threading.Thread(target=first_job)
+    thread.start()
+    assert held.wait(5)
+
+    try:
+        with pytest.raises(jobserver.JobserverError):
+            with server.slot():
+                pass
+    finally:
+        done.set()
+        thread.join(5)
+        server.close()
@@ -0,0 +1,62 @@
+# pylint: disable=missing-docstring
+import os
+
+from peltak.core import jobserver
+
+
+def test_no_jobserver():
+    assert jobserver.from_makeflags('') is None
+    assert jobserver.from_makeflags('-k --no-print-directory') is None
+
+
+def test_pipe(pipe):
+    read_fd, write_fd = pipe
+    server = jobserver.from_makeflags(f' -j4 --jobserver-auth={read_fd},{write_fd}')
+
+    assert server is not None
+    assert server.write_fd == write_fd
+    assert server.pass_fds == (read_fd, write_fd)
+    server.close()
+
+
+def test_old_flag_name(pipe):
+    read_fd, write_fd = pipe
+    server = jobserver.from_makeflags(f'--jobserver-fds={read_fd},{write_fd} -j')
+
+    assert server is not None
+    server.close()
+
+
+def test_fifo(tmp_path):
+    path = str(tmp_path / 'jobserver')
+    os.mkfifo(path)
+
+    server = jobserver.from_makeflags(f'-j4 --jobserver-auth=fifo:{path}')
+
+    assert server is not None
+    # Child processes open the fifo on their own.
+    assert server.pass_fds == ()
+    os.write(server.write_fd, b'+')
+    assert os.read(server.read_fd, 1) == b'+'
+    server.close()
+    os.close(server.write_fd)
+
+
+def test_ignores_fds_that_were_not_inherited(pipe):
+    read_fd, write_fd = os.pipe()
+    os.close(read_fd)
+    os.close(write_fd)
+
+    assert jobserver.from_makeflags(f'--jobserver-auth={read_fd},{write_fd}') is None
+
+
+def test_ignores_malformed_auth():
+    assert jobserver.from_makeflags('--jobserver-auth=foo') is None
+    assert jobserver.from_makeflags('--jobserver-auth=fifo:/does/not/exist') is None
+
+
+def test_ignores_fds_that_are_not_pipes(tmp_path):
+    fd = os.open(str(tmp_path / 'file'), os.O_RDWR | os.O_CREAT)
+
+    assert jobserver.from_makeflags(f'--jobserver-auth={fd},{fd}') is None
+    os.close(fd)
@@ -0,0 +1,84 @@
+# pylint: disable=missing-docstring
+import os
+import subprocess
+import sys
+
+from peltak.core import jobserver
+
+
+def test_exports_jobserver_in_makeflags(monkeypatch):
+    monkeypatch.setenv('MAKEFLAGS', 'k -j8 --jobserver-auth=100,101')
+    # The inherited jobserver is gone, fds 100 and 101 are not open.
+    with jobserver.serve(3) as server:
+        read_fd, write_fd = server.pass_fds
+        assert os.environ['MAKEFLAGS'] == (
+            f'k -j3 --jobserver-auth={read_fd},{write_fd}'
+        )
+        assert jobserver.get() is server
+
+    assert os.environ['MAKEFLAGS'] == 'k -j8 --jobserver-auth=100,101'
+    assert jobserver.get() is None
+
+
+def test_fills_pipe_with_tokens():
+    with jobserver.serve(4) as server:
+        tokens = os.read(server.read_fd, 10)
+
+    # One slot is free, it doesn't need a token.
+    assert len(tokens) == 3
+
+
+def test_restores_missing_makeflags():
+    with jobserver.serve(2):
+        assert 'MAKEFLAGS' in os.environ
+
+    assert 'MAKEFLAGS' not in os.environ
+
+
+def test_does_nothing_for_a_single_job():
+    with jobserver.serve(1) as server:
+        assert server is None
+        assert 'MAKEFLAGS' not in os.environ
+        assert jobserver.pass_fds() == ()
+
+
+def test_uses_inherited_jobserver(monkeypatch, pipe):
+    read_fd, write_fd = pipe
+    makeflags = f'-j2 --jobserver-auth={read_fd},{write_fd}'
+    monkeypatch.setenv('MAKEFLAGS', makeflags)
+
+    with jobserver.serve(8) as server:
+        assert server is not None
+        assert server.write_fd == write_fd
+        assert os.environ['MAKEFLAGS'] == makeflags
+
+    server.close()
+
+
+def test_child_processes_see_the_jobserver():
+    child = '\n'.join([
+        'import os',
+        'from peltak.core import jobserver',
+        'print(len(os.read(jobserver.get().read_fd, 10)))',
+    ])
+
+    with jobserver.serve(3):
+        output = subprocess.run(
+            [sys.executable, '-c', child],
+            stdout=subprocess.PIPE,
+            universal_newlines=True,
+            pass_fds=jobserver.pass_fds(),
+            check=True,
+        ).stdout
+
+    assert output.strip() == '2'
+
+
+def test_keeps_command_line_variables_last(monkeypatch):
+    monkeypatch.setenv('MAKEFLAGS', 's -- CC=clang CFLAGS=-O2')
+
+    with jobserver.serve(2) as server:
+        read_fd, write_fd = server.pass_fds
+        assert os.environ['MAKEFLAGS'] == (
+            f's -j2 --jobserver-auth={read_fd},{write_fd} -- CC=clang CFLAGS=-O2'
+        )
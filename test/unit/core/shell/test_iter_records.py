@@ -0,0 +1,51 @@
+# pylint: disable=missing-docstring
+import pytest
+
+from peltak.core import shell
+
+
+def test_splits_output_on_nul_by_default():
+    records = shell.iter_records("printf 'a b\\0c\\nd\\0'")
+
+    assert list(records) == ['a b', 'c\nd']
+
+
+def test_yields_the_last_record_without_trailing_separator():
+    records = shell.iter_records("printf 'a,b,c'", sep=',')
+
+    assert list(records) == ['a', 'b', 'c']
+
+
+def test_runs_in_given_directory(tmp_path):
+    records = shell.iter_records('pwd', sep='\n', cwd=str(tmp_path))
+
+    assert list(records) == [str(tmp_path)]
+
+
+def test_closing_the_generator_stops_the_command():
+    records = shell.iter_records('yes', sep='\n')
+
+    assert next(records) == 'y'
+    records.close()
+
+
+def test_raises_if_the_command_fails():
+    records = shell.iter_records("printf 'a\\0b\\0'; exit 3")
+
+    assert next(records) == 'a'
+    assert next(records) == 'b'
+    with pytest.raises(shell.CommandFailed):
+        next(records)
+
+
+def test_ignores_exit_code_if_not_checked():
+    records = shell.iter_records("printf 'a\\0'; exit 3", check=False)
+
+    assert list(records) == ['a']
+
+
+def test_closing_early_does_not_check_exit_code():
+    records = shell.iter_records("printf 'a\\0b\\0'; exit 3")
+
+    assert next(records) == 'a'
+    records.close()
@@ -0,0 +1,103 @@
+# pylint: disable=missing-docstring
+import os
+from unittest.mock import Mock, patch
+
+import pytest
+
+from peltak.core import context, shell
+
+
+pytestmark = pytest.mark.skipif(
+    not os.path.exists('/bin/bash'),
+    reason="persistent session requires bash"
+)
+
+
+def test_captures_output_and_return_code():
+    with shell.persistent_session():
+        result = shell.run('echo out; echo err >&2; exit 3', capture=True)
+
+    assert result.return_code == 3
+    assert result.stdout == 'out\n'
+    assert result.stderr == 'err\n'
+    assert result.failed is True
+
+
+def test_output_without_trailing_newline_is_preserved():
+    with shell.persistent_session():
+        assert shell.run('printf abc', capture=True).stdout == 'abc'
+
+
+def test_reuses_the_same_process_for_all_commands():
+    with shell.persistent_session() as session:
+        first = shell.run('echo $$', capture=True).stdout
+        second = shell.run('echo $$', capture=True).stdout
+        assert first == second == '{}\n'.format(session.proc.pid)
+
+
+def test_restarts_the_coprocess_if_it_dies():
+    with shell.persistent_session() as session:
+        shell.run('kill -9 $$', capture=True)
+        assert not session.alive
+
+        assert shell.run('echo alive', capture=True).stdout == 'alive\n'
+
+
+def test_passes_env_only_to_the_given_command():
+    with shell.persistent_session():
+        with_env = shell.run('echo $PELTAK_FAKE', capture=True, env={
+            'PELTAK_FAKE': 'value'
+        })
+        without_env = shell.run('echo $PELTAK_FAKE', capture=True)
+
+    assert with_env.stdout == 'value\n'
+    assert without_env.stdout == '\n'
+
+
+def test_runs_in_current_working_directory(tmp_path):
+    curr_dir = os.getcwd()
+
+    with shell.persistent_session():
+        os.chdir(str(tmp_path))
+        try:
+            result = shell.run('pwd', capture=True)
+        finally:
+            os.chdir(curr_dir)
+
+    assert result.stdout == '{}\n'.format(os.path.realpath(str(tmp_path)))
+
+
+@patch('subprocess.Popen')
+def test_does_not_run_anything_in_pretend_mode(p_popen: Mock):
+    context.set('pretend', True)
+
+    try:
+        with shell.persistent_session() as session:
+            shell.run('echo hello', capture=True)
+            assert session.proc is None
+    finally:
+        context.set('pretend', False)
+
+    p_popen.assert_not_called()
+
+
+def test_commands_that_are_not_captured_spawn_a_new_process():
+    with shell.persistent_session() as session:
+        with patch('subprocess.Popen') as p_popen:
+            p_popen.return_value.communicate.return_value = (None, None)
+            p_popen.return_value.returncode = 0
+
+            shell.run('echo hello')
+
+        assert session.proc is None
+        p_popen.assert_called_once_with('echo hello', shell=True)
+
+
+def test_nested_sessions_reuse_the_outer_one():
+    with shell.persistent_session() as outer:
+        with shell.persistent_session() as inner:
+            assert inner is outer
+
+        assert shell.run('echo hello', capture=True).stdout == 'hello\n'
+
+    assert outer.proc is None
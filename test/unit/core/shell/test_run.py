@@ -104,3 +104,16 @@ def test_will_not_crash_if_communicated_returns_strings(p_popen):
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
     )
+
+
+@patch('subprocess.Popen')
+def test_bumps_generation_unless_never_pretend(p_popen):
+    p_popen.return_value.communicate.return_value = (b'', b'')
+    p_popen.return_value.returncode = 0
+    start = shell.generation()
+
+    shell.run('git status', capture=True, never_pretend=True)
+    assert shell.generation() == start
+
+    shell.run('git commit', capture=True)
+    assert shell.generation() == start + 1
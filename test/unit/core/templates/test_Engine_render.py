@@ -1,28 +1,74 @@
 # pylint: disable=missing-docstring
-from unittest.mock import Mock
+import hashlib
+from unittest.mock import Mock, patch
 
-from peltak.core import templates
+from peltak.core import templates, util
 
 
-def test_uses_env_get_template():
+def test_loads_template_by_content_hash():
     """
-    When calling Engine.render_template()
-    then Engine.env.get_template is called to load the template.
+    When calling Engine.render()
+    then the template is loaded by the SHA1 of its source.
     """
-    # Setup
     engine = templates.Engine()
-    engine.env.from_string = Mock()
+    p_get_template = Mock()
 
-    templates.Engine().render('fake template string')
+    with patch.object(engine.env, 'get_template', p_get_template):
+        templates.Engine().render('fake template string')
 
-    engine.env.from_string.assert_called_once_with('fake template string')
+    p_get_template.assert_called_once_with(
+        'string:' + hashlib.sha1(b'fake template string').hexdigest()
+    )
 
 
 def test_passes_template_context_to_render_method():
     engine = templates.Engine()
     p_template = Mock()
-    engine.env.from_string = Mock(return_value=p_template)
 
-    templates.Engine().render('fake template string', {'fake': 'context'})
+    with patch.object(engine.env, 'get_template', Mock(return_value=p_template)):
+        templates.Engine().render('fake template string', {'fake': 'context'})
 
     p_template.render.assert_called_once_with({'fake': 'context'})
+
+
+def test_compiles_each_template_only_once():
+    engine = templates.Engine()
+
+    with patch.object(engine.env, 'compile', wraps=engine.env.compile) as p_compile:
+        assert engine.render('{{ x }} once', {'x': 1}) == '1 once'
+        assert engine.render('{{ x }} once', {'x': 2}) == '2 once'
+
+    p_compile.assert_called_once()
+
+
+@patch('peltak.core.conf.get_path')
+def test_stores_bytecode_in_build_dir(p_get_path, tmp_path):
+    p_get_path.return_value = str(tmp_path)
+    util.Singleton.instances = {}
+
+    try:
+        assert templates.Engine().render('{{ x }} cached', {'x': 1}) == '1 cached'
+        assert len(list((tmp_path / 'jinja').iterdir())) == 1
+
+        # A fresh engine (next peltak run) loads bytecode instead of compiling.
+        util.Singleton.instances = {}
+        engine = templates.Engine()
+        with patch.object(engine.env, 'compile') as p_compile:
+            assert engine.render('{{ x }} cached', {'x': 2}) == '2 cached'
+
+        p_compile.assert_not_called()
+    finally:
+        util.Singleton.instances = {}
+
+
+def test_keeps_a_bounded_number_of_template_sources():
+    engine = templates.Engine()
+
+    with patch('peltak.core.templates.engine.CACHE_SIZE', 3):
+        for i in range(5):
+            template = '{{ x }} bounded ' + str(i)
+            assert engine.render(template, {'x': i}) == f'{i} bounded {i}'
+
+        assert len(engine._sources) == 3
+        # Evicted templates are loaded again from the new source.
+        assert engine.render('{{ x }} bounded 0', {'x': 7}) == '7 bounded 0'
@@ -1,5 +1,5 @@
 # pylint: disable=missing-docstring
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 
 from peltak.core import templates
 
@@ -11,18 +11,19 @@ def test_uses_env_get_template():
     """
     # Setup
     engine = templates.Engine()
-    engine.env.get_template = Mock()
+    p_get_template = Mock()
 
-    templates.Engine().render_file('fake.jinja2')
+    with patch.object(engine.env, 'get_template', p_get_template):
+        templates.Engine().render_file('fake.jinja2')
 
-    engine.env.get_template.assert_called_once_with('fake.jinja2')
+    p_get_template.assert_called_once_with('fake.jinja2')
 
 
 def test_passes_template_context_to_render_method():
     engine = templates.Engine()
     p_template = Mock()
-    engine.env.get_template = Mock(return_value=p_template)
 
-    templates.Engine().render_file('fake.jinja2', {'fake': 'context'})
+    with patch.object(engine.env, 'get_template', Mock(return_value=p_template)):
+        templates.Engine().render_file('fake.jinja2', {'fake': 'context'})
 
     p_template.render.assert_called_once_with({'fake': 'context'})
@@ -0,0 +1,51 @@
+# pylint: disable=missing-docstring
+from unittest.mock import Mock
+
+from peltak.core import templates
+
+
+def test_is_not_evaluated_until_used():
+    factory = Mock(return_value=['a', 'b'])
+    value = templates.Lazy(factory)
+
+    factory.assert_not_called()
+    assert not value.evaluated
+
+    assert list(value) == ['a', 'b']
+    assert value.evaluated
+
+
+def test_is_evaluated_only_once():
+    factory = Mock(return_value=['a', 'b'])
+    value = templates.Lazy(factory)
+
+    assert len(value) == 2
+    assert value[0] == 'a'
+    assert 'b' in value
+
+    factory.assert_called_once_with()
+
+
+def test_is_not_evaluated_in_branch_not_taken():
+    factory = Mock(return_value=['a', 'b'])
+
+    result = templates.Engine().render(
+        "{% if opts.pretend %}skip{% else %}{{ files | join(',') }}{% endif %}",
+        {'opts': {'pretend': True}, 'files': templates.Lazy(factory)},
+    )
+
+    assert result == 'skip'
+    factory.assert_not_called()
+
+
+def test_works_with_attribute_and_item_access_in_templates():
+    ctx = {'script': templates.Lazy(lambda: {'name': 'test'})}
+
+    assert templates.Engine().render('{{ script.name }}', ctx) == 'test'
+    assert templates.Engine().render("{{ script['name'] }}", ctx) == 'test'
+
+
+def test_materialize_evaluates_all_lazy_values():
+    ctx = {'files': templates.Lazy(lambda: ['a']), 'opts': {'verbose': 1}}
+
+    assert templates.materialize(ctx) == {'files': ['a'], 'opts': {'verbose': 1}}
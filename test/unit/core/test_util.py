@@ -44,6 +44,63 @@ class TestCachedResults:
         util.cached_result.clear(foo)
 
 
+class TestMemoize:
+    def test_caches_results_by_arguments(self):
+        fn = Mock(side_effect=lambda x, y=0: x + y)
+        cached = util.memoize()(fn)
+
+        assert cached(1) == 1
+        assert cached(1) == 1
+        assert cached(1, y=2) == 3
+        assert cached(1, y=2) == 3
+
+        assert fn.call_count == 2
+
+    def test_evicts_least_recently_used(self):
+        fn = Mock(side_effect=lambda x: x)
+        cached = util.memoize(maxsize=2)(fn)
+
+        cached(1)
+        cached(2)
+        cached(1)
+        cached(3)   # evicts 2
+        cached(1)
+        cached(2)
+
+        assert [c[0][0] for c in fn.call_args_list] == [1, 2, 3, 2]
+
+    def test_calls_again_when_token_changes(self):
+        state = {'token': 1}
+        fn = Mock(return_value='result')
+        cached = util.memoize(tokens=[lambda: state['token']])(fn)
+
+        cached()
+        cached()
+        state['token'] = 2
+        cached()
+
+        assert fn.call_count == 2
+
+    def test_refresh_forces_a_call(self):
+        fn = Mock(return_value='result')
+        cached = util.memoize()(fn)
+
+        cached()
+        cached(refresh=True)
+
+        assert fn.call_count == 2
+
+    def test_cached_result_clear_works_with_memoize(self):
+        fn = Mock(return_value='result')
+        cached = util.memoize()(fn)
+
+        cached()
+        util.cached_result.clear(cached)
+        cached()
+
+        assert fn.call_count == 2
+
+
 class TestTimedBlock:
     # TODO: Use freezegun here
     @patch('time.time', Mock(side_effect=[1, 2]))
@@ -113,3 +170,23 @@ class TestSetInDict:
 
         with pytest.raises(KeyError):
             util.set_in_dict(d, 'test.sub.sub', 'value')
+
+
+class TestInBatches:
+    def test_splits_into_batches(self):
+        batches = list(util.in_batches(range(7), 3))
+
+        assert batches == [[0, 1, 2], [3, 4, 5], [6]]
+
+    def test_consumes_items_lazily(self):
+        consumed = []
+
+        def items():
+            for i in range(10):
+                consumed.append(i)
+                yield i
+
+        batches = util.in_batches(items(), 3)
+
+        assert next(batches) == [0, 1, 2]
+        assert consumed == [0, 1, 2]
@@ -0,0 +1,126 @@
+# pylint: disable=missing-docstring
+import os
+import subprocess
+import time
+
+import pytest
+
+from peltak.core.scripts.bash_builtins import render
+
+
+def run_bash(use, script, **env):
+    return subprocess.run(
+        ['bash', '-c', render(use) + script],
+        capture_output=True,
+        encoding='utf-8',
+        env={**os.environ, **env},
+    )
+
+
+def test_defines_only_requested_functions():
+    source = render(['header'])
+
+    assert 'function cprint()' in source
+    assert 'function header()' in source
+    assert 'function peltak_time()' not in source
+
+
+def test_renders_nothing_without_builtins():
+    assert render([]) == ''
+
+
+def test_cprint_replaces_color_codes():
+    result = run_bash(['cprint'], 'cprint "<32>ok <1>bold"')
+
+    assert result.stdout == '\x1b[32mok \x1b[1mbold\x1b[0m\n'
+
+
+def test_header_pads_title_to_full_width():
+    result = run_bash(['header'], 'header "Building"')
+
+    assert result.stdout.startswith('\x1b[32m= \x1b[35mBuilding \x1b[32m===')
+    assert result.stdout.count('=') == 1 + 77 - len('Building')
+
+
+def test_peltak_time_writes_timings_file(tmp_path):
+    timings_file = tmp_path / 'timings.tsv'
+    result = run_bash(
+        ['peltak_time'],
+        'peltak_time docs sleep 0.1; peltak_time lint true',
+        PELTAK_TIMINGS=str(timings_file),
+    )
+
+    assert result.returncode == 0
+    rows = [line.split('\t') for line in timings_file.read_text().splitlines()]
+    assert [label for label, _ in rows] == ['docs', 'lint']
+    assert 100000 <= int(rows[0][1]) < 5000000
+
+
+def test_peltak_time_prints_without_timings_file():
+    result = run_bash(['peltak_time'], 'peltak_time docs true', PELTAK_TIMINGS='')
+
+    assert 'docs took' in result.stdout
+
+
+def test_peltak_time_keeps_the_exit_code(tmp_path):
+    result = run_bash(
+        ['peltak_time'],
+        'peltak_time fail bash -c "exit 3"',
+        PELTAK_TIMINGS=str(tmp_path / 'timings.tsv'),
+    )
+
+    assert result.returncode == 3
+
+
+def test_peltak_parallel_runs_commands_at_the_same_time():
+    start = time.monotonic()
+    result = run_bash(
+        ['peltak_parallel'],
+        'peltak_parallel -j 4 "sleep 0.3" "sleep 0.3" "sleep 0.3" "sleep 0.3"',
+    )
+
+    assert result.returncode == 0
+    assert time.monotonic() - start < 1.0
+
+
+def test_peltak_parallel_limits_running_jobs():
+    start = time.monotonic()
+    result = run_bash(
+        ['peltak_parallel'],
+        'peltak_parallel -j 1 "sleep 0.2" "sleep 0.2" "sleep 0.2"',
+    )
+
+    assert result.returncode == 0
+    assert time.monotonic() - start >= 0.6
+
+
+def test_peltak_parallel_uses_peltak_jobs_by_default():
+    start = time.monotonic()
+    result = run_bash(
+        ['peltak_parallel'],
+        'peltak_parallel "sleep 0.2" "sleep 0.2"',
+        PELTAK_JOBS='1',
+    )
+
+    assert result.returncode == 0
+    assert time.monotonic() - start >= 0.4
+
+
+def test_peltak_parallel_reads_commands_from_stdin():
+    result = run_bash(
+        ['peltak_parallel'],
+        'printf "echo one\\necho two\\n" | peltak_parallel -j 2',
+    )
+
+    assert sorted(result.stdout.splitlines()) == ['one', 'two']
+
+
+@pytest.mark.parametrize('jobs', ['1', '3'])
+def test_peltak_parallel_fails_if_any_command_fails(jobs):
+    result = run_bash(
+        ['peltak_parallel'],
+        f'set -e; peltak_parallel -j {jobs} true "exit 2" true; echo after',
+    )
+
+    assert result.returncode != 0
+    assert 'after' not in result.stdout
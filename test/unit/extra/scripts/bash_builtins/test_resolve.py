@@ -0,0 +1,20 @@
+# pylint: disable=missing-docstring
+import pytest
+
+from peltak.core.scripts.bash_builtins import resolve
+
+
+@pytest.mark.parametrize('names,expected', [
+    ([], []),
+    (['cprint'], ['cprint']),
+    (['header'], ['cprint', 'header']),
+    (['peltak_time', 'header'], ['cprint', 'peltak_time', 'header']),
+    (['peltak_parallel'], ['peltak_parallel']),
+    (['header', 'header', 'cprint'], ['cprint', 'header']),
+])
+def test_adds_dependencies_once_before_the_dependants(names, expected):
+    assert resolve(names) == expected
+
+
+def test_ignores_unknown_builtins():
+    assert resolve(['not_a_builtin', 'header']) == ['cprint', 'header']
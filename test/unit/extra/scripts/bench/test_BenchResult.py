@@ -0,0 +1,40 @@
+# pylint: disable=missing-docstring
+import pytest
+
+from peltak.core.scripts.bench import BenchResult, BenchRun
+
+
+@pytest.fixture
+def result():
+    return BenchResult('test', [
+        BenchRun(1.0, 0.5, 0.1, 100, 0),
+        BenchRun(2.0, 0.7, 0.2, 300, 0),
+        BenchRun(4.0, 0.9, 0.3, 200, 1),
+    ])
+
+
+def test_summarizes_wall_times(result):
+    assert result.mean == pytest.approx(7 / 3)
+    assert result.stddev == pytest.approx(1.527525, rel=1e-5)
+    assert result.median == 2.0
+    assert result.min == 1.0
+    assert result.max == 4.0
+
+
+def test_summarizes_resource_usage(result):
+    assert result.user == pytest.approx(0.7)
+    assert result.system == pytest.approx(0.2)
+    assert result.max_rss == 300
+
+
+def test_stddev_of_single_run_is_zero():
+    assert BenchResult('test', [BenchRun(1.0, 0.5, 0.1, 100, 0)]).stddev == 0.0
+
+
+def test_as_dict_includes_all_measurements(result):
+    data = result.as_dict()
+
+    assert data['name'] == 'test'
+    assert data['times'] == [1.0, 2.0, 4.0]
+    assert data['exit_codes'] == [0, 0, 1]
+    assert data['median'] == 2.0
@@ -0,0 +1,78 @@
+# pylint: disable=missing-docstring
+from unittest.mock import patch
+
+import pytest
+
+from peltak.core import conf
+from peltak.core.context import RunContext
+from peltak.core.scripts.bench import Benchmark, NotBenchmarkable
+from peltak.core.scripts.types import Script
+
+
+SCRIPTS = {
+    'nap': Script.from_config('nap', {
+        'command': 'sleep {{ opts.sec }}; exit {{ opts.code }}',
+        'options': [
+            {'name': '--sec', 'default': '0'},
+            {'name': '--code', 'default': '0'},
+        ],
+    }),
+    'test': Script.from_config('test', {
+        'command': 'echo {{ matrix.python }}',
+        'matrix': {'python': ['3.8', '3.9']},
+    }),
+    'lint': Script.from_config('lint', {
+        'command': 'pylint {{ files | join(" ") }}',
+        'files': {'paths': ['src']},
+        'files_mode': 'batch',
+    }),
+}
+
+
+@pytest.fixture
+def scripts(tmp_path):
+    appconf = conf.Config({}, path=str(tmp_path / 'peltak.yaml'))
+    with patch('peltak.core.conf.g_conf', appconf), \
+            patch('peltak.core.scripts.loader.get_script', SCRIPTS.__getitem__):
+        RunContext().set('pretend', False)
+        yield SCRIPTS
+
+
+def test_renders_command_with_options(scripts):
+    benchmark, = Benchmark.parse('nap --sec 2')
+
+    assert benchmark.name == 'nap --sec 2'
+    assert benchmark.cmd == 'sleep 2; exit 0'
+
+
+def test_creates_benchmark_for_every_matrix_combination(scripts):
+    benchmarks = Benchmark.parse('test')
+
+    assert [x.name for x in benchmarks] == ['test[python=3.8]', 'test[python=3.9]']
+    assert [x.cmd for x in benchmarks] == ['echo 3.8', 'echo 3.9']
+
+
+def test_refuses_scripts_running_many_commands(scripts):
+    with pytest.raises(NotBenchmarkable):
+        Benchmark.parse('lint')
+
+
+def test_measures_wall_and_cpu_time(scripts):
+    benchmark, = Benchmark.parse('nap --sec 0.2 --code 3')
+
+    run = benchmark.run()
+
+    assert 0.2 <= run.wall_time < 2
+    assert run.user_time >= 0
+    assert run.max_rss > 0
+    assert run.retcode == 3
+
+
+def test_hides_output_unless_asked_to_show_it(scripts, capfd):
+    benchmark = Benchmark.parse('test')[0]
+
+    benchmark.run()
+    assert capfd.readouterr().out == ''
+
+    benchmark.run(show_output=True)
+    assert capfd.readouterr().out == '3.8\n'
@@ -0,0 +1,68 @@
+# pylint: disable=missing-docstring
+from unittest.mock import Mock
+
+import pytest
+
+from peltak.core.scripts.bench import BenchmarkFailed, BenchRun, measure
+from peltak.core.scripts.types import Script
+
+
+def make_benchmark(name, *retcodes, calls=None):
+    retcodes = list(retcodes) or [0]
+    benchmark = Mock()
+    benchmark.name = name
+    benchmark.script = Script.from_config(name, {'command': 'true'})
+
+    def run(show_output):
+        if calls is not None:
+            calls.append(name)
+        retcode = retcodes.pop(0) if len(retcodes) > 1 else retcodes[0]
+        return BenchRun(0.1, 0.05, 0.01, 1024, retcode)
+
+    benchmark.run.side_effect = run
+    return benchmark
+
+
+def test_measures_only_runs_after_warmup():
+    benchmark = make_benchmark('test')
+
+    result = measure(benchmark, runs=5, warmup=2)
+
+    assert benchmark.run.call_count == 7
+    assert len(result.runs) == 5
+    assert result.name == 'test'
+
+
+def test_runs_prepare_before_every_run_and_cleanup_once():
+    calls = []
+    result = measure(
+        make_benchmark('test', calls=calls),
+        runs=2,
+        warmup=1,
+        prepare=[make_benchmark('prep', calls=calls)],
+        cleanup=[make_benchmark('clean', calls=calls)],
+    )
+
+    assert calls == ['prep', 'test'] * 3 + ['clean']
+    assert len(result.runs) == 2
+
+
+def test_stops_when_the_script_fails():
+    with pytest.raises(BenchmarkFailed):
+        measure(make_benchmark('test', 0, 2), runs=5)
+
+
+def test_keeps_going_if_failures_are_ignored():
+    result = measure(make_benchmark('test', 0, 2, 0), runs=3, ignore_failure=True)
+
+    assert [x.retcode for x in result.runs] == [0, 2, 0]
+
+
+def test_stops_when_prepare_fails_even_if_failures_are_ignored():
+    with pytest.raises(BenchmarkFailed):
+        measure(
+            make_benchmark('test'),
+            runs=2,
+            prepare=[make_benchmark('prep', 1)],
+            ignore_failure=True,
+        )
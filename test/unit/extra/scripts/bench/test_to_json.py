@@ -0,0 +1,18 @@
+# pylint: disable=missing-docstring
+import json
+
+from peltak.core.scripts.bench import BenchResult, BenchRun, to_json
+
+
+def test_exports_summary_and_every_run():
+    result = BenchResult('test', [
+        BenchRun(1.0, 0.5, 0.1, 100, 0),
+        BenchRun(2.0, 0.5, 0.1, 200, 0),
+    ])
+
+    data = json.loads(to_json([result]))
+
+    assert data['results'][0]['name'] == 'test'
+    assert data['results'][0]['mean'] == 1.5
+    assert data['results'][0]['times'] == [1.0, 2.0]
+    assert data['results'][0]['max_rss'] == 200
@@ -0,0 +1,23 @@
+# pylint: disable=missing-docstring
+from peltak.core.scripts.bench import BenchResult, BenchRun, to_markdown
+
+
+def make_result(name, *times):
+    return BenchResult(name, [BenchRun(t, 0.0, 0.0, 0, 0) for t in times])
+
+
+def test_renders_table_with_relative_speed():
+    text = to_markdown([make_result('slow', 2.0, 4.0), make_result('fast', 1.0, 1.0)])
+
+    lines = text.splitlines()
+    assert lines[0].startswith('| Script | Mean [s] |')
+    assert lines[2] == '| `slow` | 3.000 ± 1.414 | 3.000 | 2.000 | 4.000 | 3.00 |'
+    assert lines[3] == '| `fast` | 1.000 ± 0.000 | 1.000 | 1.000 | 1.000 | 1.00 |'
+
+
+def test_uses_milliseconds_for_fast_benchmarks():
+    text = to_markdown([make_result('fast', 0.012, 0.014)])
+
+    lines = text.splitlines()
+    assert '| Mean [ms] |' in lines[0]
+    assert lines[2].startswith('| `fast` | 13.000 ± 1.414 |')
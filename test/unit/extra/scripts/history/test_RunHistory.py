@@ -0,0 +1,71 @@
+# pylint: disable=missing-docstring
+import pytest
+
+from peltak.core.scripts.history import RunHistory, ScriptRun
+
+
+@pytest.fixture
+def run_history(tmp_path):
+    result = RunHistory(str(tmp_path / '.build' / 'script-history.sqlite'))
+    yield result
+    result.close()
+
+
+def make_run(script='test', wall_time=1.0, success=True, **values):
+    return ScriptRun(
+        script=script,
+        started=1600000000.0,
+        wall_time=wall_time,
+        success=success,
+        **values
+    )
+
+
+def test_records_runs(run_history):
+    run = make_run(cmd_hash='abc', cpu_time=0.5, max_rss=1024, retcode=0, files=3)
+    run_history.record(run)
+
+    assert run_history.runs() == [run]
+
+
+def test_returns_runs_oldest_first(run_history):
+    for wall_time in (1.0, 2.0, 3.0):
+        run_history.record(make_run(wall_time=wall_time))
+
+    assert [r.wall_time for r in run_history.runs()] == [1.0, 2.0, 3.0]
+
+
+def test_can_filter_runs_by_script(run_history):
+    run_history.record(make_run('lint'))
+    run_history.record(make_run('test'))
+
+    assert [r.script for r in run_history.runs('lint')] == ['lint']
+
+
+def test_keeps_only_max_runs_per_script(tmp_path):
+    run_history = RunHistory(str(tmp_path / 'history.sqlite'), max_runs=2)
+    for wall_time in (1.0, 2.0, 3.0):
+        run_history.record(make_run('test', wall_time=wall_time))
+    run_history.record(make_run('lint'))
+
+    assert [r.wall_time for r in run_history.runs('test')] == [2.0, 3.0]
+    assert len(run_history.runs('lint')) == 1
+
+
+def test_stats_skip_scripts_that_never_succeeded(run_history):
+    run_history.record(make_run('lint', success=False))
+    run_history.record(make_run('test'))
+
+    assert [x.script for x in run_history.stats()] == ['test']
+
+
+def test_returns_nothing_if_there_is_no_history(run_history):
+    assert run_history.runs() == []
+    assert run_history.stats() == []
+
+
+def test_clear_removes_all_runs(run_history):
+    run_history.record(make_run())
+    run_history.clear()
+
+    assert run_history.runs() == []
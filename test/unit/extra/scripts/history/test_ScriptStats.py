@@ -0,0 +1,41 @@
+# pylint: disable=missing-docstring
+from peltak.core.scripts.history import ScriptRun, ScriptStats
+
+
+def make_runs(*times, success=True):
+    return [
+        ScriptRun(script='test', started=float(i), wall_time=t, success=success)
+        for i, t in enumerate(times)
+    ]
+
+
+def test_computes_percentiles_of_successful_runs():
+    runs = make_runs(*range(1, 21)) + make_runs(100.0, success=False)
+
+    stats = ScriptStats.from_runs('test', runs, window=5)
+
+    assert stats is not None
+    assert (stats.runs, stats.failed) == (21, 1)
+    assert (stats.p50, stats.p95, stats.max, stats.last) == (10, 19, 20, 20)
+
+
+def test_detects_regressions_against_the_baseline():
+    runs = make_runs(*([1.0] * 10 + [3.0] * 5))
+
+    stats = ScriptStats.from_runs('test', runs, window=5)
+
+    assert stats is not None
+    assert (stats.baseline, stats.recent) == (1.0, 3.0)
+    assert stats.change == 3.0
+
+
+def test_needs_a_full_window_for_the_baseline():
+    stats = ScriptStats.from_runs('test', make_runs(1.0, 1.0, 1.0), window=2)
+
+    assert stats is not None
+    assert stats.baseline is None
+    assert stats.change is None
+
+
+def test_returns_none_if_the_script_never_succeeded():
+    assert ScriptStats.from_runs('test', make_runs(1.0, success=False), 5) is None
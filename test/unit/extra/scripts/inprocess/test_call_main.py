@@ -0,0 +1,58 @@
+# pylint: disable=missing-docstring
+import pytest
+
+from peltak.core.scripts import inprocess
+
+
+@pytest.fixture
+def write_script(tmp_path):
+    def write(name, source):
+        path = tmp_path / name
+        path.write_text('# peltak:\n#   about: test\n' + source)
+        return str(path)
+
+    return write
+
+
+def test_passes_context_files_and_options(write_script):
+    path = write_script('echo.py', (
+        'def main(ctx, files, opts):\n'
+        '    return 0 if (ctx, files, opts) == ({"a": 1}, ["f.py"], {"v": 2}) else 5\n'
+    ))
+
+    assert inprocess.call_main(path, {'a': 1}, ['f.py'], {'v': 2}) == 0
+
+
+@pytest.mark.parametrize('body,retcode', [
+    ('return None', 0),
+    ('return 4', 4),
+    ('import sys; sys.exit(3)', 3),
+    ('import sys; sys.exit()', 0),
+    ('raise RuntimeError("boom")', 1),
+])
+def test_returns_script_exit_code(write_script, body, retcode):
+    path = write_script(
+        f'exit_{retcode}.py',
+        f'def main(ctx, files, opts):\n    {body}\n',
+    )
+
+    assert inprocess.call_main(path, {}, [], {}) == retcode
+
+
+def test_imports_the_script_only_once(write_script):
+    path = write_script('counter.py', (
+        'calls = []\n'
+        'def main(ctx, files, opts):\n'
+        '    calls.append(1)\n'
+        '    return len(calls)\n'
+    ))
+
+    assert inprocess.call_main(path, {}, [], {}) == 1
+    assert inprocess.call_main(path, {}, [], {}) == 2
+
+
+def test_raises_if_there_is_no_main(write_script):
+    path = write_script('no_main.py', 'x = 1\n')
+
+    with pytest.raises(inprocess.NoMainFunction):
+        inprocess.call_main(path, {}, [], {})
@@ -0,0 +1,19 @@
+# pylint: disable=missing-docstring
+import pytest
+
+from peltak.core.scripts.inprocess import is_python_script
+
+
+@pytest.mark.parametrize('source,expected', [
+    ('# peltak:\n#   about: test\n', True),
+    ('#!/usr/bin/env python\n# peltak:\n#   about: test\n', True),
+    ('# -*- coding: utf-8 -*-\n# peltak:\n', True),
+    ('# Copyright 2020\n# peltak:\n', False),
+    ('from peltak.cli import peltak_cli\n', False),
+    ('', False),
+])
+def test_detects_the_script_header(tmp_path, source, expected):
+    path = tmp_path / 'script.py'
+    path.write_text(source)
+
+    assert is_python_script(path) is expected
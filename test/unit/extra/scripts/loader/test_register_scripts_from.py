@@ -0,0 +1,91 @@
+# pylint: disable=missing-docstring
+from pathlib import Path
+from unittest.mock import patch
+
+import click
+from click.testing import CliRunner
+
+from peltak.core.scripts import loader
+
+
+SCRIPT = '''#!/bin/bash
+# peltak:
+#   about: Say hello
+#   options:
+#     - name: --name
+#
+echo "hello {{ opts.name }}"
+'''
+
+
+def _write_script(path: Path, content: str = SCRIPT) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content)
+    return path
+
+
+@patch('peltak.core.scripts.loader.peltak_cli', new_callable=click.Group)
+def test_registers_lazy_commands(p_cli, tmp_path):
+    _write_script(tmp_path / 'hello.sh')
+    _write_script(tmp_path / 'ops' / 'deploy.sh')
+
+    with patch.object(loader, '_parse_script') as p_parse_script:
+        loader.register_scripts_from(tmp_path)
+
+        p_parse_script.assert_not_called()
+
+    assert isinstance(p_cli.commands['hello'], loader.LazyScriptCommand)
+    assert p_cli.commands['hello'].help == 'Say hello'
+    assert isinstance(p_cli.commands['ops'], click.Group)
+    assert 'deploy' in p_cli.commands['ops'].commands
+
+
+@patch('peltak.core.scripts.logic.run_script')
+@patch('peltak.core.scripts.loader.peltak_cli', new_callable=click.Group)
+def test_loads_script_when_invoked(p_cli, p_run_script, tmp_path):
+    _write_script(tmp_path / 'hello.sh')
+    loader.register_scripts_from(tmp_path)
+
+    result = CliRunner().invoke(p_cli, ['hello', '--name', 'John'])
+
+    assert result.exit_code == 0, result.output
+    script, options = p_run_script.call_args[0]
+    assert script.name == 'hello'
+    assert 'echo "hello {{ opts.name }}"' in script.command
+    assert options['name'] == 'John'
+
+
+@patch('peltak.core.scripts.loader.peltak_cli', new_callable=click.Group)
+def test_ignores_files_starting_with_underscore(p_cli, tmp_path):
+    _write_script(tmp_path / '_common.sh', 'echo "common"\n')
+
+    loader.register_scripts_from(tmp_path)
+
+    assert p_cli.commands == {}
+
+
+def test_parse_header_returns_peltak_section(tmp_path):
+    path = _write_script(tmp_path / 'hello.sh')
+
+    assert loader._parse_header(path) == {
+        'about': 'Say hello',
+        'options': [{'name': '--name'}],
+    }
+
+
+@patch('peltak.core.conf.py_import')
+@patch('peltak.core.scripts.loader.peltak_cli', new_callable=click.Group)
+def test_registers_python_scripts(p_cli, p_py_import, tmp_path):
+    _write_script(tmp_path / 'check.py', (
+        '# peltak:\n'
+        '#   about: Run checks\n'
+        'def main(ctx, files, opts):\n'
+        '    pass\n'
+    ))
+    _write_script(tmp_path / 'commands.py', 'from peltak.cli import peltak_cli\n')
+
+    loader.register_scripts_from(tmp_path)
+
+    assert p_cli.commands['check'].help == 'Run checks'
+    assert p_cli.commands['check'].script().python_file == str(tmp_path / 'check.py')
+    p_py_import.assert_called_once_with('commands')
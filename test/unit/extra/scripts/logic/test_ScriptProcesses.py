@@ -0,0 +1,288 @@
+# pylint: disable=missing-docstring
+import copy
+import os
+import shutil
+from unittest.mock import patch
+
+import pytest
+
+from peltak.core import conf, context
+from peltak.core.scripts import loader, timings
+from peltak.core.scripts.history import RunHistory
+from peltak.core.scripts.result_cache import ResultCache
+from peltak.core.scripts.logic import ScriptProcesses
+from peltak.core.scripts.types import Script
+
+
+FILES = ['src/a.py', 'src/b.py', 'src/c.py', 'src/d.py', 'src/e.py']
+
+
+@pytest.fixture
+def proj(tmp_path):
+    appconf = conf.Config({'cfg': {}}, path=str(tmp_path / 'peltak.yaml'))
+    with patch('peltak.core.conf.g_conf', appconf), \
+            patch.object(timings, '_timings', timings.FileTimings(None)), \
+            patch('peltak.core.fs.iter_files', side_effect=lambda _: iter(FILES)):
+        yield tmp_path
+
+
+def make_script(command, **script_conf):
+    return Script.from_config('lint', {
+        'command': command,
+        'files': {'paths': ['src']},
+        **script_conf,
+    })
+
+
+def test_runs_batches_of_files(proj, capsys):
+    script = make_script(
+        'echo {{ files | join(",") }}',
+        files_mode='batch',
+        batch_size=2,
+    )
+
+    assert ScriptProcesses(jobs=2).run('lint', script, {}) == 0
+
+    lines = sorted(capsys.readouterr().out.splitlines())
+    assert lines == ['src/a.py,src/b.py', 'src/c.py,src/d.py', 'src/e.py']
+
+
+def test_merges_batch_exit_codes(proj):
+    script = make_script(
+        '{% if "src/c.py" in files %}exit 3{% endif %}',
+        files_mode='batch',
+        batch_size=2,
+    )
+
+    assert ScriptProcesses(jobs=2).run('lint', script, {}) == 3
+
+
+def test_records_batch_durations(proj):
+    script = make_script('true', files_mode='batch', batch_size=2)
+
+    ScriptProcesses().run('lint', script, {})
+
+    assert sorted(timings.open_timings().get('lint')) == FILES
+
+
+def test_balances_batches_using_recorded_timings(proj, capsys):
+    timings.open_timings().scripts['lint'] = {
+        'src/a.py': 10.0,
+        'src/b.py': 1.0,
+        'src/c.py': 1.0,
+        'src/d.py': 1.0,
+        'src/e.py': 1.0,
+    }
+    script = make_script(
+        'echo {{ files | join(",") }}',
+        files_mode='batch',
+        batch_size=3,
+    )
+
+    assert ScriptProcesses().run('lint', script, {}) == 0
+
+    lines = sorted(capsys.readouterr().out.splitlines())
+    assert lines == ['src/a.py', 'src/b.py,src/c.py,src/d.py,src/e.py']
+
+
+def test_records_durations_without_batch_mode(proj):
+    script = make_script('echo {{ files | join(",") }}')
+
+    with patch('peltak.core.fs.collect_files', return_value=list(FILES)):
+        ScriptProcesses().run('lint', script, {})
+
+    durations = timings.open_timings().get('lint')
+    assert sorted(durations) == FILES
+    # The run time is split evenly between the files.
+    assert len(set(durations.values())) == 1
+
+
+def test_shards_files_without_batch_mode(proj, capsys):
+    timings.open_timings().scripts['lint'] = {
+        'src/a.py': 4.0,
+        'src/b.py': 1.0,
+        'src/c.py': 1.0,
+        'src/d.py': 1.0,
+        'src/e.py': 1.0,
+    }
+    script = make_script('echo {{ files | join(",") }}')
+    prev_values = copy.deepcopy(context.RunContext().values)
+    context.set('shard', (2, 2))
+
+    try:
+        with patch('peltak.core.fs.collect_files', return_value=list(FILES)):
+            ScriptProcesses().run('lint', script, {})
+    finally:
+        context.RunContext().values = prev_values
+
+    assert capsys.readouterr().out == 'src/b.py,src/c.py,src/d.py,src/e.py\n'
+    # Only the durations of the files in the shard were updated.
+    durations = timings.open_timings().get('lint')
+    assert durations['src/a.py'] == 4.0
+    assert durations['src/b.py'] != 1.0
+
+
+def test_records_script_runs(proj):
+    run_history = RunHistory(str(proj / 'script-history.sqlite'))
+    script = make_script('true', files_mode='batch', batch_size=2)
+
+    ScriptProcesses(history=run_history).run('lint', script, {})
+
+    runs = run_history.runs()
+    assert len(runs) == 1
+    assert (runs[0].script, runs[0].retcode, runs[0].success) == ('lint', 0, True)
+    assert (runs[0].files, runs[0].processes) == (5, 3)
+    assert runs[0].max_rss > 0
+
+
+def test_does_not_record_runs_when_pretending(proj):
+    run_history = RunHistory(str(proj / 'script-history.sqlite'))
+    script = make_script('true')
+
+    ScriptProcesses(pretend=True, history=run_history).run('lint', script, {})
+
+    assert run_history.runs() == []
+
+
+def test_passes_files_in_argfile(proj, capsys):
+    script = make_script('cat {{ argfile }}', files_mode='argfile')
+
+    assert ScriptProcesses().run('lint', script, {}) == 0
+
+    assert capsys.readouterr().out.splitlines() == FILES
+
+
+def test_passes_files_on_stdin(proj, capsys):
+    script = make_script('tr "\\0" "\\n"', files_mode='stdin')
+
+    assert ScriptProcesses().run('lint', script, {}) == 0
+
+    assert capsys.readouterr().out.splitlines() == FILES
+
+
+def test_caches_argfile_scripts(proj, capsys):
+    cache = ResultCache(str(proj / 'results.sqlite'))
+    script = make_script(
+        'cat {{ argfile }}',
+        files_mode='argfile',
+        inputs={'env': ['DOCS_THEME']},
+    )
+
+    for _ in range(2):
+        runner = ScriptProcesses(cache=cache)
+        assert runner.run('lint', script, {}) == 0
+
+    # The random argfile path is not part of the cache key.
+    assert runner.cached == {'lint'}
+    assert capsys.readouterr().out.splitlines() == FILES + FILES
+    cache.close()
+
+
+def test_files_on_stdin_are_part_of_the_cache_key(proj, capsys):
+    cache = ResultCache(str(proj / 'results.sqlite'))
+    script = make_script(
+        'tr "\\0" "\\n"',
+        files_mode='stdin',
+        inputs={'env': ['DOCS_THEME']},
+    )
+
+    ScriptProcesses(cache=cache).run('lint', script, {})
+    with patch('peltak.core.fs.iter_files', return_value=iter(FILES[:2])):
+        runner = ScriptProcesses(cache=cache)
+        runner.run('lint', script, {})
+
+    assert runner.cached == set()
+    assert capsys.readouterr().out.splitlines() == FILES + FILES[:2]
+    cache.close()
+
+
+def test_prefixes_output_with_the_script_name(proj, capsys):
+    script = Script.from_config('hello', {'command': 'echo hello'})
+
+    ScriptProcesses(prefix_width=6).run('hello', script, {})
+
+    assert capsys.readouterr().out == 'hello  | hello\n'
+
+
+def test_calls_python_scripts_with_prefixed_output(proj, capsys):
+    path = proj / 'check.py'
+    path.write_text(
+        'def main(ctx, files, opts):\n'
+        '    print(len(files), "files")\n'
+        '    print("no newline", end="")\n'
+        '    return 2\n'
+    )
+    script = Script.from_config('check', {
+        'python_file': str(path),
+        'files': {'paths': ['src']},
+    })
+    run_history = RunHistory(str(proj / 'script-history.sqlite'))
+
+    runner = ScriptProcesses(prefix_width=5, history=run_history)
+    assert runner.run('check', script, {}) == 2
+
+    lines = capsys.readouterr().out.splitlines()
+    assert [x.split('| ')[-1] for x in lines] == ['5 files', 'no newline']
+    assert run_history.runs()[0].retcode == 2
+    assert run_history.runs()[0].files == 5
+
+
+def test_collects_peltak_time_timings(proj, capsys):
+    script = make_script(
+        'printf "docs\\t250000\\nlint\\t1000000\\n" >> "$PELTAK_TIMINGS"'
+    )
+
+    with ScriptProcesses() as runner:
+        assert runner.run('lint', script, {}) == 0
+        tmp_dir = runner._tmp_dir.name
+
+    assert runner.timings == {'lint': [('docs', 0.25), ('lint', 1.0)]}
+    assert not os.path.exists(tmp_dir)
+
+
+def test_passes_job_count_to_scripts(proj, capsys):
+    script = make_script('echo "jobs=$PELTAK_JOBS"')
+
+    with ScriptProcesses(jobs=3) as runner:
+        runner.run('lint', script, {})
+
+    assert 'jobs=3' in capsys.readouterr().out
+
+
+@pytest.mark.skipif(shutil.which('dash') is None, reason="requires dash")
+def test_runs_scripts_using_builtins_in_bash(proj, capsys, monkeypatch):
+    # A shell without [[ =~ ]] and printf -v, like zsh for the built-ins.
+    monkeypatch.setenv('SHELL', shutil.which('dash'))
+    script_conf = {'use': ['header']}
+    script = Script.from_config('lint', {
+        **script_conf,
+        'command': loader._inject_builtins(
+            script_conf,
+            'header "Build"; echo "bash=${BASH_VERSION:+yes}"',
+        ),
+    })
+
+    retcode = ScriptProcesses().run('lint', script, {})
+
+    out = capsys.readouterr().out
+    assert retcode == 0
+    assert '\x1b[35mBuild' in out
+    assert 'bash=yes' in out
+
+
+@pytest.mark.skipif(shutil.which('make') is None, reason="requires make")
+def test_scripts_share_jobserver_with_make(proj, capsys, monkeypatch):
+    monkeypatch.delenv('MAKEFLAGS', raising=False)
+    monkeypatch.delenv('MFLAGS', raising=False)
+    (proj / 'Makefile').write_text('all:\n\t@echo "makeflags=$(MAKEFLAGS)"\n')
+    script = make_script(f'make --no-print-directory -C {proj}')
+
+    with ScriptProcesses(jobs=3) as runner:
+        runner.run('lint', script, {})
+
+    out = capsys.readouterr().out
+    # make inherits peltak's jobserver instead of running a single job.
+    assert 'makeflags=' in out
+    assert 'j3' in out
+    assert '--jobserver-' in out
+    assert 'MAKEFLAGS' not in os.environ
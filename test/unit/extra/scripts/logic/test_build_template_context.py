@@ -54,3 +54,33 @@ def test_includes_files_if_specified_in_config():
     assert result['files'] == ['file1', 'file2', 'file3']
 
     RunContext().set('verbose', 0)
+
+
+@patch('peltak.core.fs.collect_files')
+@testing.patch_pelconf({'cfg': {'pelconf': 'hello'}})
+def test_files_are_collected_only_when_used(p_collect_files):
+    p_collect_files.return_value = ['file1']
+    script = Script.from_config('test', {
+        'command': 'fake-cmd',
+        'files': {
+            'paths': 'fake_path'
+        },
+    })
+
+    result = build_template_context(script, {})
+
+    p_collect_files.assert_not_called()
+    assert list(result['files']) == ['file1']
+    p_collect_files.assert_called_once()
+
+
+@testing.patch_pelconf({'cfg': {'pelconf': 'hello'}})
+def test_includes_matrix_values():
+    script = Script.from_config('test', {
+        'command': 'fake-cmd',
+        'matrix': {'python': ['3.8', '3.9']},
+    })
+
+    result = build_template_context(script.matrix_instances()[1], {})
+
+    assert result['matrix'] == {'python': '3.9'}
@@ -0,0 +1,119 @@
+# pylint: disable=missing-docstring
+import os
+import subprocess
+import sys
+import textwrap
+from unittest.mock import Mock, patch
+
+import pytest
+
+from peltak.core import conf
+from peltak.core.context import RunContext
+from peltak.core.scripts.logic import ExecNotPossible, exec_script, run_script
+from peltak.core.scripts.types import Script
+
+
+EXEC_SCRIPT = textwrap.dedent('''
+    import os
+    import sys
+
+    from peltak.core import conf, context
+    from peltak.core.scripts.logic import exec_script
+    from peltak.core.scripts.types import Script
+
+    conf.g_conf = conf.Config({}, path=sys.argv[1])
+    context.set('pretend', False)
+    print(os.getpid(), flush=True)
+    exec_script(Script.from_config('serve', {'command': sys.argv[2]}), {})
+    print('peltak still running')
+''')
+
+
+def run_exec_script(tmp_path, command):
+    return subprocess.run(
+        [sys.executable, '-c', EXEC_SCRIPT, str(tmp_path / 'peltak.yaml'), command],
+        capture_output=True,
+        encoding='utf-8',
+        env={**os.environ, 'PYTHONPATH': os.pathsep.join(sys.path)},
+    )
+
+
+def test_script_replaces_the_peltak_process(tmp_path):
+    result = run_exec_script(tmp_path, 'echo $$; pwd; exit 7')
+
+    peltak_pid, script_pid, cwd = result.stdout.splitlines()
+    assert script_pid == peltak_pid
+    assert cwd == str(tmp_path)
+    assert result.returncode == 7
+
+
+def test_nothing_runs_after_the_script(tmp_path):
+    result = run_exec_script(tmp_path, 'echo done')
+
+    assert result.stdout.splitlines()[1:] == ['done']
+    assert result.returncode == 0
+
+
+@pytest.mark.parametrize('script_conf', [
+    {'matrix': {'python': ['3.8', '3.9']}},
+    {'files': {'paths': ['src']}, 'files_mode': 'batch'},
+    {'files': {'paths': ['src']}, 'files_mode': 'stdin'},
+    {'python_file': 'scripts/serve.py'},
+])
+@patch('os.execv')
+def test_refuses_scripts_that_run_more_than_one_command(
+    p_execv: Mock,
+    script_conf,
+    app_conf: conf.Config,
+):
+    script = Script.from_config('serve', {'command': 'flask run', **script_conf})
+
+    with pytest.raises(ExecNotPossible):
+        exec_script(script, {})
+
+    p_execv.assert_not_called()
+
+
+@patch('os.chdir', Mock())
+@patch('os.execv')
+def test_runs_rendered_command_in_shell(p_execv: Mock, app_conf: conf.Config):
+    RunContext().set('pretend', False)
+    script = Script.from_config('serve', {'command': 'serve --port {{ opts.port }}'})
+
+    with patch.dict(os.environ, {'SHELL': '/bin/zsh'}):
+        exec_script(script, {'port': 8000})
+
+    p_execv.assert_called_once_with(
+        '/bin/zsh', ['/bin/zsh', '-c', 'serve --port 8000']
+    )
+
+
+@patch('os.execv')
+@patch('peltak.core.scripts.logic.exec_script_command')
+def test_only_prints_the_command_when_pretending(
+    p_exec_script_command: Mock,
+    p_execv: Mock,
+    app_conf: conf.Config,
+):
+    RunContext().set('pretend', True)
+    script = Script.from_config('serve', {'command': 'flask run'})
+
+    assert exec_script(script, {}) == p_exec_script_command.return_value
+
+    p_exec_script_command.assert_called_once_with('flask run', pretend=True)
+    p_execv.assert_not_called()
+
+
+@patch('peltak.core.scripts.logic.exec_script', Mock(return_value=3))
+@patch('peltak.core.scripts.logic.exec_script_command')
+def test_run_script_execs_if_enabled_in_header(
+    p_exec_script_command: Mock,
+    app_conf: conf.Config,
+):
+    script = Script.from_config('serve', {'command': 'flask run', 'exec': True})
+
+    with pytest.raises(SystemExit) as exc_info:
+        run_script(script, {})
+
+    assert exc_info.value.code == 3
+    p_exec_script_command.assert_not_called()
@@ -2,7 +2,7 @@
 import os
 from unittest.mock import Mock, patch
 
-from peltak.core.scripts.logic import _default_shell, exec_script_command
+from peltak.core.scripts.logic import default_shell, exec_script_command
 
 
 CALLING_SHELL = os.environ.get('SHELL', None)
@@ -12,7 +12,14 @@ CALLING_SHELL = os.environ.get('SHELL', None)
 def test_executes_the_command_if_pretend_is_False(p_Popen, app_conf):
     exec_script_command('fake-cmd', False)
 
-    p_Popen.assert_called_once_with('fake-cmd', shell=True, executable=_default_shell())
+    p_Popen.assert_called_once_with('fake-cmd', shell=True, executable=default_shell())
+
+
+@patch('subprocess.Popen')
+def test_runs_the_command_in_the_given_shell(p_Popen, app_conf):
+    exec_script_command('fake-cmd', False, '/bin/bash')
+
+    p_Popen.assert_called_once_with('fake-cmd', shell=True, executable='/bin/bash')
 
 
 @patch('subprocess.Popen')
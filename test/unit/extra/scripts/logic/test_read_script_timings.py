@@ -0,0 +1,20 @@
+# pylint: disable=missing-docstring
+from peltak.core.scripts.logic import read_script_timings
+
+
+def test_reads_labels_and_converts_to_seconds(tmp_path):
+    path = tmp_path / 'timings.tsv'
+    path.write_text('docs\t1500000\nlint\t250000\n')
+
+    assert read_script_timings(str(path)) == [('docs', 1.5), ('lint', 0.25)]
+
+
+def test_skips_malformed_lines(tmp_path):
+    path = tmp_path / 'timings.tsv'
+    path.write_text('docs\t1000000\nbroken\n\nlint\tabc\n')
+
+    assert read_script_timings(str(path)) == [('docs', 1.0)]
+
+
+def test_returns_nothing_if_file_is_missing(tmp_path):
+    assert read_script_timings(str(tmp_path / 'missing.tsv')) == []
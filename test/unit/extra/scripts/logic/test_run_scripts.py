@@ -0,0 +1,108 @@
+# pylint: disable=missing-docstring
+import json
+from unittest.mock import Mock, patch
+
+import pytest
+
+from peltak.core import conf
+from peltak.core.scripts.logic import ExecNotPossible, run_scripts
+from peltak.core.scripts.types import Script
+
+
+SCRIPTS = {
+    'build': Script.from_config('build', {'command': 'make'}),
+    'lint': Script.from_config('lint', {'command': 'pylint src'}),
+    'serve': Script.from_config('serve', {
+        'command': 'flask run',
+        'depends_on': 'build',
+        'exec': True,
+    }),
+    'watch': Script.from_config('watch', {
+        'command': 'watchexec flask run',
+        'depends_on': 'serve',
+        'exec': True,
+    }),
+}
+
+
+@pytest.fixture
+def scripts():
+    with patch('peltak.core.scripts.loader.get_script', SCRIPTS.__getitem__):
+        yield SCRIPTS
+
+
+@patch('peltak.core.scripts.logic.exec_script')
+def test_refuses_to_exec_multiple_scripts(p_exec_script: Mock, scripts):
+    with pytest.raises(ExecNotPossible):
+        run_scripts(['build', 'lint'], use_exec=True)
+
+    p_exec_script.assert_not_called()
+
+
+@patch('peltak.core.scripts.logic.exec_script', return_value=3)
+def test_execs_single_script_with_exec_flag(p_exec_script: Mock, scripts):
+    with pytest.raises(SystemExit) as exc_info:
+        run_scripts(['lint'], use_exec=True)
+
+    assert exc_info.value.code == 3
+    p_exec_script.assert_called_once_with(scripts['lint'], {})
+
+
+@patch('peltak.core.scripts.logic.ScriptProcesses')
+@patch('peltak.core.scripts.logic.exec_script', return_value=0)
+def test_runs_dependencies_before_exec(
+    p_exec_script: Mock,
+    p_processes: Mock,
+    scripts,
+    app_conf: conf.Config,
+):
+    ran = []
+    runner = p_processes.return_value.__enter__.return_value
+    runner.side_effect = lambda name, *args: ran.append(name) or 0
+    runner.cached = set()
+    runner.timings = {}
+
+    with pytest.raises(SystemExit):
+        run_scripts(['serve'])
+
+    assert ran == ['build']
+    p_exec_script.assert_called_once_with(scripts['serve'], {})
+
+
+@patch('peltak.core.scripts.logic.ScriptProcesses')
+@patch('peltak.core.scripts.logic.exec_script', return_value=0)
+def test_only_the_requested_script_replaces_peltak(
+    p_exec_script: Mock,
+    p_processes: Mock,
+    scripts,
+    app_conf: conf.Config,
+):
+    ran = []
+    runner = p_processes.return_value.__enter__.return_value
+    runner.side_effect = lambda name, *args: ran.append(name) or 0
+    runner.cached = set()
+    runner.timings = {}
+
+    # The only dependency has exec: true too, but it must not replace peltak.
+    with pytest.raises(SystemExit):
+        run_scripts(['watch'])
+
+    assert ran == ['build', 'serve']
+    p_exec_script.assert_called_once_with(scripts['watch'], {})
+
+
+@patch('peltak.core.scripts.logic.ScriptProcesses')
+def test_writes_results_to_report_file(p_processes: Mock, scripts, tmp_path, app_conf):
+    runner = p_processes.return_value.__enter__.return_value
+    runner.side_effect = lambda name, *args: 0 if name == 'build' else 2
+    runner.cached = set()
+    runner.timings = {}
+    report_file = tmp_path / 'report.json'
+
+    with pytest.raises(SystemExit):
+        run_scripts(['build', 'lint'], report_file=str(report_file))
+
+    report = {x['name']: x for x in json.loads(report_file.read_text())}
+    assert report['build']['status'] == 'ok'
+    assert report['lint']['status'] == 'failed'
+    assert report['lint']['retcode'] == 2
@@ -0,0 +1,19 @@
+# pylint: disable=missing-docstring
+import os
+
+from peltak.core.scripts.logic import script_shell
+from peltak.core.scripts.types import Script
+
+
+def test_uses_the_users_shell(monkeypatch):
+    monkeypatch.setenv('SHELL', '/usr/bin/zsh')
+    script = Script.from_config('test', {'command': 'echo ok'})
+
+    assert script_shell(script) == '/usr/bin/zsh'
+
+
+def test_scripts_using_builtins_always_run_in_bash(monkeypatch):
+    monkeypatch.setenv('SHELL', '/usr/bin/zsh')
+    script = Script.from_config('test', {'command': 'cprint ok', 'use': ['cprint']})
+
+    assert os.path.basename(script_shell(script)) == 'bash'
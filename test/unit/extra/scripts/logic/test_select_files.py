@@ -0,0 +1,54 @@
+# pylint: disable=missing-docstring
+from unittest.mock import patch
+
+import pytest
+
+from peltak.core import conf, context
+from peltak.core.scripts import timings
+from peltak.core.scripts.logic import select_files
+from peltak.core.scripts.types import Script
+
+
+FILES = ['a.py', 'b.py', 'c.py', 'd.py']
+
+
+@pytest.fixture
+def script(tmp_path):
+    appconf = conf.Config({'cfg': {}}, path=str(tmp_path / 'peltak.yaml'))
+    with patch('peltak.core.conf.g_conf', appconf), \
+            patch.object(timings, '_timings', timings.FileTimings(None)), \
+            patch('peltak.core.fs.collect_files', return_value=list(FILES)):
+        yield Script.from_config('test', {
+            'command': 'pytest {{ files | join(" ") }}',
+            'files': {'paths': ['.']},
+        })
+        context.clear()
+
+
+def test_returns_all_files_when_not_sharding(script):
+    assert select_files(script) == FILES
+
+
+def test_shards_cover_all_files_exactly_once(script):
+    shards = []
+    for i in (1, 2, 3):
+        context.set('shard', (i, 3))
+        shards.append(select_files(script))
+
+    assert sorted(sum(shards, [])) == FILES
+
+
+def test_shards_are_balanced_by_recorded_durations(script):
+    timings.open_timings().scripts['test'] = {
+        'a.py': 3.0,
+        'b.py': 1.0,
+        'c.py': 1.0,
+        'd.py': 1.0,
+    }
+
+    context.set('shard', (1, 2))
+    first = select_files(script)
+    context.set('shard', (2, 2))
+    second = select_files(script)
+
+    assert sorted([first, second]) == [['a.py'], ['b.py', 'c.py', 'd.py']]
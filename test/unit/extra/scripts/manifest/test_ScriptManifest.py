@@ -0,0 +1,59 @@
+# pylint: disable=missing-docstring
+import os
+from unittest.mock import Mock
+
+from peltak.core.scripts.manifest import ScriptManifest
+
+
+def test_parses_header_only_once(tmp_path):
+    script = tmp_path / 'hello.sh'
+    script.write_text('# about: hello\necho hello\n')
+    parse = Mock(return_value={'about': 'hello'})
+
+    manifest = ScriptManifest(str(tmp_path / 'manifest.json'))
+    assert manifest.header(script, parse) == {'about': 'hello'}
+    manifest.save()
+
+    manifest = ScriptManifest(str(tmp_path / 'manifest.json'))
+    assert manifest.header(script, parse) == {'about': 'hello'}
+
+    parse.assert_called_once_with(script)
+
+
+def test_parses_header_again_if_script_changed(tmp_path):
+    script = tmp_path / 'hello.sh'
+    script.write_text('# about: hello\necho hello\n')
+    parse = Mock(return_value={'about': 'hello'})
+
+    manifest = ScriptManifest(str(tmp_path / 'manifest.json'))
+    manifest.header(script, parse)
+    manifest.save()
+
+    script.write_text('# about: hello again\necho hello\n')
+    stat = script.stat()
+    os.utime(script, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    manifest = ScriptManifest(str(tmp_path / 'manifest.json'))
+    manifest.header(script, parse)
+
+    assert parse.call_count == 2
+
+
+def test_removes_scripts_that_no_longer_exist(tmp_path):
+    script = tmp_path / 'hello.sh'
+    script.write_text('# about: hello\necho hello\n')
+
+    manifest = ScriptManifest(str(tmp_path / 'manifest.json'))
+    manifest.header(script, Mock(return_value={}))
+    manifest.save()
+
+    manifest = ScriptManifest(str(tmp_path / 'manifest.json'))
+    manifest.save()
+
+    assert ScriptManifest(str(tmp_path / 'manifest.json')).entries == {}
+
+
+def test_ignores_corrupted_manifest(tmp_path):
+    (tmp_path / 'manifest.json').write_text('{not json')
+
+    assert ScriptManifest(str(tmp_path / 'manifest.json')).entries == {}
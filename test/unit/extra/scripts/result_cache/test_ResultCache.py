@@ -0,0 +1,125 @@
+# pylint: disable=missing-docstring
+import os
+from unittest.mock import patch
+
+import pytest
+
+from peltak.core import conf
+from peltak.core.scripts.result_cache import CachedResult, ResultCache
+from peltak.core.scripts.types import Script
+
+
+@pytest.fixture
+def proj(tmp_path):
+    (tmp_path / 'docs').mkdir()
+    (tmp_path / 'docs' / 'index.rst').write_text('hello')
+    appconf = conf.Config(
+        {'cfg': {'theme': 'dark'}},
+        path=str(tmp_path / 'peltak.yaml'),
+    )
+    with patch('peltak.core.conf.g_conf', appconf):
+        yield tmp_path
+
+
+@pytest.fixture
+def cache(proj):
+    result_cache = ResultCache(str(proj / '.build' / 'script-results.sqlite'))
+    yield result_cache
+    result_cache.close()
+
+
+@pytest.fixture
+def script(proj):
+    with patch('peltak.core.fs.collect_files', return_value=[
+        str(proj / 'docs' / 'index.rst'),
+    ]):
+        yield Script.from_config('docs', {
+            'command': 'make docs',
+            'inputs': {
+                'files': {'paths': ['docs']},
+                'env': 'DOCS_THEME',
+                'conf': ['theme'],
+            },
+            'outputs': ['html'],
+        })
+
+
+def test_key_is_stable(cache, script):
+    assert cache.key(script, 'make docs') == cache.key(script, 'make docs')
+
+
+def test_key_depends_on_files_passed_outside_the_command(cache, script):
+    key = cache.key(script, 'make docs', ['a.rst', 'b.rst'])
+
+    assert cache.key(script, 'make docs', ['a.rst', 'b.rst']) == key
+    assert cache.key(script, 'make docs', ['a.rst']) != key
+    assert cache.key(script, 'make docs') != key
+
+
+def test_key_depends_on_the_command(cache, script):
+    assert cache.key(script, 'make docs') != cache.key(script, 'make html')
+
+
+def test_key_depends_on_input_file_contents(cache, script, proj):
+    key = cache.key(script, 'make docs')
+    (proj / 'docs' / 'index.rst').write_text('changed')
+
+    assert cache.key(script, 'make docs') != key
+
+
+def test_key_depends_on_input_env(cache, script):
+    with patch.dict(os.environ, {'DOCS_THEME': 'a'}):
+        key = cache.key(script, 'make docs')
+
+    with patch.dict(os.environ, {'DOCS_THEME': 'b'}):
+        assert cache.key(script, 'make docs') != key
+
+
+def test_key_depends_on_input_conf(cache, script):
+    key = cache.key(script, 'make docs')
+    conf.g_conf.values['cfg']['theme'] = 'light'
+
+    assert cache.key(script, 'make docs') != key
+
+
+def test_replays_recorded_result(cache):
+    cache.put('key', CachedResult(retcode=0, output=b'built\n'), [])
+
+    assert cache.get('key', []) == CachedResult(retcode=0, output=b'built\n')
+    assert cache.get('other', []) is None
+
+
+def test_misses_if_outputs_changed(cache, proj):
+    (proj / 'html').mkdir()
+    (proj / 'html' / 'index.html').write_text('docs')
+    cache.put('key', CachedResult(retcode=0, output=b''), ['html'])
+
+    assert cache.get('key', ['html']) is not None
+
+    (proj / 'html' / 'index.html').unlink()
+
+    assert cache.get('key', ['html']) is None
+
+
+def test_evicts_least_recently_used_results(cache):
+    cache.max_size = 10
+
+    with patch('time.time', return_value=1):
+        cache.put('a', CachedResult(retcode=0, output=b'aaaa'), [])
+    with patch('time.time', return_value=2):
+        cache.put('b', CachedResult(retcode=0, output=b'bbbb'), [])
+    with patch('time.time', return_value=3):
+        cache.get('a', [])
+        cache.put('c', CachedResult(retcode=0, output=b'cccc'), [])
+
+    assert cache.get('a', []) is not None
+    assert cache.get('b', []) is None
+    assert cache.get('c', []) is not None
+    assert cache.stats().size == 8
+
+
+def test_clear_removes_the_database(cache):
+    cache.put('a', CachedResult(retcode=0, output=b'a'), [])
+    cache.clear()
+
+    assert not os.path.exists(cache.path)
@@ -0,0 +1,32 @@
+# pylint: disable=missing-docstring
+from peltak.core.scripts.revisions import RevisionResult, print_comparison
+from peltak.core.scripts.scheduler import ScriptResult
+
+
+def test_shows_every_script_at_every_revision(capsys):
+    print_comparison([
+        RevisionResult('main', 'a' * 40, 0, 3.0, [
+            ScriptResult('bench', 'ok', 0, 2.5),
+            ScriptResult('lint', 'ok', 0, 0.5),
+        ]),
+        RevisionResult('feature', 'b' * 40, 1, 1.0, [
+            ScriptResult('bench', 'failed', 1, 1.0),
+            ScriptResult('lint', 'skipped'),
+        ]),
+    ])
+
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[1].split() == ['--', 'main', 'feature']
+    assert lines[2].split() == ['--', 'bench', 'OK', '2.50s', 'FAILED', '1.00s']
+    assert lines[3].split() == ['--', 'lint', 'OK', '0.50s', 'SKIPPED']
+    assert lines[4].split() == ['--', 'total', 'exit', '0', '3.00s', 'exit', '1', '1.00s']
+
+
+def test_marks_scripts_missing_at_a_revision(capsys):
+    print_comparison([
+        RevisionResult('main', 'a' * 40, 0, 1.0, [ScriptResult('bench', 'ok', 0, 1.0)]),
+        RevisionResult('old', 'b' * 40, 2, 0.1, []),
+    ])
+
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[2].split() == ['--', 'bench', 'OK', '1.00s', '-']
@@ -0,0 +1,109 @@
+# pylint: disable=missing-docstring
+import os
+import shutil
+import subprocess
+import sys
+from unittest.mock import patch
+
+import pytest
+
+from peltak.core import conf, git
+from peltak.core.context import RunContext
+from peltak.core.scripts.revisions import run_at_revisions
+
+
+pytestmark = pytest.mark.skipif(
+    shutil.which('git') is None,
+    reason="requires git"
+)
+
+PELTAK_YAML = "pelconf_version: '1'\ncfg:\n  build_dir: .build\nscripts_dir: scripts\n"
+
+
+def run_git(cwd, *args) -> str:
+    return subprocess.run(
+        ['git'] + list(args),
+        cwd=str(cwd),
+        check=True,
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+    ).stdout.strip()
+
+
+def commit(repo, version):
+    (repo / 'version.txt').write_text(version)
+    run_git(repo, 'add', '-A')
+    run_git(
+        repo, '-c', 'user.name=John', '-c', 'user.email=john@example.com',
+        'commit', '-q', '-m', f'Version {version}',
+    )
+
+
+@pytest.fixture
+def repo(tmp_path):
+    run_git(tmp_path, 'init', '-q')
+    (tmp_path / 'peltak.yaml').write_text(PELTAK_YAML)
+    (tmp_path / '.gitignore').write_text('.build\n')
+    (tmp_path / 'scripts').mkdir()
+    (tmp_path / 'scripts' / 'show.sh').write_text(
+        '# peltak:\n#   about: Show version\necho "version $(cat version.txt)"\n'
+    )
+    (tmp_path / 'scripts' / 'check.sh').write_text(
+        '# peltak:\n#   about: Check version\ngrep -q 1 version.txt\n'
+    )
+    commit(tmp_path, '1')
+    commit(tmp_path, '2')
+
+    appconf = conf.Config(
+        {'cfg': {'build_dir': '.build'}},
+        path=str(tmp_path / 'peltak.yaml'),
+    )
+    env = {'PYTHONPATH': os.pathsep.join(sys.path)}
+    with patch('peltak.core.conf.g_conf', appconf), patch.dict(os.environ, env):
+        RunContext().set('pretend', False)
+        yield tmp_path
+
+
+def test_runs_scripts_at_every_revision(repo, capfd):
+    (repo / 'version.txt').write_text('local change')
+
+    run_at_revisions(['show'], ['HEAD~1', 'HEAD'])
+
+    out = capfd.readouterr().out
+    assert 'HEAD~1 | version 1' in out
+    assert 'HEAD   | version 2' in out
+    assert (repo / 'version.txt').read_text() == 'local change'
+
+
+def test_compares_results_side_by_side(repo, capfd):
+    with pytest.raises(SystemExit) as exc_info:
+        run_at_revisions(['show', 'check'], ['HEAD~1', 'HEAD'])
+
+    assert exc_info.value.code == 1
+    lines = capfd.readouterr().out.splitlines()
+    check = next(x for x in lines if x.startswith('-- check '))
+    assert check.split()[2::2] == ['OK', 'FAILED']
+
+
+def test_reuses_worktrees_between_runs(repo, capfd):
+    run_at_revisions(['show'], ['HEAD~1', 'HEAD'])
+    run_at_revisions(['show'], ['HEAD', 'HEAD~1'])
+
+    pool = git.WorktreePool(str(repo), str(repo / '.build' / 'worktrees'))
+    assert len(pool.worktrees()) == 2
+
+
+def test_fails_before_running_anything_for_unknown_revision(repo, capfd):
+    with pytest.raises(git.UnknownRevision):
+        run_at_revisions(['show'], ['HEAD', 'no-such-branch'])
+
+    assert not (repo / '.build').exists()
+
+
+def test_only_prints_commands_when_pretending(repo, capfd):
+    RunContext().set('pretend', True)
+
+    run_at_revisions(['show'], ['HEAD'], jobs=2)
+
+    assert 'peltak run -j 2 show' in capfd.readouterr().out
+    assert not (repo / '.build').exists()
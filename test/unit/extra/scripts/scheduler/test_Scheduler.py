@@ -0,0 +1,108 @@
+# pylint: disable=missing-docstring
+import threading
+import time
+from unittest.mock import Mock
+
+from peltak.core.scripts.scheduler import Scheduler, build_graph
+from peltak.core.scripts.types import Script
+
+
+def _graph(**deps):
+    scripts = {
+        name: Script.from_config(name, {'command': 'true', 'depends_on': dep_list})
+        for name, dep_list in deps.items()
+    }
+    return build_graph(list(scripts), scripts.__getitem__)
+
+
+def test_runs_dependencies_first():
+    order = []
+    graph = _graph(check=['lint', 'types'], lint=[], types=[])
+
+    def runner(name, script):
+        order.append(name)
+        return 0
+
+    results = Scheduler(graph, jobs=4).run(runner)
+
+    assert order[-1] == 'check'
+    assert {r.name: r.status for r in results} == {
+        'lint': 'ok',
+        'types': 'ok',
+        'check': 'ok',
+    }
+
+
+def test_runs_independent_scripts_in_parallel():
+    graph = _graph(a=[], b=[], c=[])
+    barrier = threading.Barrier(3, timeout=5)
+
+    def runner(name, script):
+        # Would time out if the scripts were not running at the same time.
+        barrier.wait()
+        return 0
+
+    results = Scheduler(graph, jobs=3).run(runner)
+
+    assert [r.status for r in results] == ['ok', 'ok', 'ok']
+
+
+def test_never_runs_more_than_jobs_scripts_at_once():
+    graph = _graph(a=[], b=[], c=[], d=[])
+    lock = threading.Lock()
+    running = []
+    max_running = []
+
+    def runner(name, script):
+        with lock:
+            running.append(name)
+            max_running.append(len(running))
+        time.sleep(0.01)
+        with lock:
+            running.remove(name)
+        return 0
+
+    Scheduler(graph, jobs=2).run(runner)
+
+    assert max(max_running) == 2
+
+
+def test_fails_fast():
+    graph = _graph(bad=[], slow=[], after=['bad'], later=['slow'])
+    cancel = Mock()
+    started = threading.Event()
+
+    def runner(name, script):
+        if name == 'bad':
+            started.wait(5)
+            return 3
+        if name == 'slow':
+            started.set()
+            # Runs until cancelled.
+            _wait_for(cancel)
+            return -15
+        return 0
+
+    results = {r.name: r for r in Scheduler(graph, jobs=2).run(runner, cancel)}
+
+    cancel.assert_called_once_with()
+    assert results['bad'].status == 'failed'
+    assert results['bad'].retcode == 3
+    assert results['slow'].status == 'cancelled'
+    assert results['after'].status == 'skipped'
+    assert results['later'].status == 'skipped'
+
+
+def test_treats_runner_exceptions_as_failures():
+    graph = _graph(a=[])
+
+    results = Scheduler(graph).run(Mock(side_effect=RuntimeError('boom')))
+
+    assert results[0].status == 'failed'
+
+
+def _wait_for(mock, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not mock.called and time.monotonic() < deadline:
+        time.sleep(0.001)
+    return mock.called
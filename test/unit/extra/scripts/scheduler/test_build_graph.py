@@ -0,0 +1,65 @@
+# pylint: disable=missing-docstring
+import pytest
+
+from peltak.core.scripts.scheduler import DependencyCycle, build_graph
+from peltak.core.scripts.types import Script
+
+
+def _scripts(**deps):
+    return {
+        name: Script.from_config(name, {'command': 'true', 'depends_on': dep_list})
+        for name, dep_list in deps.items()
+    }
+
+
+def test_includes_transitive_dependencies_before_dependants():
+    scripts = _scripts(check=['lint', 'types'], lint=['deps'], types=['deps'], deps=[])
+
+    graph = build_graph(['check'], scripts.__getitem__)
+
+    assert list(graph) == ['deps', 'lint', 'types', 'check']
+
+
+def test_includes_every_script_only_once():
+    scripts = _scripts(a=['c'], b=['c'], c=[])
+
+    graph = build_graph(['a', 'b', 'a'], scripts.__getitem__)
+
+    assert list(graph) == ['c', 'a', 'b']
+
+
+def test_raises_on_dependency_cycle():
+    scripts = _scripts(a=['b'], b=['c'], c=['a'])
+
+    with pytest.raises(DependencyCycle) as exc_info:
+        build_graph(['a'], scripts.__getitem__)
+
+    assert 'a -> b -> c -> a' in str(exc_info.value)
+
+
+def test_expands_matrix_scripts():
+    scripts = {
+        'test': Script.from_config('test', {
+            'command': 'true',
+            'matrix': {'python': ['3.8', '3.9'], 'db': ['sqlite', 'pg']},
+        }),
+        'report': Script.from_config('report', {
+            'command': 'true',
+            'depends_on': ['test'],
+        }),
+    }
+
+    graph = build_graph(['report'], scripts.__getitem__)
+
+    instances = [
+        'test[python=3.8,db=sqlite]',
+        'test[python=3.8,db=pg]',
+        'test[python=3.9,db=sqlite]',
+        'test[python=3.9,db=pg]',
+    ]
+    assert list(graph) == instances + ['report']
+    assert graph['test[python=3.9,db=pg]'].matrix_values == {
+        'python': '3.9',
+        'db': 'pg',
+    }
+    assert graph['report'].depends_on == instances
@@ -0,0 +1,56 @@
+# pylint: disable=missing-docstring
+import pytest
+
+from peltak.core.scripts.timings import SMOOTHING, FileTimings
+
+
+def test_splits_batch_duration_between_files():
+    timings = FileTimings(None)
+    timings.record('test', ['a', 'b'], 4.0)
+
+    assert timings.get('test') == {'a': 2.0, 'b': 2.0}
+
+
+def test_smooths_with_previous_measurements():
+    timings = FileTimings(None)
+    timings.record('test', ['a'], 4.0)
+    timings.record('test', ['a'], 2.0)
+
+    assert timings.get('test')['a'] == pytest.approx(
+        SMOOTHING * 2.0 + (1 - SMOOTHING) * 4.0
+    )
+
+
+def test_scripts_are_recorded_separately():
+    timings = FileTimings(None)
+    timings.record('lint', ['a'], 1.0)
+
+    assert timings.get('test') == {}
+
+
+def test_persists_between_runs(tmp_path):
+    path = str(tmp_path / 'build' / 'script-timings.json')
+    timings = FileTimings(path)
+    timings.record('test', ['a'], 1.5)
+    timings.save()
+
+    assert FileTimings(path).get('test') == {'a': 1.5}
+
+
+def test_ignores_corrupted_file(tmp_path):
+    path = tmp_path / 'script-timings.json'
+    path.write_text('{not json')
+
+    assert FileTimings(str(path)).get('test') == {}
+
+
+def test_stores_files_relative_to_root(tmp_path):
+    path = str(tmp_path / 'script-timings.json')
+    timings = FileTimings(path, root='/home/ci/proj')
+    timings.record('test', ['/home/ci/proj/src/a.py'], 1.0)
+    timings.save()
+
+    assert timings.scripts == {'test': {'src/a.py': 1.0}}
+    assert FileTimings(path, root='/builds/proj').get('test') == {
+        '/builds/proj/src/a.py': 1.0,
+    }
@@ -0,0 +1,36 @@
+# pylint: disable=missing-docstring
+from peltak.core.scripts.timings import partition
+
+
+def test_returns_exactly_count_groups():
+    assert partition(['a'], 3, {}) == [['a'], [], []]
+
+
+def test_balances_by_duration_not_by_file_count():
+    durations = {'slow': 10, 'a': 2, 'b': 2, 'c': 2, 'd': 2, 'e': 2}
+    groups = partition(sorted(durations), 2, durations)
+
+    assert ['slow'] in groups
+    assert ['a', 'b', 'c', 'd', 'e'] in groups
+
+
+def test_unknown_files_get_the_average_duration():
+    durations = {'a': 3.0, 'b': 1.0}
+    groups = partition(['a', 'b', 'new1', 'new2'], 2, durations)
+
+    assert sorted(map(sorted, groups)) == [['a', 'b'], ['new1', 'new2']]
+
+
+def test_result_does_not_depend_on_input_order():
+    durations = {'a': 1.0, 'b': 1.0, 'c': 1.0, 'd': 1.0}
+
+    assert (
+        partition(['a', 'b', 'c', 'd'], 2, durations)
+        == partition(['d', 'c', 'b', 'a'], 2, durations)
+    )
+
+
+def test_without_timings_splits_evenly():
+    groups = partition(['a', 'b', 'c', 'd', 'e', 'f'], 3, {})
+
+    assert [len(x) for x in groups] == [2, 2, 2]
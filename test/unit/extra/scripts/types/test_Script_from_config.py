@@ -68,3 +68,49 @@ def test_supports_passing_scalar_to_success_exit_codes():
     assert script.name == 'test'
     assert script.command == 'fake_cmd'
     assert script.success_exit_codes == [5]
+
+
+def test_depends_on_can_be_a_single_script():
+    script = Script.from_config('test', {
+        'command': 'echo test',
+        'depends_on': 'other',
+    })
+
+    assert script.depends_on == ['other']
+
+
+def test_loads_inputs_and_outputs():
+    script = Script.from_config('test', {
+        'command': 'echo test',
+        'inputs': {
+            'files': {'paths': 'docs'},
+            'env': 'DOCS_THEME',
+            'conf': ['version.files'],
+        },
+        'outputs': 'docs/html',
+    })
+
+    assert script.inputs is not None
+    assert script.inputs.files is not None
+    assert script.inputs.files.paths == ['docs']
+    assert script.inputs.env == ['DOCS_THEME']
+    assert script.inputs.conf == ['version.files']
+    assert script.outputs == ['docs/html']
+
+
+def test_loads_matrix():
+    script = Script.from_config('test', {
+        'command': 'echo test',
+        'matrix': {'python': ['3.8', '3.9'], 'db': 'sqlite'},
+    })
+
+    assert script.matrix == {'python': ['3.8', '3.9'], 'db': ['sqlite']}
+    assert len(script.matrix_instances()) == 2
+
+
+def test_raises_on_unknown_files_mode():
+    with pytest.raises(ValueError):
+        Script.from_config('test', {
+            'command': 'echo test',
+            'files_mode': 'magic',
+        })